@@ -2,6 +2,8 @@
 
 from abc import ABC, abstractmethod
 import ast_nodes as ASTS
+import copy
+import sys
 from typing import Dict, Optional, Union, Iterable, List
 
 class BaseAnalysis(ABC):
@@ -38,6 +40,17 @@ class BaseAnalysis(ABC):
         according to the analysis information (the abstract lattice element).
         """
 
+    def verify_assertion_batch(self, pairs: Iterable) -> List[bool]:
+        """
+        Verifies a batch of assertions at once.
+        pairs is an iterable of (ass, x) tuples, the returned list holds
+        the result of verify_assertion(ass, x) for every pair (in order).
+        By default every pair is verified separately, analyses whose
+        representation allows it may override this method to compile the
+        assertions once and check all the elements in bulk.
+        """
+        return [self.verify_assertion(ass, x) for ass, x in pairs]
+
     @abstractmethod
     def transform_nontrivial(self, ast: ASTS.SyntaxNode, x):
         """
@@ -71,6 +84,104 @@ class BaseAnalysis(ABC):
             return ret
         return self.transform_nontrivial(ast,x)
 
+    def transform_batch(self, pairs: Iterable):
+        """
+        Transforms a batch of lattice elements at once.
+        pairs is an iterable of (ast, x) tuples, the returned list holds
+        the result of transform(ast, x) for every pair (in order).
+        By default every pair is transformed separately, analyses whose
+        representation allows it (e.g. vectorized ones) may override this
+        method to process the whole batch in bulk.
+        """
+        return [self.transform(ast, x) for ast, x in pairs]
+
+    def state_size(self, x) -> int:
+        """
+        Returns the size of the lattice element x in analysis specific
+        units (e.g. the number of disjuncts of a disjunctive element).
+        Used for instrumentation purposes only.
+        """
+        return 1
+
+    def state_nbytes(self, x) -> int:
+        """
+        Returns an estimate of the memory held by the lattice element x,
+        in bytes. Used for memory budget accounting (see memory_budget.py).
+        """
+        return sys.getsizeof(x)
+
+    def coarsen(self, x):
+        """
+        Returns a sound over-approximation of the lattice element x which
+        has a smaller representation, used once x exceeds the memory budget.
+        The result may use a coarser representation than the usual one, as
+        long as all the other methods of the analysis accept it. By default
+        there is no coarser representation and x is returned as is.
+        """
+        return x
+
+    def is_coarse(self, x) -> bool:
+        """
+        Returns whether the lattice element x uses the coarser
+        representation of coarsen. Used for memory budget reports.
+        """
+        return False
+
+    def accumulate(self, old, new):
+        """
+        Returns the value the fixpoint iteration stores for a label whose
+        previous value is old, once its predecessors give it the value new.
+        By default this is new. Analyses whose transforms don't make the
+        values of the labels only grow (e.g. by merging disjuncts) may
+        return an upper bound of both, so that the iteration terminates.
+        """
+        return new
+
+    def accelerate_loop(self, loop, x):
+        """
+        Returns an upper bound of x and of all the values reachable from it
+        at the head of the counting loop (a loop_acceleration.CountingLoop)
+        by iterating it any number of times, used by the fixpoint iteration
+        in place of unrolling the loop. By default x, which leaves the loop
+        to the iteration.
+        """
+        return x
+
+    def exit_loop(self, loop, entry, x):
+        """
+        Returns an upper bound of the values at the head of the counting
+        loop whose counter reached its bound, which its exit edges then
+        transform. x is the value of the head, and entry is the join of the
+        values entering the head other than through the loop's back edge,
+        from which analyses may compute the exit values in closed form. By
+        default x.
+        """
+        return x
+
+    def stats(self) -> Dict:
+        """
+        Returns analysis specific statistics of the analysis so far, e.g.
+        counts of operations which lost precision. Empty by default.
+        """
+        return {}
+
+    def fresh(self):
+        """
+        Returns an analysis of the same domain for another program, which
+        shares the domain data of this one (e.g. PAFull's TOP and the
+        caches which depend on the number of variables only) but none of
+        its per-program state. Used by the analysis daemon to keep domains
+        warm between requests. By default a shallow copy, analyses with
+        per-program state (e.g. statistics) override it to reset it.
+        """
+        return copy.copy(self)
+
+    def is_bottom(self, x) -> bool:
+        """
+        Returns True iff x represents the bottom element.
+        """
+        return self.equiv(x, self.bottom())
+
     def stabilize(self, x):
         """
         "Stabilizes" the lattice value of x:
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Thin client of the analysis daemon (see analysis_daemon.py).
+
+Usage: analysis_client.py [-h] [--socket PATH] [--analysis NAME]
+                          [--iteration NAME] [--stats] [--shutdown] [file ...]
+
+Sends every program file to the daemon and prints the verdicts as JSON.
+This module deliberately imports nothing but the standard library modules
+it needs, so that its startup time stays minimal.
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+from typing import Dict
+
+
+def default_socket_path() -> str:
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR") or "/tmp"
+    return os.path.join(runtime_dir, f"integer-analysis-{os.getuid()}.sock")
+
+
+class AnalysisClient:
+    """A connection to the analysis daemon.
+
+    The protocol consists of newline delimited JSON objects, every request
+    is answered by a single response.
+    """
+
+    def __init__(self, path=None):
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.connect(path or default_socket_path())
+        self._file = self._sock.makefile('rwb')
+
+    def request(self, message: Dict) -> Dict:
+        self._file.write(json.dumps(message).encode() + b"\n")
+        self._file.flush()
+        line = self._file.readline()
+        assert line, "The daemon closed the connection"
+        return json.loads(line)
+
+    def analyze(self, text: str, analysis=None, iteration=None) -> Dict:
+        """Returns the verdicts of the program text (see analyzer.analyze_text)."""
+        message = {"command": "analyze", "text": text}
+        if analysis: message["analysis"] = analysis
+        if iteration: message["iteration"] = iteration
+        return self.request(message)
+
+    def close(self):
+        self._file.close()
+        self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _main():
+    argparser = argparse.ArgumentParser(description="Analyze programs using the analysis daemon.")
+    argparser.add_argument("files", nargs="*", help="program files")
+    argparser.add_argument("--socket", default=default_socket_path(),
+                           help="the socket the daemon listens on")
+    argparser.add_argument("--analysis", help="analysis name (default: the daemon's default)")
+    argparser.add_argument("--iteration", help="fixpoint iteration algorithm (chaotic/frontier)")
+    argparser.add_argument("--stats", action="store_true", help="print the daemon statistics")
+    argparser.add_argument("--shutdown", action="store_true", help="stop the daemon")
+    args = argparser.parse_args()
+
+    try:
+        client = AnalysisClient(args.socket)
+    except (FileNotFoundError, ConnectionRefusedError):
+        sys.exit(f"No analysis daemon listens on {args.socket}, "
+                 "start it with: python3 src/analysis_daemon.py")
+    with client:
+        results = []
+        for path in args.files:
+            with open(path, 'r') as f:
+                text = f.read()
+            result = {"file": path}
+            result.update(client.analyze(text, args.analysis, args.iteration))
+            results.append(result)
+        if args.files:
+            json.dump(results, sys.stdout, indent=2)
+            print()
+        if args.stats:
+            json.dump(client.request({"command": "stats"}), sys.stdout, indent=2)
+            print()
+        if args.shutdown:
+            client.request({"command": "shutdown"})
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+A long-lived analysis server listening on a local Unix socket.
+
+Usage: analysis_daemon.py [-h] [--socket PATH] [--timeout SECONDS]
+                          [--program-cache N] [--domain-cache N]
+
+The daemon keeps warm caches of parsed programs (keyed by their text) and
+of analysis domains (keyed by the analysis name and number of variables),
+so that repeated requests pay neither the interpreter startup and import
+time nor the construction of the analysis domain (e.g. PAFull's TOP).
+Every request is analyzed by a fresh analysis of the cached domain (see
+BaseAnalysis.fresh), which keeps none of the state of other programs.
+See analysis_client.py for the protocol and a thin client.
+
+Supported requests:
+  {"command": "analyze", "text": ..., ["analysis": name], ["iteration": name],
+   ["memory_budget": bytes]}
+  {"command": "stats"}
+  {"command": "shutdown"}
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import signal
+import socketserver
+from time import perf_counter
+from typing import Dict
+
+from analysis_client import default_socket_path
+from auto_select import select_configuration
+from analyzer import analyze_cfg, format_verdicts, ITERATIONS
+from cache import LRUCache
+from memory_budget import MemoryBudget
+from parser import Parser
+from registry import (analysis_names, canonical_name, get_analysis,
+                      AUTO_ANALYSIS, DEFAULT_ANALYSIS)
+
+
+class RequestTimeout(Exception):
+    pass
+
+def _raise_timeout(signum, frame):
+    raise RequestTimeout()
+
+
+class AnalysisDaemon:
+    """Serves analysis requests, see the module documentation."""
+
+    def __init__(self, program_cache_size=256, domain_cache_size=64, timeout=None):
+        self.programs = LRUCache(program_cache_size)
+        self.domains = LRUCache(domain_cache_size)
+        self.timeout = timeout
+        self.num_requests = 0
+        self.running = True
+
+    def preload(self):
+        """Imports every registered analysis ahead of the first request."""
+        for name in analysis_names():
+            get_analysis(name)
+
+    def _program(self, text: str):
+        key = hashlib.sha1(text.encode()).digest()
+        return self.programs.lookup(key, lambda: Parser(text).parse_complete_program())
+
+    def _analysis(self, name: str, num_vars: int):
+        domain = self.domains.lookup((name, num_vars), lambda: get_analysis(name)(num_vars))
+        return domain.fresh()
+
+    def analyze(self, request: Dict) -> Dict:
+        t0 = perf_counter()
+        name = canonical_name(request.get("analysis", DEFAULT_ANALYSIS))
+        iteration = request.get("iteration", "chaotic")
+        cfg, num_vars = self._program(request["text"])
+        response = {"status": "ok"}
+        if name == AUTO_ANALYSIS:
+            selection = select_configuration(cfg, num_vars)
+            name, iteration = selection.analysis, selection.iteration
+            response["selection"] = selection.to_dict()
+        budget = MemoryBudget(request["memory_budget"]) if request.get("memory_budget") else None
+        analysis = self._analysis(name, num_vars)
+        conclusions = analyze_cfg(cfg, analysis, ITERATIONS[iteration], budget=budget)
+        response.update({"analysis": type(analysis).__name__,
+                         "verdicts": format_verdicts(conclusions),
+                         "time": perf_counter() - t0})
+        if budget is not None:
+            response["memory"] = budget.report()
+        return response
+
+    def stats(self) -> Dict:
+        return {"status": "ok", "requests": self.num_requests,
+                "program_cache": self.programs.stats(),
+                "domain_cache": self.domains.stats()}
+
+    def handle(self, request: Dict) -> Dict:
+        """Handles a single request, never raises."""
+        self.num_requests += 1
+        if not isinstance(request, dict):
+            return {"status": "error", "error": "A request must be a JSON object"}
+        command = request.get("command", "analyze")
+        if command == "stats":
+            return self.stats()
+        if command == "shutdown":
+            self.running = False
+            return {"status": "ok"}
+        if command != "analyze":
+            return {"status": "error", "error": f'Unknown command "{command}"'}
+        if self.timeout:
+            signal.signal(signal.SIGALRM, _raise_timeout)
+            signal.alarm(self.timeout)
+        try:
+            return self.analyze(request)
+        except RequestTimeout:
+            return {"status": "timeout"}
+        except Exception as e:
+            return {"status": "error", "error": f"{type(e).__name__}: {e}"}
+        finally:
+            if self.timeout:
+                signal.alarm(0)
+
+    def serve(self, path: str):
+        """Serves requests on the Unix socket at path until shut down."""
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    try:
+                        request = json.loads(line)
+                    except ValueError as e:
+                        response = {"status": "error", "error": f"Malformed request: {e}"}
+                    else:
+                        response = daemon.handle(request)
+                    self.wfile.write(json.dumps(response).encode() + b"\n")
+                    self.wfile.flush()
+                    if not daemon.running:
+                        return
+
+        if os.path.exists(path):
+            os.unlink(path)
+        with socketserver.UnixStreamServer(path, Handler) as server:
+            try:
+                while self.running:
+                    server.handle_request()
+            finally:
+                os.unlink(path)
+
+
+def _main():
+    argparser = argparse.ArgumentParser(description="Serve analysis requests on a Unix socket.")
+    argparser.add_argument("--socket", default=default_socket_path(),
+                           help="the socket path to listen on")
+    argparser.add_argument("--timeout", type=int, default=None,
+                           help="per request timeout in seconds")
+    argparser.add_argument("--program-cache", type=int, default=256,
+                           help="number of parsed programs to keep")
+    argparser.add_argument("--domain-cache", type=int, default=64,
+                           help="number of analysis domains to keep")
+    args = argparser.parse_args()
+
+    daemon = AnalysisDaemon(args.program_cache, args.domain_cache, args.timeout)
+    daemon.preload()
+    print(f"Listening on {args.socket}", flush=True)
+    daemon.serve(args.socket)
+
+if __name__ == "__main__":
+    _main()
@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
 from ast_nodes import Assert
 import networkx as nx
-from typing import Type, List, Tuple, Dict
+from typing import Type, List, Tuple, Dict, Optional
 import analysis
-from time import sleep
+from instrumentation import Instrumentation
+from memory_budget import MemoryBudget
+from loop_acceleration import find_counting_loops
+from threading import Event, Thread
 
 MAX_ITERATIONS = 2048
 
@@ -14,18 +17,56 @@ def _find_start_node(cfg: nx.DiGraph):
     assert len(root_nodes) == 1, "Only one node should have no incoming edges!"
     return root_nodes[0]
 
-def chaotic_iteration(cfg: nx.DiGraph,
-                      analysis: analysis.BaseAnalysis,
-                      verbose=False):
-    cfg = nx.convert_node_labels_to_integers(cfg, label_attribute="original_label")
+def _init_iteration(cfg: nx.DiGraph, analysis: analysis.BaseAnalysis,
+                    budget: Optional[MemoryBudget] = None):
+    """Prepares the state shared by the fixpoint iteration algorithms.
 
-    n = len(cfg)
+    Returns a tuple of the form: (integer labeled cfg, its reverse view,
+    start node, initial lattice values list).
+    """
+    cfg = nx.convert_node_labels_to_integers(cfg, label_attribute="original_label")
     rev_cfg = nx.reverse_view(cfg)
-
     start_node = _find_start_node(cfg)
 
-    X = [ analysis.bottom() ] * n
+    X = [ analysis.bottom() ] * len(cfg)
     X[start_node] = analysis.top()
+    if budget is not None:
+        budget.reset()
+        for i in range(len(cfg)):
+            X[i] = _fit_budget(budget, analysis, cfg, i, X[i])
+            budget.account(analysis, cfg.nodes[i]['original_label'], X[i])
+    return cfg, rev_cfg, start_node, X
+
+def _fit_budget(budget: MemoryBudget, analysis: analysis.BaseAnalysis,
+                cfg: nx.DiGraph, i: int, x):
+    return analysis.stabilize(budget.fit(analysis, cfg.nodes[i]['original_label'], x))
+
+def _exit_values(analysis: analysis.BaseAnalysis, loops, i: int,
+                 prev_inds_asts, transed, N) -> List[Tuple[Tuple[int, int], object]]:
+    """Returns the values of the exit edges of the counting loops at the
+    node i (see BaseAnalysis.exit_loop), as ((i, exit node), value) tuples,
+    given the transformed values of the edges into i and its value N."""
+    ret = []
+    for loop in loops.get(i, ()):
+        if not loop.exits:
+            continue
+        entry = analysis.join(t for (j, _), t in zip(prev_inds_asts, transed) if j != loop.back)
+        x = analysis.stabilize(analysis.exit_loop(loop, entry, N))
+        ret += [((i, e), x) for e in loop.exits]
+    return ret
+
+def chaotic_iteration(cfg: nx.DiGraph,
+                      analysis: analysis.BaseAnalysis,
+                      verbose=False,
+                      instrument: Optional[Instrumentation] = None,
+                      budget: Optional[MemoryBudget] = None):
+    cfg, rev_cfg, start_node, X = _init_iteration(cfg, analysis, budget)
+    n = len(cfg)
+    loops = find_counting_loops(cfg)
+    # (loop head, exit node) -> the value its exit edge transforms
+    exits = {}
+    if instrument is not None:
+        analysis = instrument.wrap(analysis, cfg)
 
     initial_worklist_nodes = range(n)
     work_s = set(initial_worklist_nodes)
@@ -35,31 +76,124 @@ def chaotic_iteration(cfg: nx.DiGraph,
     while work_s:
         # no randomization
         i = work_s.pop()
+        if instrument is not None: instrument.visit(i, len(work_s))
 
         # In our version we analyze what we know BEFORE each program
         # pointer instead of after, this causes a small change in the
         # transformation process - the transformers are applied before
         # joining instead of the other way around.
         prev_inds_asts = list((j, d['ast']) for j,d in rev_cfg[i].items())
-        transed = list(analysis.transform(ast,X[j]) for j, ast in prev_inds_asts)
+        transed = list(analysis.transform(ast, exits.get((j, i), X[j]))
+                       for j, ast in prev_inds_asts)
 
         if verbose: print(f"[{num_iter}] i={i}\nX[i]={X[i]}\nprev_inds_asts={prev_inds_asts}\ntransed:\n{transed}\n")
 
         N = analysis.join(transed)
+        N = analysis.accumulate(X[i], N)
+        for loop in loops.get(i, ()):
+            N = analysis.accelerate_loop(loop, N)
         if verbose: print(f"N={N}\n\n")
 
         # See the stabilize method documention in BaseAnalysis class
         # for documentation
         N = analysis.stabilize(N)
+        if budget is not None:
+            N = _fit_budget(budget, analysis, cfg, i, N)
 
         if not analysis.equiv(N,X[i]):
             X[i] = N
+            if budget is not None:
+                budget.account(analysis, cfg.nodes[i]['original_label'], N)
             work_s.update(cfg[i])
+        for edge, x in _exit_values(analysis, loops, i, prev_inds_asts, transed, N):
+            if edge not in exits or not analysis.equiv(x, exits[edge]):
+                exits[edge] = x
+                work_s.add(edge[1])
         num_iter+=1
         if num_iter>=MAX_ITERATIONS:
             assert False, f"Iteration didn't finish in {MAX_ITERATIONS} iterations."
+    if instrument is not None: instrument.finish()
+    return {cfg.nodes[i]['original_label']:X[i] for i in range(n)}
+
+def frontier_iteration(cfg: nx.DiGraph,
+                       analysis: analysis.BaseAnalysis,
+                       verbose=False,
+                       instrument: Optional[Instrumentation] = None,
+                       budget: Optional[MemoryBudget] = None):
+    """Computes the same fixpoint as chaotic_iteration, in rounds.
+
+    Every round collects all the ready nodes (the frontier), and transforms
+    the values of all of their incoming edges in a single call to
+    analysis.transform_batch - allowing vectorized analyses to process
+    the whole round at once. The new values of the frontier nodes are
+    only committed after the entire round has been computed.
+    """
+    cfg, rev_cfg, start_node, X = _init_iteration(cfg, analysis, budget)
+    n = len(cfg)
+    loops = find_counting_loops(cfg)
+    # (loop head, exit node) -> the value its exit edge transforms
+    exits = {}
+    if instrument is not None:
+        analysis = instrument.wrap(analysis, cfg)
+
+    frontier = set(range(n))
+    frontier.remove(start_node)
+
+    num_iter = 0
+    num_round = 0
+    while frontier:
+        nodes = sorted(frontier)
+        frontier = set()
+
+        prev_inds_asts = [list((j, d['ast']) for j,d in rev_cfg[i].items())
+                          for i in nodes]
+        transed = analysis.transform_batch((ast, exits.get((j, i), X[j]))
+                                           for i, preds in zip(nodes, prev_inds_asts)
+                                           for j, ast in preds)
+
+        updates = []
+        exit_updates = []
+        pos = 0
+        for k, (i, preds) in enumerate(zip(nodes, prev_inds_asts)):
+            if instrument is not None: instrument.visit(i, len(nodes)-k-1)
+            node_transed = transed[pos:pos+len(preds)]
+            N = analysis.join(node_transed)
+            N = analysis.accumulate(X[i], N)
+            for loop in loops.get(i, ()):
+                N = analysis.accelerate_loop(loop, N)
+            pos += len(preds)
+            N = analysis.stabilize(N)
+            if budget is not None:
+                N = _fit_budget(budget, analysis, cfg, i, N)
+            updates.append((i, N))
+            exit_updates += _exit_values(analysis, loops, i, preds, node_transed, N)
+
+        if verbose: print(f"[round {num_round}] frontier={nodes}\n")
+
+        for i, N in updates:
+            if not analysis.equiv(N,X[i]):
+                if verbose: print(f"X[{i}]={N}\n")
+                X[i] = N
+                if budget is not None:
+                    budget.account(analysis, cfg.nodes[i]['original_label'], N)
+                frontier.update(cfg[i])
+        for edge, x in exit_updates:
+            if edge not in exits or not analysis.equiv(x, exits[edge]):
+                exits[edge] = x
+                frontier.add(edge[1])
+
+        num_round += 1
+        num_iter += len(nodes)
+        if num_iter>=MAX_ITERATIONS:
+            assert False, f"Iteration didn't finish in {MAX_ITERATIONS} iterations."
+    if instrument is not None: instrument.finish()
     return {cfg.nodes[i]['original_label']:X[i] for i in range(n)}
 
+ITERATIONS = {
+    "chaotic": chaotic_iteration,
+    "frontier": frontier_iteration,
+}
+
 def _print_fixpoint(res):
     print('\n'.join(f'{i}. {res[i]}' for i in res.keys()))
 
@@ -82,12 +216,94 @@ def verify_assertions(analysis: analysis.BaseAnalysis,
     Returns a dictionary mapping each tuple in `assertions` (see get_all_assertions documention)
     to a boolean that indicates whether the assertion could be validated (always holds) or not.
     """
-    d = dict()
-    for label_ind, assertion in assertions:
-        d[(label_ind, assertion)] = analysis.verify_assertion(assertion, fixpoint[label_ind])
-    return d
+    verdicts = analysis.verify_assertion_batch(
+        (assertion, fixpoint[label_ind]) for label_ind, assertion in assertions)
+    return dict(zip(assertions, verdicts))
+
+def analyze_cfg(cfg: nx.DiGraph, analysis: analysis.BaseAnalysis,
+                iteration=chaotic_iteration,
+                instrument: Optional[Instrumentation] = None,
+                budget: Optional[MemoryBudget] = None):
+    """Analyzes a parsed program and verifies its assertions.
 
-def debug_analysis(method: Type[analysis.BaseAnalysis], verbose=False):
+    Returns the dictionary returned from verify_assertions.
+    """
+    assertions = get_all_assertions(cfg)
+    fixpoint = iteration(cfg, analysis, instrument=instrument, budget=budget)
+    return verify_assertions(analysis, assertions, fixpoint)
+
+def _analyze_program(text: str, method: Type[analysis.BaseAnalysis],
+                     iteration=chaotic_iteration,
+                     instrument: Optional[Instrumentation] = None,
+                     budget: Optional[MemoryBudget] = None):
+    """Parses and analyzes a program, see analyze_cfg.
+
+    Returns a tuple of the form: (the analysis instance, the dictionary
+    returned from verify_assertions).
+    """
+    from parser import Parser
+    p = Parser(text)
+    cfg, num_vars = p.parse_complete_program()
+    analysis = method(num_vars)
+    return analysis, analyze_cfg(cfg, analysis, iteration, instrument, budget)
+
+def format_verdicts(conclusions) -> List[Dict]:
+    """Converts the dictionary returned from verify_assertions into a JSON
+    serializable list of verdicts, see analyze_text."""
+    return [{"label": label_ind, "assertion": str(assertion),
+             "verified": bool(verified)}
+            for (label_ind, assertion), verified in conclusions.items()]
+
+def analyze_text(text: str, method,
+                 iteration=chaotic_iteration,
+                 instrument: Optional[Instrumentation] = None,
+                 budget: Optional[MemoryBudget] = None) -> Dict:
+    """Analyzes the program given in text and returns its verdicts.
+
+    method is either an analysis class or a name registered in registry.py.
+    Unlike run_analysis, nothing is printed and no threads are started.
+    Returns a JSON serializable dictionary of the form:
+      {"analysis": analysis class name,
+       "verdicts": [{"label": label index, "assertion": assertion text,
+                     "verified": whether the assertion was proven}, ...]}
+    For the "auto" method, the analysis and the iteration algorithm are
+    selected by auto_select.py and the dictionary has an additional
+    "selection" entry (see auto_select.Selection.to_dict).
+    Given a memory budget, the dictionary has an additional "memory" entry
+    (see MemoryBudget.report), listing the labels that were coarsened.
+    If the analysis reports statistics (see BaseAnalysis.stats), they are
+    given in an additional "stats" entry.
+    """
+    from parser import Parser
+    cfg, num_vars = Parser(text).parse_complete_program()
+    result = {}
+    if isinstance(method, str):
+        from registry import get_analysis, canonical_name, AUTO_ANALYSIS
+        if canonical_name(method) == AUTO_ANALYSIS:
+            from auto_select import select_configuration
+            selection = select_configuration(cfg, num_vars)
+            method, iteration = selection.analysis, ITERATIONS[selection.iteration]
+            result["selection"] = selection.to_dict()
+        method = get_analysis(method)
+    analysis = method(num_vars)
+    conclusions = analyze_cfg(cfg, analysis, iteration, instrument, budget)
+    result.update({"analysis": method.__name__,
+                   "verdicts": format_verdicts(conclusions)})
+    if budget is not None:
+        result["memory"] = budget.report()
+    stats = analysis.stats()
+    if stats:
+        result["stats"] = stats
+    return result
+
+def analyze_file(path: str, method, **kwargs) -> Dict:
+    """Analyzes the program in the file at path, see analyze_text."""
+    with open(path, 'r') as f:
+        text = f.read()
+    return analyze_text(text, method, **kwargs)
+
+def debug_analysis(method: Type[analysis.BaseAnalysis], verbose=False,
+                   iteration=chaotic_iteration):
     from parser import Parser
     from sys import argv
     fname = argv[1]
@@ -96,7 +312,7 @@ def debug_analysis(method: Type[analysis.BaseAnalysis], verbose=False):
     p = Parser(text)
     cfg, num_vars = p.parse_complete_program()
     analysis = method(num_vars)
-    fixpoint = chaotic_iteration(cfg, analysis, verbose=verbose)
+    fixpoint = iteration(cfg, analysis, verbose=verbose)
     _print_fixpoint(fixpoint)
 
 def print_analysis_results(conclusions):
@@ -128,37 +344,56 @@ def print_analysis_results(conclusions):
             print(f"  {STYLE_RED}*{STYLE_RESET} {STYLE_BOLD}L{label_ind}{STYLE_RESET}", end=" ")
             print(assertion)
 
-def loading_msg(fname):
+def loading_msg(fname, done_analyzing: Event):
     print(f"Analyzing {fname}... ", end="", flush=True)
     spinner = "|/-\\"
     i = 0
-    while not done_analyzing:
+    # Waiting on the event lets the spinner stop as soon as the analysis
+    # is done, so short runs don't pay for a whole tick
+    while not done_analyzing.wait(0.1):
         i = (i + 1) % len(spinner)
         print(f"{spinner[i]}\b", end="", flush=True)
-        sleep(0.1)
     print("done.\n")
 
-done_analyzing = False
-def run_analysis(method: Type[analysis.BaseAnalysis]):
-    global done_analyzing
-    from threading import Thread
-    from parser import Parser
+def run_analysis(method: Type[analysis.BaseAnalysis],
+                 iteration=chaotic_iteration,
+                 instrument: Optional[str] = None,
+                 budget: Optional[MemoryBudget] = None):
+    """Analyzes the program whose filename is given as the first command
+    line argument and prints the verification results of its assertions.
+
+    If instrument is given, the fixpoint computation is instrumented and
+    its statistics are written into the file f"{instrument}.json", along
+    with a Chrome trace-event file f"{instrument}.trace.json".
+    If a memory budget is given, the labels coarsened to fit in it are
+    printed as well. With either of them the statistics of the analysis
+    (if any) are printed too.
+    """
     from sys import argv
     from os.path import basename
-    done_analyzing = False
     fname = argv[1]
     with open(fname, 'r') as f:
         text = f.read()
     print(f"Program:\n{text}")
     longest_line_len = max(map(len,text.splitlines()))
     print("-"*longest_line_len+"\n")
-    Thread(target=loading_msg, args=(basename(fname),)).start()
-    p = Parser(text)
-    cfg, num_vars = p.parse_complete_program()
-    analysis = method(num_vars)
-    assertions = get_all_assertions(cfg)
-    fixpoint = chaotic_iteration(cfg, analysis)
-    conclusions = verify_assertions(analysis, assertions, fixpoint)
-    done_analyzing = True
-    sleep(0.05)
+    done_analyzing = Event()
+    spinner = Thread(target=loading_msg, args=(basename(fname), done_analyzing))
+    spinner.start()
+    instrumentation = Instrumentation(record_events=True) if instrument else None
+    try:
+        analysis, conclusions = _analyze_program(text, method, iteration,
+                                                 instrumentation, budget)
+    finally:
+        done_analyzing.set()
+        spinner.join()
     print_analysis_results(conclusions)
+    if budget is not None and budget.coarsened:
+        print(f"\nLabels coarsened to fit the memory budget: "
+              + ', '.join(f"L{l}" for l in sorted(budget.coarsened)))
+    stats = analysis.stats() if instrument or budget is not None else None
+    if stats:
+        print("\nAnalysis statistics: " + ', '.join(f"{k}={v}" for k, v in stats.items()))
+    if instrumentation is not None:
+        instrumentation.write_json(f"{instrument}.json")
+        instrumentation.write_chrome_trace(f"{instrument}.trace.json")
@@ -14,6 +14,19 @@ class SyntaxNode(object):
         attrs = ", ".join(f"{n}: {v}" for n, v in self._attributes())
         return  f"{self.__class__.__name__} {{{attrs}}}"
 
+    def key(self):
+        """A hashable key of the node, which nodes of the same structure
+        over the same variable ids share (unlike str, as names only
+        identify variables within a program)."""
+        return (self.__class__.__name__,) + tuple(_key(v) for v in vars(self).values())
+
+def _key(value):
+    if isinstance(value, SyntaxNode):
+        return value.key()
+    if isinstance(value, list):
+        return tuple(map(_key, value))
+    return value
+
 # ===============================================
 #      Var
 # ===============================================
@@ -23,6 +36,7 @@ class Var(SyntaxNode):
         self.id = id
 
     __str__ = lambda self: self.name
+    key = lambda self: self.id
 
 
 # ===============================================
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Automatic selection of the analysis configuration of a program.
+
+Inspects the parsed control flow graph (number of variables, labels and
+loops, `?` unknowns and the kinds of the assertions) and chooses an
+analysis (by its registry name) and a fixpoint iteration algorithm, along
+with the reasons for the choice.
+
+Usage: auto_select.py <program file>
+Prints the program features and the selection, then runs the selected
+analysis over the program.
+"""
+
+from typing import Dict, List
+
+import ast_nodes as ASTS
+
+# The explicit relational parity analyses track up to 2^num_vars
+# valuations per label, above this many variables the symbolic PABdd is
+# used for parity
+PAFULL_MAX_VARS = 12
+# Programs up to this many labels (with loops) are cheap enough for the
+# two-sided reduction
+FULL_REDUCTION_MAX_LABELS = 40
+
+
+class ProgramFeatures:
+    """The features of a program that the selection is based on."""
+
+    def __init__(self, cfg, num_vars: int):
+        self.num_vars = num_vars
+        self.num_labels = len(cfg)
+        self.num_loops = len(_loop_heads(cfg))
+        self.num_unknowns = 0
+        self.shape_statements = 0
+        self.parity_assertions = 0
+        self.sum_assertions = 0
+        self.other_assertions = 0
+        for _, _, ast in cfg.edges(data="ast"):
+            if isinstance(ast, ASTS.UnknownAssignment):
+                self.num_unknowns += 1
+            elif _is_shape_statement(ast):
+                self.shape_statements += 1
+            elif isinstance(ast, ASTS.Assert):
+                preds = [p for andc in ast.orc.andc_list for p in andc.pred_list]
+                if all(isinstance(p, (ASTS.TestEven, ASTS.TestOdd)) for p in preds):
+                    self.parity_assertions += 1
+                elif any(isinstance(p, ASTS.SumEq) for p in preds):
+                    self.sum_assertions += 1
+                else:
+                    self.other_assertions += 1
+
+    @property
+    def num_assertions(self) -> int:
+        return self.parity_assertions + self.sum_assertions + self.other_assertions
+
+    def to_dict(self) -> Dict:
+        return {"num_vars": self.num_vars, "num_labels": self.num_labels,
+                "num_loops": self.num_loops, "num_unknowns": self.num_unknowns,
+                "shape_statements": self.shape_statements,
+                "parity_assertions": self.parity_assertions,
+                "sum_assertions": self.sum_assertions,
+                "other_assertions": self.other_assertions}
+
+
+class Selection:
+    """A chosen analysis configuration along with the reasons for it."""
+
+    def __init__(self, analysis: str, iteration: str, reasons: List[str]):
+        self.analysis = analysis
+        self.iteration = iteration
+        self.reasons = reasons
+
+    def to_dict(self) -> Dict:
+        return {"analysis": self.analysis, "iteration": self.iteration,
+                "reasons": self.reasons}
+
+
+def _is_shape_statement(ast) -> bool:
+    """Returns whether ast is a shape assignment or assume."""
+    if isinstance(ast, (ASTS.NoSrcAssignment, ASTS.FromFieldAssignment,
+                        ASTS.IntoFieldAssignment)):
+        return True
+    return isinstance(ast, ASTS.Assume) and \
+        isinstance(ast.expr, (ASTS.NoRhsComp, ASTS.VarEqField, ASTS.VarNeqField))
+
+def _loop_heads(cfg) -> set:
+    """Returns the targets of the back edges of a depth first search."""
+    heads = set()
+    visited = set()
+    for root in cfg:
+        if root in visited:
+            continue
+        visited.add(root)
+        on_stack = {root}
+        stack = [(root, iter(cfg.successors(root)))]
+        while stack:
+            node, succs = stack[-1]
+            for succ in succs:
+                if succ in on_stack:
+                    heads.add(succ)
+                elif succ not in visited:
+                    visited.add(succ)
+                    on_stack.add(succ)
+                    stack.append((succ, iter(cfg.successors(succ))))
+                    break
+            else:
+                stack.pop()
+                on_stack.discard(node)
+    return heads
+
+def select_analysis(f: ProgramFeatures) -> Selection:
+    """Chooses the analysis and iteration algorithm for a program."""
+    reasons = []
+    needs_parity = f.parity_assertions > 0
+    needs_sum = f.sum_assertions + f.other_assertions > 0
+    small = f.num_vars <= PAFULL_MAX_VARS
+
+    if not (needs_parity or needs_sum):
+        analysis = "padumb"
+        reasons.append("no assertions to verify, using the cheapest analysis")
+    elif not needs_sum:
+        if small:
+            analysis = "pabitset"
+            reasons.append(f"only parity assertions and {f.num_vars} <= "
+                           f"{PAFULL_MAX_VARS} variables, using the relational parity analysis")
+        else:
+            analysis = "pabdd"
+            reasons.append(f"only parity assertions but {f.num_vars} > {PAFULL_MAX_VARS} "
+                           "variables, using the symbolic relational parity analysis")
+    elif not small:
+        analysis = "sumcolumnar"
+        reasons.append(f"{f.num_vars} > {PAFULL_MAX_VARS} variables, avoiding the "
+                       "exponential parity domain of the combined analyses")
+        if needs_parity:
+            reasons.append("parity assertions may remain unproven")
+    elif not needs_parity:
+        if f.num_loops == 0:
+            analysis = "sumcolumnar"
+            reasons.append("only SUM assertions and no loops, parity can't prune any path")
+        else:
+            analysis = "parityreduction"
+            reasons.append(f"only SUM assertions and {f.num_loops} loop(s), "
+                           "pruning summation cases by parity")
+    elif f.num_loops == 0 and f.num_unknowns == 0:
+        analysis = "noreduction"
+        reasons.append("both assertion kinds, but a loop-free program without "
+                       "unknowns doesn't need reduction")
+    elif f.num_labels <= FULL_REDUCTION_MAX_LABELS:
+        analysis = "fullreduction"
+        reasons.append(f"both assertion kinds and {f.num_labels} <= "
+                       f"{FULL_REDUCTION_MAX_LABELS} labels, affording the two-sided reduction")
+    elif f.parity_assertions >= f.sum_assertions + f.other_assertions:
+        analysis = "sumreduction"
+        reasons.append(f"both assertion kinds in {f.num_labels} > {FULL_REDUCTION_MAX_LABELS} "
+                       "labels, mostly parity assertions: refining parity by summation only")
+    else:
+        analysis = "parityreduction"
+        reasons.append(f"both assertion kinds in {f.num_labels} > {FULL_REDUCTION_MAX_LABELS} "
+                       "labels, mostly SUM assertions: pruning summation by parity only")
+
+    # None of the selected analyses batches its transforms (see
+    # BaseAnalysis.transform_batch), which the frontier iteration is for
+    return Selection(analysis, "chaotic", reasons)
+
+def select_configuration(cfg, num_vars: int) -> Selection:
+    """Chooses the analysis configuration of a parsed program."""
+    return select_analysis(ProgramFeatures(cfg, num_vars))
+
+
+def _main():
+    from sys import argv
+    from parser import Parser
+    from analyzer import run_analysis, ITERATIONS
+    from registry import get_analysis
+    with open(argv[1], 'r') as f:
+        text = f.read()
+    features = ProgramFeatures(*Parser(text).parse_complete_program())
+    selection = select_analysis(features)
+    print("Program features: " + ', '.join(f"{k}={v}" for k, v in features.to_dict().items()))
+    print(f"Selected analysis: {selection.analysis} ({selection.iteration} iteration)")
+    for reason in selection.reasons:
+        print(f"  - {reason}")
+    print()
+    run_analysis(get_analysis(selection.analysis), ITERATIONS[selection.iteration])
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Analyzes many programs in parallel and writes their verdicts as JSON.
+
+Usage: batch_analyze.py [-h] [--analysis NAME] [--jobs N] [--timeout SECONDS]
+                        [--pattern GLOB] [--output FILE] path [path ...]
+
+Every path is either a program file or a directory, which is walked
+recursively for files matching the pattern (*.prog by default).
+"""
+
+import argparse
+import json
+import os
+import signal
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from fnmatch import fnmatch
+from time import perf_counter
+from typing import Dict, Iterable, List, Optional
+
+from registry import analysis_names, canonical_name, AUTO_ANALYSIS, DEFAULT_ANALYSIS
+
+DEFAULT_TIMEOUT = 60
+
+
+class AnalysisTimeout(Exception):
+    pass
+
+def _raise_timeout(signum, frame):
+    raise AnalysisTimeout()
+
+
+def find_programs(paths: Iterable[str], pattern="*.prog") -> List[str]:
+    """Returns the sorted list of program files in the given paths."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files += [os.path.join(root, n) for n in names if fnmatch(n, pattern)]
+        else:
+            files.append(path)
+    return sorted(files)
+
+def analyze_one(path: str, analysis: str, timeout=DEFAULT_TIMEOUT,
+                memory_budget: Optional[int] = None) -> Dict:
+    """Analyzes a single program file, never raises.
+
+    Returns a dictionary with the file path, the status of the analysis
+    ("ok", "timeout" or "error"), its running time and its verdicts
+    (see analyzer.analyze_text). memory_budget is the total budget in
+    bytes of the lattice elements, see memory_budget.py.
+    """
+    from analyzer import analyze_file
+    from memory_budget import MemoryBudget
+    budget = MemoryBudget(memory_budget) if memory_budget else None
+    result = {"file": path, "status": "ok", "time": None, "verdicts": None}
+    old_handler = signal.signal(signal.SIGALRM, _raise_timeout)
+    t0 = perf_counter()
+    try:
+        signal.alarm(timeout)
+        result.update(analyze_file(path, analysis, budget=budget))
+    except AnalysisTimeout:
+        result["status"] = "timeout"
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        signal.alarm(0)
+        signal.signal(signal.SIGALRM, old_handler)
+    result["time"] = perf_counter() - t0
+    return result
+
+def analyze_batch(files: List[str], analysis: str, jobs=None,
+                  timeout=DEFAULT_TIMEOUT, memory_budget: Optional[int] = None) -> List[Dict]:
+    """Analyzes the files over a pool of jobs processes (one per CPU by
+    default). Returns the results of analyze_one in the order of files."""
+    analysis = canonical_name(analysis)
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(analyze_one, f, analysis, timeout, memory_budget) for f in files]
+        return [future.result() for future in futures]
+
+
+def _main():
+    argparser = argparse.ArgumentParser(description="Analyze many programs in parallel.")
+    argparser.add_argument("paths", nargs="+", help="program files or directories")
+    argparser.add_argument("--analysis", default=DEFAULT_ANALYSIS,
+                           help=f"analysis name out of: {', '.join(analysis_names() + [AUTO_ANALYSIS])}")
+    argparser.add_argument("--jobs", type=int, default=None,
+                           help="number of worker processes (default: CPU count)")
+    argparser.add_argument("--timeout", type=int, default=DEFAULT_TIMEOUT,
+                           help="per file timeout in seconds")
+    argparser.add_argument("--memory-budget", type=int, default=None,
+                           help="per file memory budget of the lattice elements in MiB")
+    argparser.add_argument("--pattern", default="*.prog",
+                           help="file name pattern of programs in directories")
+    argparser.add_argument("--output", help="JSON file to write the results into "
+                                            "(default: standard output)")
+    args = argparser.parse_args()
+
+    files = find_programs(args.paths, args.pattern)
+    memory_budget = args.memory_budget * 2**20 if args.memory_budget else None
+    results = analyze_batch(files, args.analysis, args.jobs, args.timeout, memory_budget)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Reduced ordered binary decision diagrams over a fixed number of variables.
+
+A BDD is represented by the integer id of its root node in the manager that
+created it. FALSE and TRUE are the terminal nodes 0 and 1, and every other
+node is a (var, low, high) triple kept unique by the manager's unique
+table - so two BDDs of the same manager represent the same function iff
+their ids are equal. Variables are ordered by their index.
+"""
+
+from typing import Dict, Iterable, Tuple
+
+FALSE = 0
+TRUE = 1
+
+
+class BDD:
+    """A manager of BDDs over the variables 0, ..., num_vars - 1.
+
+    Holds the unique table of the nodes along with caches of the results
+    of the operations, which are cleared once they grow beyond
+    MAX_CACHE_SIZE entries.
+    """
+
+    MAX_CACHE_SIZE = 1 << 18
+
+    def __init__(self, num_vars: int):
+        self.num_vars = num_vars
+        # The terminals are placed below all the variables
+        self._nodes = [(num_vars, FALSE, FALSE), (num_vars, TRUE, TRUE)]
+        self._unique: Dict[Tuple[int, int, int], int] = {}
+        self._and_cache: Dict[Tuple[int, int], int] = {}
+        self._or_cache: Dict[Tuple[int, int], int] = {}
+        self._not_cache: Dict[int, int] = {}
+        self._exists_cache: Dict[Tuple[int, int], int] = {}
+        self._restrict_cache: Dict[Tuple[int, int, bool], int] = {}
+
+    def __len__(self):
+        """Returns the number of nodes in the unique table."""
+        return len(self._nodes)
+
+    def _mk(self, var: int, low: int, high: int) -> int:
+        if low == high:
+            return low
+        key = (var, low, high)
+        u = self._unique.get(key)
+        if u is None:
+            u = len(self._nodes)
+            self._nodes.append(key)
+            self._unique[key] = u
+        return u
+
+    def _cached(self, cache: Dict, key, value: int) -> int:
+        if len(cache) >= self.MAX_CACHE_SIZE:
+            cache.clear()
+        cache[key] = value
+        return value
+
+    def top_var(self, u: int) -> int:
+        return self._nodes[u][0]
+
+    def var(self, i: int) -> int:
+        """Returns the BDD of the variable i."""
+        return self._mk(i, FALSE, TRUE)
+
+    def literal(self, i: int, value: bool) -> int:
+        """Returns the BDD of the variable i (or of its negation if not value)."""
+        return self._mk(i, FALSE, TRUE) if value else self._mk(i, TRUE, FALSE)
+
+    def equal_vars(self, i: int, j: int) -> int:
+        """Returns the BDD of (i <-> j)."""
+        if i == j:
+            return TRUE
+        i, j = min(i, j), max(i, j)
+        return self._mk(i, self._mk(j, TRUE, FALSE), self._mk(j, FALSE, TRUE))
+
+    def apply_and(self, u: int, v: int) -> int:
+        if u == FALSE or v == FALSE:
+            return FALSE
+        if u == TRUE or u == v:
+            return v
+        if v == TRUE:
+            return u
+        if u > v:
+            u, v = v, u
+        r = self._and_cache.get((u, v))
+        if r is not None:
+            return r
+        var_u, low_u, high_u = self._nodes[u]
+        var_v, low_v, high_v = self._nodes[v]
+        var = min(var_u, var_v)
+        if var_u != var:
+            low_u = high_u = u
+        if var_v != var:
+            low_v = high_v = v
+        r = self._mk(var, self.apply_and(low_u, low_v), self.apply_and(high_u, high_v))
+        return self._cached(self._and_cache, (u, v), r)
+
+    def apply_or(self, u: int, v: int) -> int:
+        if u == TRUE or v == TRUE:
+            return TRUE
+        if u == FALSE or u == v:
+            return v
+        if v == FALSE:
+            return u
+        if u > v:
+            u, v = v, u
+        r = self._or_cache.get((u, v))
+        if r is not None:
+            return r
+        var_u, low_u, high_u = self._nodes[u]
+        var_v, low_v, high_v = self._nodes[v]
+        var = min(var_u, var_v)
+        if var_u != var:
+            low_u = high_u = u
+        if var_v != var:
+            low_v = high_v = v
+        r = self._mk(var, self.apply_or(low_u, low_v), self.apply_or(high_u, high_v))
+        return self._cached(self._or_cache, (u, v), r)
+
+    def apply_not(self, u: int) -> int:
+        if u <= TRUE:
+            return TRUE - u
+        r = self._not_cache.get(u)
+        if r is not None:
+            return r
+        var, low, high = self._nodes[u]
+        r = self._mk(var, self.apply_not(low), self.apply_not(high))
+        return self._cached(self._not_cache, u, r)
+
+    def conjoin(self, us: Iterable[int]) -> int:
+        r = TRUE
+        for u in us:
+            r = self.apply_and(r, u)
+        return r
+
+    def disjoin(self, us: Iterable[int]) -> int:
+        r = FALSE
+        for u in us:
+            r = self.apply_or(r, u)
+        return r
+
+    def restrict(self, u: int, i: int, value: bool) -> int:
+        """Returns the BDD of u with the variable i fixed to value."""
+        var, low, high = self._nodes[u]
+        if var > i:
+            return u
+        if var == i:
+            return high if value else low
+        key = (u, i, value)
+        r = self._restrict_cache.get(key)
+        if r is not None:
+            return r
+        r = self._mk(var, self.restrict(low, i, value), self.restrict(high, i, value))
+        return self._cached(self._restrict_cache, key, r)
+
+    def exists(self, u: int, i: int) -> int:
+        """Returns the BDD of (exists i. u)."""
+        var, low, high = self._nodes[u]
+        if var > i:
+            return u
+        if var == i:
+            return self.apply_or(low, high)
+        r = self._exists_cache.get((u, i))
+        if r is not None:
+            return r
+        r = self._mk(var, self.exists(low, i), self.exists(high, i))
+        return self._cached(self._exists_cache, (u, i), r)
+
+    def negate_var(self, u: int, i: int) -> int:
+        """Returns the BDD of u with the variable i replaced by its negation."""
+        return self.apply_or(
+            self.apply_and(self.literal(i, False), self.restrict(u, i, True)),
+            self.apply_and(self.literal(i, True), self.restrict(u, i, False)))
+
+    def implies(self, u: int, v: int) -> bool:
+        """Returns True iff u -> v is valid."""
+        return self.apply_and(u, self.apply_not(v)) == FALSE
+
+    def node_count(self, u: int) -> int:
+        """Returns the number of nodes reachable from u (terminals included)."""
+        seen = set()
+        stack = [u]
+        while stack:
+            w = stack.pop()
+            if w in seen:
+                continue
+            seen.add(w)
+            if w > TRUE:
+                _, low, high = self._nodes[w]
+                stack += [low, high]
+        return len(seen)
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Scaling benchmark of the analyses over synthetic programs.
+
+Every sweep varies a single parameter of program_generator.generate_program
+(keeping the rest at BASE_PARAMS) and runs every analysis over the
+generated programs, recording the running time, the peak memory and the
+number of fixpoint iterations.
+
+Usage: benchmark.py [-h] [--sweeps SWEEPS] [--analyses ANALYSES] [--seeds N]
+                    [--timeout SECONDS] [--no-memory] [--output FILE]
+"""
+
+import argparse
+import json
+import signal
+import tracemalloc
+from statistics import median
+from time import perf_counter
+from typing import Dict, List
+
+from parser import Parser
+from analyzer import chaotic_iteration, get_all_assertions, verify_assertions
+from instrumentation import Instrumentation
+from program_generator import generate_program
+from parity_analysis import PADumb, PAFull
+from parity_bitset import PABitset
+from parity_bdd import PABdd
+from parity_affine import PAAffine
+from summation_analysis import (SummationAnalysis, SummationAnalysisBounded,
+                                SummationAnalysisAntichain)
+from summation_columnar import SummationColumnar
+from karr_analysis import KarrAnalysis
+from combination_analysis import (CombinedAnalysis, CombinedAnalysisReductive,
+                                  CombinedAnalysisLeftReductive,
+                                  CombinedAnalysisRightReductive)
+from reduced_product import ReducedProduct, ReducedProductKarr
+
+ANALYSES = {
+    "PADumb": PADumb,
+    "PAFull": PAFull,
+    "PABitset": PABitset,
+    "PABdd": PABdd,
+    "PAAffine": PAAffine,
+    "SummationAnalysis": SummationAnalysis,
+    "SummationAnalysisBounded": SummationAnalysisBounded,
+    "SummationAnalysisAntichain": SummationAnalysisAntichain,
+    "SummationColumnar": SummationColumnar,
+    "KarrAnalysis": KarrAnalysis,
+    "CombinedAnalysis": CombinedAnalysis,
+    "CombinedAnalysisReductive": CombinedAnalysisReductive,
+    "CombinedAnalysisLeftReductive": CombinedAnalysisLeftReductive,
+    "CombinedAnalysisRightReductive": CombinedAnalysisRightReductive,
+    "ReducedProduct": ReducedProduct,
+    "ReducedProductKarr": ReducedProductKarr,
+}
+
+BASE_PARAMS = dict(num_vars=4, num_labels=20, loop_depth=1, unknowns=2,
+                   fanout=2, assertions=4, parity_ratio=0.5)
+
+# sweep name -> (generator parameter, values)
+SWEEPS = {
+    "vars": ("num_vars", [2, 4, 6, 8, 10, 12]),
+    "labels": ("num_labels", [10, 20, 40, 80, 160]),
+    "loops": ("loop_depth", [0, 1, 2, 3]),
+    "unknowns": ("unknowns", [0, 1, 2, 4, 8]),
+    "fanout": ("fanout", [1, 2, 3, 4]),
+    "assertions": ("parity_ratio", [0.0, 0.5, 1.0]),
+    # Compares the parity analyses, e.g. --analyses PAFull,PABdd,PAAffine
+    "manyvars": ("num_vars", [8, 12, 16, 20, 32, 64]),
+}
+
+DEFAULT_TIMEOUT = 30
+
+# Analyses whose TOP element is exponential in the number of variables are
+# skipped above these many variables, as building it can neither be
+# interrupted by the timeout nor fit in memory
+MAX_VARS = {
+    "PAFull": 20,
+    "PABitset": 24,
+    "ReducedProduct": 24,
+    "ReducedProductKarr": 24,
+}
+
+
+class BenchmarkTimeout(Exception):
+    pass
+
+def _raise_timeout(signum, frame):
+    raise BenchmarkTimeout()
+
+
+def _analyze(cfg, num_vars, method, instrument=None):
+    analysis = method(num_vars)
+    fixpoint = chaotic_iteration(cfg, analysis, instrument=instrument)
+    return verify_assertions(analysis, get_all_assertions(cfg), fixpoint)
+
+def run_benchmark(text: str, method, timeout=DEFAULT_TIMEOUT,
+                  measure_memory=True) -> Dict:
+    """Runs a single analysis over the program text.
+
+    The running time is measured on a plain run, the peak memory and the
+    number of iterations are measured on a second, instrumented, run.
+    Returns a dictionary of the measurements, whose "status" is one of
+    "ok", "timeout", "diverged" (the iteration didn't converge), "error"
+    or "skipped" (the program has too many variables, see MAX_VARS).
+    """
+    cfg, num_vars = Parser(text).parse_complete_program()
+    record = {"status": "ok", "error": None, "time": None, "peak_memory": None,
+              "iterations": None, "proven": None,
+              "assertions": len(get_all_assertions(cfg))}
+    if num_vars > MAX_VARS.get(method.__name__, num_vars):
+        record["status"] = "skipped"
+        return record
+    old_handler = signal.signal(signal.SIGALRM, _raise_timeout)
+    try:
+        signal.alarm(timeout)
+        t0 = perf_counter()
+        conclusions = _analyze(cfg, num_vars, method)
+        record["time"] = perf_counter() - t0
+        record["proven"] = sum(conclusions.values())
+
+        instrument = Instrumentation()
+        if measure_memory:
+            tracemalloc.start()
+        try:
+            _analyze(cfg, num_vars, method, instrument)
+            if measure_memory:
+                record["peak_memory"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            if measure_memory:
+                tracemalloc.stop()
+        record["iterations"] = instrument.num_iterations
+    except BenchmarkTimeout:
+        record["status"] = "timeout"
+    except AssertionError:
+        record["status"] = "diverged"
+    except Exception as e:
+        record["status"] = "error"
+        record["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        signal.alarm(0)
+        signal.signal(signal.SIGALRM, old_handler)
+    return record
+
+def run_sweep(name: str, analyses: Dict, seeds=3, timeout=DEFAULT_TIMEOUT,
+              measure_memory=True, verbose=True) -> List[Dict]:
+    """Runs every analysis over the programs of a single sweep."""
+    param, values = SWEEPS[name]
+    records = []
+    for value in values:
+        for seed in range(seeds):
+            params = dict(BASE_PARAMS, seed=seed)
+            params[param] = value
+            text = generate_program(**params)
+            for analysis_name, method in analyses.items():
+                record = run_benchmark(text, method, timeout, measure_memory)
+                record.update(sweep=name, param=param, value=value,
+                              seed=seed, analysis=analysis_name)
+                records.append(record)
+                if verbose:
+                    print(f"  {name}: {param}={value} seed={seed} "
+                          f"{analysis_name}: {record['status']}", flush=True)
+    return records
+
+def scaling_curves(records: List[Dict]) -> Dict:
+    """Aggregates benchmark records into curves of the form:
+    {sweep: {analysis: [{value, time, peak_memory, iterations, failures}]}},
+    where each measurement is the median over the successful runs.
+    """
+    groups = {}
+    for r in records:
+        key = (r["sweep"], r["analysis"], r["value"])
+        groups.setdefault(key, []).append(r)
+    curves = {}
+    for (sweep, analysis, value), rs in groups.items():
+        ok = [r for r in rs if r["status"] == "ok"]
+        def med(field):
+            vals = [r[field] for r in ok if r[field] is not None]
+            return median(vals) if vals else None
+        point = {"value": value, "time": med("time"),
+                 "peak_memory": med("peak_memory"),
+                 "iterations": med("iterations"),
+                 "failures": len(rs) - len(ok)}
+        curves.setdefault(sweep, {}).setdefault(analysis, []).append(point)
+    return curves
+
+def print_curves(curves: Dict):
+    for sweep, by_analysis in curves.items():
+        param = SWEEPS[sweep][0]
+        values = [p["value"] for p in next(iter(by_analysis.values()))]
+        print(f"\n===== {sweep} (median time [ms] / peak memory [KiB] / iterations) =====")
+        print(f"{param:>30} " + ''.join(f"{v:>22}" for v in values))
+        for analysis, points in by_analysis.items():
+            cells = []
+            for p in points:
+                if p["time"] is None:
+                    cells.append("-")
+                else:
+                    mem = "?" if p["peak_memory"] is None else f"{p['peak_memory']/1024:.0f}"
+                    fail = f"!{p['failures']}" if p["failures"] else ""
+                    cells.append(f"{p['time']*1000:.1f}/{mem}/{p['iterations']:.0f}{fail}")
+            print(f"{analysis:>30} " + ''.join(f"{c:>22}" for c in cells))
+
+
+def _main():
+    argparser = argparse.ArgumentParser(description="Scaling benchmark of the analyses.")
+    argparser.add_argument("--sweeps", default=','.join(SWEEPS),
+                           help=f"comma separated sweeps out of: {', '.join(SWEEPS)}")
+    argparser.add_argument("--analyses", default=','.join(ANALYSES),
+                           help=f"comma separated analyses out of: {', '.join(ANALYSES)}")
+    argparser.add_argument("--seeds", type=int, default=3,
+                           help="number of programs generated per measurement")
+    argparser.add_argument("--timeout", type=int, default=DEFAULT_TIMEOUT,
+                           help="timeout in seconds of a single analysis run")
+    argparser.add_argument("--no-memory", action="store_true",
+                           help="do not measure the peak memory")
+    argparser.add_argument("--output", help="JSON file to write the results into")
+    args = argparser.parse_args()
+
+    analyses = {name: ANALYSES[name] for name in args.analyses.split(',')}
+    records = []
+    for sweep in args.sweeps.split(','):
+        records += run_sweep(sweep, analyses, args.seeds, args.timeout,
+                             not args.no_memory)
+    curves = scaling_curves(records)
+    print_curves(curves)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"records": records, "curves": curves}, f, indent=2)
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable
+
+
+class LRUCache:
+    """A bounded mapping which evicts its least recently used entries.
+
+    Keeps hit/miss/eviction counters, see stats().
+    """
+
+    def __init__(self, maxsize=128):
+        assert maxsize > 0, "The cache size must be positive"
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key: Hashable, default=None):
+        """Returns the value cached under key (or default if missing)."""
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def lookup(self, key: Hashable, compute: Callable[[], object]):
+        """Returns the value cached under key, computing and caching it
+        by calling compute() if missing."""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        self._data.clear()
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict:
+        return {"size": len(self._data), "maxsize": self.maxsize,
+                "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "hit_rate": self.hit_rate}
+
+_MISSING = object()
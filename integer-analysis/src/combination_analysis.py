@@ -1,16 +1,17 @@
 #!/usr/bin/env python3
 
-from abc import ABC, abstractmethod
 from analysis import BaseAnalysis
-from analyzer import debug_analysis, run_analysis
+from cache import LRUCache
 from summation_analysis import SummationAnalysis, AbsVal
-from parity_analysis import PAFull
 import ast_nodes as ASTS
 from typing import Dict, Optional, Union, Iterable, List
 
 class CombinedAnalysis(BaseAnalysis):
     def __init__(self, num_vars):
-        self.left = PAFull(num_vars)
+        # Imported here so that importing this module does not load numpy.
+        # PABitset computes the same elements as PAFull, only faster.
+        from parity_bitset import PABitset
+        self.left = PABitset(num_vars)
         self.right = SummationAnalysis(num_vars)
 
     def bottom(self):
@@ -32,6 +33,17 @@ class CombinedAnalysis(BaseAnalysis):
         return (self.left.verify_assertion(ass, left) or
                 self.right.verify_assertion(ass, right))
 
+    def verify_assertion_batch(self, pairs):
+        pairs = list(pairs)
+        ret = self.left.verify_assertion_batch((ass, left) for ass, (left, _) in pairs)
+        # Only the assertions that the left analysis couldn't prove are
+        # verified by the right one
+        rest = [k for k, proven in enumerate(ret) if not proven]
+        for k, proven in zip(rest, self.right.verify_assertion_batch(
+                (pairs[k][0], pairs[k][1][1]) for k in rest)):
+            ret[k] = proven
+        return ret
+
     def transform_nontrivial(self, ast: ASTS.SyntaxNode, x):
         left, right = x
         return (self.left.transform_nontrivial(ast, left),
@@ -49,86 +61,275 @@ class CombinedAnalysis(BaseAnalysis):
         left, right = x
         return (self.left.stabilize(left), self.right.stabilize(right))
 
+    def state_size(self, x):
+        left, right = x
+        return self.left.state_size(left) + self.right.state_size(right)
+
+    def state_nbytes(self, x):
+        left, right = x
+        return self.left.state_nbytes(left) + self.right.state_nbytes(right)
+
+    def accumulate(self, old, new):
+        return (self.left.accumulate(old[0], new[0]),
+                self.right.accumulate(old[1], new[1]))
+
+    def accelerate_loop(self, loop, x):
+        return (self.left.accelerate_loop(loop, x[0]),
+                self.right.accelerate_loop(loop, x[1]))
+
+    def exit_loop(self, loop, entry, x):
+        return (self.left.exit_loop(loop, entry[0], x[0]),
+                self.right.exit_loop(loop, entry[1], x[1]))
+
+    def stats(self):
+        return {**self.left.stats(), **self.right.stats()}
+
+    def fresh(self):
+        ret = super().fresh()
+        ret.left, ret.right = self.left.fresh(), self.right.fresh()
+        return ret
+
+    def coarsen(self, x):
+        left, right = x
+        return (self.left.coarsen(left), self.right.coarsen(right))
+
+    def is_coarse(self, x):
+        left, right = x
+        return self.left.is_coarse(left) or self.right.is_coarse(right)
+
+def _case_pattern(right_c):
+    """Returns the constant-parity pattern (care, parity) of a single
+    summation case, see PABitset.pattern_mask: the bits of care are the
+    variables the case holds constants in, and the bits of parity are
+    their parities."""
+    care = parity = 0
+    for i, v in enumerate(right_c):
+        match v:
+            case AbsVal(unknown=None, const=const):
+                care |= 1 << i
+                parity |= (const & 1) << i
+    return care, parity
+
+def _has_masks(parity: BaseAnalysis, left) -> bool:
+    """Returns True iff left is a bitset of parity valuations, see PABitset
+    (rather than a coarsened or another parity analysis' value)."""
+    return isinstance(left, int) and hasattr(parity, "pattern_mask")
+
+def _case_masks(parity: BaseAnalysis, right) -> Dict:
+    """Returns a dictionary mapping the cases of right to the masks of the
+    parity valuations they allow."""
+    pattern_mask = parity.pattern_mask
+    return {c: pattern_mask(*_case_pattern(c)) for c in right}
+
+def _filter_right(right, masks: Dict, left):
+    kept = {c for c, mask in masks.items() if left & mask}
+    # Keep right itself when nothing is filtered (so that it stays interned)
+    return right if len(kept) == len(right) else kept
+
+def _assume_single_case_sum(parity: BaseAnalysis, left, right_c):
+    for i,v in enumerate(right_c):
+        match v:
+            case AbsVal(unknown=None, const=const):
+                left = parity.transform(
+                    ASTS.Assume(ASTS.VarConsEq(ASTS.Var("",i), const)),
+                    left)
+    return left
+
+def reduce_parity_by_summation(parity: BaseAnalysis, left, right):
+    """Returns the parity value left of the parity analysis parity, reduced
+    by the summation value right."""
+    if not _has_masks(parity, left):
+        return parity.stabilize(parity.join([_assume_single_case_sum(parity, left, r_case)
+                                             for r_case in right]))
+    allowed = 0
+    for mask in _case_masks(parity, right).values():
+        allowed |= mask
+    return left & allowed
+
+def reduce_summation_by_parity(parity: BaseAnalysis, left, right):
+    """Returns the summation value right, without the cases which the parity
+    value left (of the parity analysis parity) excludes."""
+    if not _has_masks(parity, left):
+        return set(c for c in right
+                   if not parity.is_bottom(_assume_single_case_sum(parity, left, c)))
+    return _filter_right(right, _case_masks(parity, right), left)
+
+def reduce_parity_summation(parity: BaseAnalysis, left, right):
+    """Reduces both the parity value left and the summation value right at
+    once, which is the same as reducing left and then right (and is
+    idempotent): a summation case which left excludes adds no valuations to
+    the reduced parity value."""
+    if not _has_masks(parity, left):
+        left = reduce_parity_by_summation(parity, left, right)
+        return left, reduce_summation_by_parity(parity, left, right)
+    masks = _case_masks(parity, right)
+    allowed = 0
+    for mask in masks.values():
+        allowed |= mask
+    return left & allowed, _filter_right(right, masks, left)
+
+# When CombinedAnalysisReductive reduces the values:
+#   always   - after every edge transform, and every value a label stores.
+#   join     - only the joined values of labels with several incoming edges
+#              (join points, which include all the loop heads).
+#   assert   - only the values assertions are verified against.
+#   adaptive - after every edge transform, but an edge whose last reduction
+#              changed nothing skips its next 1, 2, 4, ... reductions (up to
+#              MAX_BACKOFF), until one of them changes something again.
+# All the schedules but always also reduce before verifying assertions.
+SCHEDULES = ["always", "join", "assert", "adaptive"]
+
 class CombinedAnalysisReductive(CombinedAnalysis):
-    @abstractmethod
-    def reduce_left(self, x):
-        return x
+    SCHEDULE = "always"
+    MAX_BACKOFF = 64
+    # Reduced values are cached by the fingerprints of both of their sides,
+    # in an LRU cache of this many entries (None disables the cache)
+    REDUCTION_CACHE_SIZE = 4096
+
+    def __init__(self, num_vars, schedule: Optional[str] = None):
+        super().__init__(num_vars)
+        self.schedule = schedule or self.SCHEDULE
+        assert self.schedule in SCHEDULES, f'Unrecognized reduction schedule "{self.schedule}"'
+        # fingerprint -> (reduced x, whether the reduction changed x, rounds),
+        # which only depends on the values, so it is shared by fresh
+        self._reduced = (LRUCache(self.REDUCTION_CACHE_SIZE)
+                         if self.REDUCTION_CACHE_SIZE is not None else None)
+        self._reset()
+
+    def _reset(self):
+        self.reductions = 0
+        self.reduction_rounds = 0
+        self.skipped_reductions = 0
+        # id of an edge's AST -> (reductions left to skip, next backoff)
+        self._backoff = {}
+        self.saved_reduction_rounds = 0
+
+    def fresh(self):
+        ret = super().fresh()
+        ret._reset()
+        return ret
+
+    def reduce_both(self, x):
+        return reduce_parity_summation(self.left, *x)
 
-    @abstractmethod
-    def reduce_right(self, x):
-        return x
     def reduce_left(self, x):
         left, right = x
-        it = (self._reduce_left_by_single_case_sum(left, r_case)
-              for r_case in right)
-        it = list(it)
-        #print(f"it:\n{it}\n")
-        left = self.left.join(it)
-
-        return (left, right)
-    def _reduce_left_by_single_case_sum(self, left, right_c):
-        #print(f"right_c = {right_c}")
-        for i,v in enumerate(right_c):
-            #if isinstance(v, AbsVal) and v.unknown is None:
-            #    const = v.const
-            #print(f"i={i}, v={v}")
-            match v:
-                case AbsVal(unknown=None, const=const):
-                    #print(f"entered case! const={const}")
-                    #print(f"left before = {left}")
-                    left = self.left.transform(
-                        ASTS.Assume(ASTS.VarConsEq(ASTS.Var("",i), const)),
-                        left)
-                    #print(f"left after = {left}")
-        return left
+        return (reduce_parity_by_summation(self.left, left, right), right)
 
     def reduce_right(self, x):
         left, right = x
-        possible_by_left = (lambda c:
-                        self._single_sum_case_is_possible_by_left(left, c))
-        right = set(filter(possible_by_left, right))
-        return (left, right)
+        return (left, reduce_summation_by_parity(self.left, left, right))
 
-    def _single_sum_case_is_possible_by_left(self, left, right_c):
-        return self._reduce_left_by_single_case_sum(left, right_c).size!=0
+    def reduce(self, x):
+        return self._reduce(x)[0]
 
+    def _fingerprint(self, x):
+        """Returns a hashable fingerprint of x, which is the same for equal
+        values, or None if its summation side has no canonical key (see
+        Lattice.key)."""
+        left, right = x
+        key = self.right.lattice().key(right)
+        return None if key is None else (left, key)
 
+    def _reduce(self, x):
+        """Returns a tuple of the form: (reduced x, whether the reduction
+        changed x)."""
+        self.reductions += 1
+        key = self._fingerprint(x) if self._reduced is not None else None
+        if key is None:
+            x, changed, _ = self._reduce_uncached(x)
+            return x, changed
+        cached = self._reduced.get(key)
+        if cached is not None:
+            x, changed, rounds = cached
+            self.saved_reduction_rounds += rounds
+            return x, changed
+        x, changed, rounds = self._reduce_uncached(x)
+        self._reduced.put(key, (x, changed, rounds))
+        return x, changed
 
-    def reduce(self, x):
+    def _reduce_uncached(self, x):
         MAX_REDUCTIONS = 100
-        for _ in range(MAX_REDUCTIONS):
+        for rounds in range(1, MAX_REDUCTIONS + 1):
             x_old = x
-            x = self.reduce_left(x)
-            x = self.reduce_right(x)
+            x = self.reduce_both(x)
             if self.equiv(x_old, x):
-                return x
+                self.reduction_rounds += rounds
+                return x, rounds > 1, rounds
         assert False, "Exceeded the max reduction cap {MAX_REDUCTIONS}"
 
+    def _reduce_adaptive(self, ast, x):
+        skip, backoff = self._backoff.get(id(ast), (0, 1))
+        if skip:
+            self.skipped_reductions += 1
+            self._backoff[id(ast)] = (skip - 1, backoff)
+            return x
+        x, changed = self._reduce(x)
+        self._backoff[id(ast)] = (0, 1) if changed else (backoff, min(2 * backoff, self.MAX_BACKOFF))
+        return x
+
     def transform(self, ast, x):
         x = super().transform(ast, x)
-        #left_old, right_old = x
-        x = self.reduce(x)
-        #left, right = x
-        #if not self.left.equiv(left_old, left):
-        #    print(f"left before: {left_old}")
-        #    print(f"left after: {left}")
+        if self.schedule == "always":
+            x = self.reduce(x)
+        elif self.schedule == "adaptive":
+            x = self._reduce_adaptive(ast, x)
+        return x
+
+    def join(self, l: Iterable):
+        l = list(l)
+        x = super().join(l)
+        if self.schedule == "join" and len(l) > 1:
+            x = self.reduce(x)
         return x
 
     def stabilize(self, x):
         x = super().stabilize(x)
-        x = self.reduce(x)
+        if self.schedule == "always":
+            x = self.reduce(x)
         return x
 
+    def verify_assertion(self, ass: ASTS.Assert, x):
+        if self.schedule != "always":
+            x = self.reduce(x)
+        return super().verify_assertion(ass, x)
+
+    def verify_assertion_batch(self, pairs):
+        if self.schedule != "always":
+            pairs = [(ass, self.reduce(x)) for ass, x in pairs]
+        return super().verify_assertion_batch(pairs)
+
+    def stats(self):
+        return {**super().stats(), "reduction_schedule": self.schedule,
+                "reductions": self.reductions, "reduction_rounds": self.reduction_rounds,
+                "skipped_reductions": self.skipped_reductions,
+                **self._reduction_cache_stats()}
+
+    def _reduction_cache_stats(self):
+        if self._reduced is None:
+            return {}
+        return {"reduction_cache_hits": self._reduced.hits,
+                "reduction_cache_misses": self._reduced.misses,
+                "reduction_cache_evictions": self._reduced.evictions,
+                "saved_reduction_rounds": self.saved_reduction_rounds}
+
 class CombinedAnalysisLeftReductive(CombinedAnalysisReductive):
     def reduce_right(self, x):
         return x
 
+    def reduce_both(self, x):
+        return self.reduce_left(x)
+
 class CombinedAnalysisRightReductive(CombinedAnalysisReductive):
     def reduce_left(self, x):
         return x
 
+    def reduce_both(self, x):
+        return self.reduce_right(x)
+
 def _main():
     import sys
+    from analyzer import run_analysis
     method_names = {
         CombinedAnalysisReductive: ["full", "reductive", "fullreductive", "both", "twosidereduction", "fullreduction"],
         CombinedAnalysisRightReductive: ["right", "rightreductive", "leftreduction", "parityreduction"],
@@ -142,6 +343,11 @@ def _main():
         name = sys.argv[NAME_PARAMETER_INDEX].lower()
         assert name in method_map, f'Unrecognized method name "{name}"'
         method = method_map[name]
+    SCHEDULE_PARAMETER_INDEX = 3
+    if len(sys.argv)>=SCHEDULE_PARAMETER_INDEX + 1:
+        from functools import partial
+        assert issubclass(method, CombinedAnalysisReductive), "Only reductive methods have a reduction schedule"
+        method = partial(method, schedule=sys.argv[SCHEDULE_PARAMETER_INDEX].lower())
     run_analysis(method)
     #from numpy import array
     #abs_0 = AbsVal(const=0)
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Low-overhead instrumentation of the fixpoint iteration algorithms.
+
+An Instrumentation object is passed to chaotic_iteration/frontier_iteration
+(see analyzer.py), which then report every node visit to it and run the
+analysis through a thin timing proxy. The collected data can be exported
+as JSON or as a Chrome trace-event file (viewable in chrome://tracing or
+https://ui.perfetto.dev).
+"""
+
+import json
+from collections import Counter, defaultdict
+from time import perf_counter
+from typing import Dict, List, Optional, Tuple
+
+from analysis import BaseAnalysis
+
+OPERATIONS = ("join", "equiv", "stabilize", "transform_batch")
+
+
+class Instrumentation:
+    """Collects statistics of a single fixpoint computation.
+
+    Collected data:
+      * Number of visits of every node (label).
+      * Total time and number of calls of the transform of every edge
+        (the edges of a vectorized transform_batch share its time evenly).
+      * Total time and number of calls of join/equiv/stabilize
+        (and of transform_batch, when iterating by frontiers).
+      * The size of the lattice element of every node after each of its
+        visits (see BaseAnalysis.state_size).
+      * The length of the worklist at every iteration.
+
+    When record_events is True, every timed operation is additionally
+    recorded as a separate event - this is required for exporting a
+    Chrome trace but makes the instrumentation more expensive.
+    """
+
+    def __init__(self, record_events=False):
+        self.record_events = record_events
+        self.node_visits: Counter = Counter()
+        self.edge_calls: Counter = Counter()
+        self.edge_time: Dict[Tuple[int, int], float] = defaultdict(float)
+        self.op_calls: Counter = Counter()
+        self.op_time: Dict[str, float] = defaultdict(float)
+        self.state_sizes: Dict[int, List[int]] = defaultdict(list)
+        self.worklist_lengths: List[int] = []
+        self.events: List[tuple] = []
+        self.total_time = 0.0
+        self._edges = {}
+        self._node = None
+        self._t_start = None
+
+    # ----- Engine hooks -----
+
+    def wrap(self, analysis, cfg):
+        """Starts the instrumentation of a fixpoint computation.
+
+        cfg is the integer labeled control flow graph used by the iteration
+        algorithm, returns the analysis to iterate with in place of the
+        given one.
+        """
+        labels = {i: d.get('original_label', i) for i, d in cfg.nodes(data=True)}
+        self._edges = {id(d['ast']): (labels[u], labels[v])
+                       for u, v, d in cfg.edges(data=True)}
+        self._labels = labels
+        self._t_start = perf_counter()
+        return _InstrumentedAnalysis(analysis, self)
+
+    def visit(self, node, worklist_len):
+        """Reports a visit of node, worklist_len nodes are still waiting."""
+        label = self._labels[node]
+        self._node = label
+        self.node_visits[label] += 1
+        self.worklist_lengths.append(worklist_len)
+        if self.record_events:
+            self.events.append(("C", "worklist", perf_counter(), 0,
+                                {"length": worklist_len}))
+
+    def finish(self):
+        """Ends the instrumentation of the fixpoint computation."""
+        self.total_time = perf_counter() - self._t_start
+
+    # ----- Analysis proxy hooks -----
+
+    def _edge(self, ast, t0, t1):
+        edge = self._edges.get(id(ast))
+        self.edge_calls[edge] += 1
+        self.edge_time[edge] += t1 - t0
+        if self.record_events:
+            self.events.append(("X", f"transform L{edge[0]}->L{edge[1]}"
+                                if edge else "transform", t0, t1 - t0, None))
+
+    def _op(self, name, t0, t1):
+        self.op_calls[name] += 1
+        self.op_time[name] += t1 - t0
+        if self.record_events:
+            self.events.append(("X", name, t0, t1 - t0, None))
+
+    def _size(self, size):
+        self.state_sizes[self._node].append(size)
+        if self.record_events:
+            self.events.append(("C", f"state size L{self._node}",
+                                perf_counter(), 0, {"size": size}))
+
+    # ----- Export -----
+
+    @property
+    def num_iterations(self):
+        return len(self.worklist_lengths)
+
+    def to_dict(self):
+        """Returns the collected statistics as a JSON serializable dict."""
+        return {
+            "iterations": self.num_iterations,
+            "total_time": self.total_time,
+            "node_visits": {f"L{l}": c for l, c in sorted(self.node_visits.items())},
+            "edge_transforms": [
+                {"edge": f"L{e[0]}->L{e[1]}" if e else None,
+                 "calls": self.edge_calls[e],
+                 "time": self.edge_time[e]}
+                for e in sorted(self.edge_calls, key=lambda e: -self.edge_time[e])],
+            "operations": {name: {"calls": self.op_calls[name],
+                                  "time": self.op_time[name]}
+                           for name in OPERATIONS if self.op_calls[name]},
+            "state_sizes": {f"L{l}": {"final": s[-1], "max": max(s)}
+                            for l, s in sorted(self.state_sizes.items())},
+            "worklist_lengths": self.worklist_lengths,
+        }
+
+    def to_chrome_trace(self):
+        """Returns the recorded events in the Chrome trace-event format."""
+        assert self.record_events, "Events were not recorded"
+        t_start = self._t_start
+        events = []
+        for ph, name, t, dur, args in self.events:
+            event = {"name": name, "ph": ph, "pid": 0, "tid": 0,
+                     "ts": (t - t_start) * 1e6}
+            if ph == "X":
+                event["dur"] = dur * 1e6
+            if args is not None:
+                event["args"] = args
+            events.append(event)
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def write_chrome_trace(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_chrome_trace(), f)
+
+
+class _InstrumentedAnalysis:
+    """Proxy of an analysis which reports the timing of its operations."""
+
+    def __init__(self, analysis, instrumentation: Instrumentation):
+        self._analysis = analysis
+        self._instr = instrumentation
+
+    def __getattr__(self, name):
+        return getattr(self._analysis, name)
+
+    def transform(self, ast, x):
+        t0 = perf_counter()
+        y = self._analysis.transform(ast, x)
+        self._instr._edge(ast, t0, perf_counter())
+        return y
+
+    def transform_batch(self, pairs):
+        pairs = list(pairs)
+        t0 = perf_counter()
+        if type(self._analysis).transform_batch is BaseAnalysis.transform_batch:
+            # Every edge is transformed separately, and timed as such
+            y = [self.transform(ast, x) for ast, x in pairs]
+            self._instr._op("transform_batch", t0, perf_counter())
+            return y
+        y = self._analysis.transform_batch(pairs)
+        t1 = perf_counter()
+        self._instr._op("transform_batch", t0, t1)
+        dt = (t1 - t0) / len(pairs) if pairs else 0
+        for k, (ast, _) in enumerate(pairs):
+            self._instr._edge(ast, t0 + k * dt, t0 + (k + 1) * dt)
+        return y
+
+    def join(self, l):
+        t0 = perf_counter()
+        y = self._analysis.join(l)
+        self._instr._op("join", t0, perf_counter())
+        return y
+
+    def equiv(self, x, y):
+        t0 = perf_counter()
+        b = self._analysis.equiv(x, y)
+        self._instr._op("equiv", t0, perf_counter())
+        return b
+
+    def stabilize(self, x):
+        t0 = perf_counter()
+        y = self._analysis.stabilize(x)
+        self._instr._op("stabilize", t0, perf_counter())
+        self._instr._size(self._analysis.state_size(y))
+        return y
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Karr's linear equality analysis.
+
+Over-approximates the set of possible valuations at a label by the affine
+subspace of Q^n it spans, which captures exactly the linear equalities
+between the variables - the SUM predicates. A subspace is kept in
+generator form: a point p and a basis B of its direction space in reduced
+row echelon form, with exact rational entries, such that the subspace is
+{p + a linear combination of the rows of B}.
+
+The height of the lattice is n + 1, so the iteration converges on counting
+loops, and a SUM predicate holds iff it holds on p and vanishes on B.
+Unlike SummationAnalysis, a `?` assignment forgets everything about the
+variable, as every execution of it may pick a different value.
+"""
+
+from fractions import Fraction
+from typing import List, Optional, Tuple
+
+from analysis import BaseAnalysis
+import ast_nodes as ASTS
+
+Vector = Tuple[Fraction, ...]
+
+
+def _rref(rows: List[List[Fraction]]) -> List[List[Fraction]]:
+    """Returns the reduced row echelon form of the rows, without its zero
+    rows, with all the pivots equal to 1."""
+    rows = [list(r) for r in rows]
+    cols = len(rows[0]) if rows else 0
+    r = 0
+    for c in range(cols):
+        pivot = next((k for k in range(r, len(rows)) if rows[k][c]), None)
+        if pivot is None:
+            continue
+        rows[r], rows[pivot] = rows[pivot], rows[r]
+        lead = rows[r][c]
+        rows[r] = [v / lead for v in rows[r]]
+        for k in range(len(rows)):
+            if k != r and rows[k][c]:
+                f = rows[k][c]
+                rows[k] = [v - f * w for v, w in zip(rows[k], rows[r])]
+        r += 1
+    return rows[:r]
+
+def _dot(a, b) -> Fraction:
+    return sum((x * y for x, y in zip(a, b)), Fraction(0))
+
+
+class KarrAnalysis(BaseAnalysis):
+    """
+    The lattice elements are either None (bottom) or (p, B) tuples of
+    tuples of Fractions, canonicalized such that equivalent elements are
+    equal.
+    """
+
+    def __init__(self, num_vars):
+        self.n = num_vars
+
+    def _make(self, p, B) -> Tuple[Vector, Tuple[Vector, ...]]:
+        B = _rref(B)
+        p = list(p)
+        # Zero the pivot coordinates of the point
+        for row in B:
+            c = next(i for i, v in enumerate(row) if v)
+            if p[c]:
+                f = p[c]
+                p = [v - f * w for v, w in zip(p, row)]
+        return (tuple(p), tuple(map(tuple, B)))
+
+    def bottom(self):
+        return None
+
+    def top(self):
+        zero = [Fraction(0)] * self.n
+        return self._make(zero, [[Fraction(int(i == j)) for j in range(self.n)]
+                                 for i in range(self.n)])
+
+    def join(self, l):
+        l = [x for x in l if x is not None]
+        if not l:
+            return None
+        if len(l) == 1:
+            return l[0]
+        p0, _ = l[0]
+        # The affine hull: the directions of all the elements, along with
+        # the differences between their points
+        B = [list(row) for _, B in l for row in B]
+        B += [[a - b for a, b in zip(p, p0)] for p, _ in l[1:]]
+        return self._make(p0, B)
+
+    def equiv(self, x, y):
+        return x == y
+
+    def is_bottom(self, x):
+        return x is None
+
+    def _meet(self, x, a, c):
+        """Returns the intersection of x with the hyperplane a . v = c."""
+        if x is None:
+            return None
+        p, B = x
+        ap = _dot(a, p)
+        aB = [_dot(a, row) for row in B]
+        r = next((k for k, v in enumerate(aB) if v), None)
+        if r is None:
+            return x if ap == c else None
+        # Move the point onto the hyperplane along B[r], and remove the
+        # component of B[r] from the other directions
+        t = (c - ap) / aB[r]
+        p = [v + t * w for v, w in zip(p, B[r])]
+        rest = [[v - (aB[k] / aB[r]) * w for v, w in zip(B[k], B[r])]
+                for k in range(len(B)) if k != r]
+        return self._make(p, rest)
+
+    def _sum_form(self, pred: ASTS.SumEq) -> List[Fraction]:
+        """Returns the coefficients of (SUM lhs) - (SUM rhs)."""
+        a = [Fraction(0)] * self.n
+        for var in pred.lhs.var_list:
+            a[var.id] += 1
+        for var in pred.rhs.var_list:
+            a[var.id] -= 1
+        return a
+
+    def _meet_andc(self, x, andc: ASTS.AndChain):
+        for pred in andc.pred_list:
+            if isinstance(pred, ASTS.SumEq):
+                x = self._meet(x, self._sum_form(pred), 0)
+        return x
+
+    def _unit(self, i: int) -> List[Fraction]:
+        return [Fraction(int(j == i)) for j in range(self.n)]
+
+    def _assign(self, x, dest: int, src: Optional[int], const: int):
+        """Returns x after the assignment dest := src + const (or dest :=
+        const if src is None)."""
+        p, B = x
+        p = list(p)
+        B = [list(row) for row in B]
+        p[dest] = (p[src] if src is not None else Fraction(0)) + const
+        for row in B:
+            row[dest] = row[src] if src is not None else Fraction(0)
+        return self._make(p, B)
+
+    def transform_nontrivial(self, ast, x):
+        if x is None:
+            return None
+        match ast:
+            case ASTS.ConstAssignment(dest=dest, src=src):
+                return self._assign(x, dest.id, None, src)
+            case ASTS.UnknownAssignment(dest=dest) | ASTS.NoSrcAssignment(dest=dest) | \
+                 ASTS.FromFieldAssignment(dest=dest):
+                # NULL, new and field reads give dest an arbitrary value
+                p, B = x
+                return self._make(p, [list(row) for row in B] + [self._unit(dest.id)])
+            case ASTS.IntoFieldAssignment():
+                # Field writes don't change the variables themselves
+                return x
+            case ASTS.VarAssignment(dest=dest, src=src):
+                return self._assign(x, dest.id, src.id, 0)
+            case ASTS.IncAssignment(dest=dest, src=src):
+                return self._assign(x, dest.id, src.id, 1)
+            case ASTS.DecAssignment(dest=dest, src=src):
+                return self._assign(x, dest.id, src.id, -1)
+            case ASTS.Assume(expr=ASTS.VarEq(lhs=lhs, rhs=rhs)):
+                a = [u - v for u, v in zip(self._unit(lhs.id), self._unit(rhs.id))]
+                return self._meet(x, a, 0)
+            case ASTS.Assume(expr=ASTS.VarConsEq(lhs=lhs, rhs=rhs)):
+                return self._meet(x, self._unit(lhs.id), rhs)
+            case ASTS.Assume(expr=ASTS.ExprFalse()):
+                return None
+            case ASTS.Assume():
+                # Disequalities aren't affine
+                return x
+            case ASTS.Assert(orc=orc):
+                return self.join(self._meet_andc(x, andc) for andc in orc.andc_list)
+            case _:
+                assert False, "Unhandled AST encountered in KarrAnalysis transform"
+
+    def state_size(self, x):
+        return 0 if x is None else len(x[1]) + 1
+
+    def verify_assertion(self, ass: ASTS.Assert, x):
+        if x is None:
+            return True
+        p, B = x
+        # An affine subspace within a finite union of subspaces is within
+        # one of them, so some AndChain must hold on all of x
+        for andc in ass.orc.andc_list:
+            if all(isinstance(pred, ASTS.SumEq) for pred in andc.pred_list):
+                forms = [self._sum_form(pred) for pred in andc.pred_list]
+                if all(_dot(a, p) == 0 and not any(_dot(a, row) for row in B)
+                       for a in forms):
+                    return True
+        return False
+
+def _main():
+    from analyzer import run_analysis
+    run_analysis(KarrAnalysis)
+
+if __name__ == "__main__":
+    _main()
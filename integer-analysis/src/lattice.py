@@ -2,6 +2,9 @@ from abc import ABC, abstractmethod
 from enum import Enum
 from functools import reduce
 import analysis
+from cache import LRUCache
+import sys
+from typing import Dict, Optional
 
 class MemberType(Enum):
     """The type of a lattice member.
@@ -21,7 +24,15 @@ class MemberType(Enum):
         return str(self)
 
 class Lattice(ABC):
-    """Represents a lattice object with a join method."""
+    """Represents a lattice object with a join method.
+
+    A flat lattice is one in which x is below y iff x is the bottom
+    element, y is the top element, or they are equivalent. A lattice with
+    hashable members is one whose members are hashable, and equal iff they
+    are equivalent - so they are their own keys (see key).
+    """
+    flat = False
+    hashable_members = False
 
     @abstractmethod
     def join_nontrivial(self, x, y):
@@ -96,12 +107,35 @@ class Lattice(ABC):
         b = self.equiv_trivial(x, y)
         return self.equiv_nontrivial(x, y) if b is None else b
 
+    def key(self, x):
+        """
+        Returns a hashable canonical key of the lattice member x, such that
+        two members are equivalent iff their keys are equal - or None if the
+        lattice has no canonical forms (the default), in which case members
+        can only be compared with equiv.
+        """
+        return x if self.hashable_members else None
+
+    def leq(self, x, y) -> bool:
+        """Returns True iff x is below y in the lattice."""
+        return self.equiv(self.join([x, y]), y)
+
+    def distance(self, x, y) -> int:
+        """
+        Returns a measure of how dissimilar the lattice members x and y
+        are, which is 0 iff they are the same member. Used for choosing
+        the members to merge once a disjunctive completion grows too big.
+        """
+        return 0 if self.equiv(x, y) else 1
+
 
 class CartProd(Lattice):
     """The Cartesian product of a sequence of lattices."""
 
     def __init__(self, lats):
         self.lats = lats
+        # Tuples of hashable members are hashable members
+        self.hashable_members = all(lat.hashable_members for lat in lats)
 
 
     def is_top(self, X) -> bool:
@@ -121,6 +155,17 @@ class CartProd(Lattice):
     def equiv(self, X, Y):
         return all(lat.equiv(x,y) for lat, x, y in zip(self.lats, X, Y))
 
+    def key(self, X):
+        keys = tuple(lat.key(x) for lat, x in zip(self.lats, X))
+        return None if None in keys else keys
+
+    def leq(self, X, Y) -> bool:
+        return all(lat.leq(x, y) for lat, x, y in zip(self.lats, X, Y))
+
+    def distance(self, X, Y) -> int:
+        """Returns the number of components in which X and Y differ."""
+        return sum(lat.distance(x, y) for lat, x, y in zip(self.lats, X, Y))
+
     def join_nontrivial(self, X, Y):
         res = []
         for lat, x, y in zip(self.lats, X, Y):
@@ -129,9 +174,19 @@ class CartProd(Lattice):
 
 
 class DisjComp(Lattice):
-    """The Disjunctive completion of a lattice."""
-    def __init__(self, lat):
+    """The Disjunctive completion of a lattice.
+
+    If max_disjuncts is given, joins keep at most that many members by
+    merging the most similar ones (see limit), and merges counts the
+    merges which lost precision. If antichain is True, joins keep only the
+    maximal members, dropping the members below other members.
+    """
+    def __init__(self, lat, max_disjuncts: Optional[int] = None, antichain=False):
+        assert max_disjuncts is None or max_disjuncts > 0, "At least one disjunct must be kept"
         self.lat = lat
+        self.max_disjuncts = max_disjuncts
+        self.antichain = antichain
+        self.merges = 0
 
     def top(self):
         return { self.lat.top() }
@@ -140,18 +195,123 @@ class DisjComp(Lattice):
         return { self.lat.bot() }
 
     def equiv(self, X, Y):
+        KX, KY = self._index(X), self._index(Y)
+        if KX is not None and KY is not None:
+            return KX.keys() == KY.keys()
         # Test equality by double inclusion
         return self._is_subset(X, Y) and self._is_subset(Y, X)
 
+    def key(self, X):
+        KX = self._index(X)
+        return None if KX is None else frozenset(KX)
+
     def join_nontrivial(self, X, Y):
-        return X.union({y for y in Y if not self._in(y, X)})
+        KX, KY = self._index(X), self._index(Y)
+        if KX is not None and KY is not None:
+            return self.limit(X.union(y for k, y in KY.items() if k not in KX))
+        return self.limit(X.union({y for y in Y if not self._in(y, X)}))
+
+    def limit(self, X):
+        """Returns X with at most max_disjuncts members, and only its
+        maximal members in antichain mode.
+
+        Members below other members are dropped first, as they don't add
+        anything to the disjunction. Then while there are still too many
+        members, the closest pair of them (by the distance of the
+        underlying lattice) is replaced by its join.
+        """
+        over = self.max_disjuncts is not None and len(X) > self.max_disjuncts
+        if not over and not (self.antichain and len(X) > 1):
+            return X
+        l = self._maximal(X)
+        if self.max_disjuncts is None or len(l) <= self.max_disjuncts:
+            return set(l)
+        while len(l) > self.max_disjuncts:
+            best = None
+            for i in range(len(l)):
+                for j in range(i + 1, len(l)):
+                    d = self.lat.distance(l[i], l[j])
+                    if best is None or d < best[0]:
+                        best = (d, i, j)
+                    # No pair of distinct members is any closer
+                    if best[0] <= 1:
+                        break
+                if best[0] <= 1:
+                    break
+            _, i, j = best
+            x, y = l[i], l[j]
+            z = self.lat.join([x, y])
+            if not (self.lat.equiv(z, x) or self.lat.equiv(z, y)):
+                self.merges += 1
+            l = [w for k, w in enumerate(l) if k != i and k != j]
+            if not self._in(z, l):
+                l.append(z)
+        return set(l)
 
     def meet_nontrivial(self, X, Y):
+        KX, KY = self._index(X), self._index(Y)
+        if KX is not None and KY is not None:
+            return ({x for k, x in KX.items() if k in KY} |
+                    {y for k, y in KY.items() if k in KX})
         return {x for x in X if self._in(x, Y)}.union(
                {y for y in Y if self._in(y, X)})
 
+    def _maximal(self, X) -> list:
+        """Returns the members of X which aren't below other members of it.
+
+        Over a product of flat lattices with canonical keys, x is below y
+        iff y agrees with x outside of the components in which y is top, so
+        the members are indexed by the set of their top components (their
+        top mask), and x is looked up in each of these groups instead of
+        being compared with every other member.
+        """
+        l = list(X)
+        lats = getattr(self.lat, 'lats', None)
+        keys = None
+        if (lats is not None and all(lat.flat for lat in lats) and
+                not any(lat.is_bot(v) for x in l for lat, v in zip(lats, x))):
+            masks = [frozenset(i for i, (lat, v) in enumerate(zip(lats, x)) if lat.is_top(v))
+                     for x in l]
+            if len(set(masks)) == 1:
+                # No member has more top components than another
+                return l
+            keys = [tuple(lat.key(v) for lat, v in zip(lats, x)) for x in l]
+            if any(None in k for k in keys):
+                keys = None
+        if keys is None:
+            # Of equivalent members, only the first one is kept
+            return [x for i, x in enumerate(l)
+                    if not any(k != i and self.lat.leq(x, y) and
+                               not (k > i and self.lat.leq(y, x))
+                               for k, y in enumerate(l))]
+        groups = {}
+        for k, mask in zip(keys, masks):
+            groups.setdefault(mask, set()).add(tuple(v for i, v in enumerate(k) if i not in mask))
+        # x is below another member iff there is one with more top
+        # components, which agrees with x on the rest of them
+        return [x for x, k, own in zip(l, keys, masks)
+                if not any(mask > own and
+                           tuple(v for i, v in enumerate(k) if i not in mask) in projs
+                           for mask, projs in groups.items())]
+
+    def _index(self, X):
+        """Returns a dictionary mapping the keys of the members of X (see
+        Lattice.key) to them, or None if some member has no key."""
+        index = {}
+        for x in X:
+            k = self.lat.key(x)
+            if k is None:
+                return None
+            index[k] = x
+        return index
+
     def _in(self, x, Y):
         """Returns True if lattice member x is in the set Y."""
+        k = self.lat.key(x)
+        if k is not None:
+            KY = self._index(Y)
+            if KY is not None:
+                return k in KY
         for y in Y:
             if self.lat.equiv(x, y):
                 return True
@@ -162,16 +322,101 @@ class DisjComp(Lattice):
 
         Both X and Y are assumed to consist soley of lattice members.
         """
+        KX, KY = self._index(X), self._index(Y)
+        if KX is not None and KY is not None:
+            return KX.keys() <= KY.keys()
         for x in X:
             if not self._in(x, Y):
                 return False
         return True
 
-def RelProd(lats):
+def RelProd(lats, max_disjuncts: Optional[int] = None, antichain=False):
     """The Relational product of a sequence of lattices."""
-    return DisjComp(CartProd(lats))
+    return DisjComp(CartProd(lats), max_disjuncts, antichain)
+
+class Interner:
+    """Hash-consing of the members of a lattice with canonical keys (see
+    Lattice.key).
+
+    Equivalent interned members are the same object, so equiv of interned
+    members is an identity check, and the results of binary joins of
+    interned members are cached by their ids in an LRU cache of cache_size
+    entries. At most max_interned members are interned at a time, after
+    which the table and the cache start over.
+    """
+
+    def __init__(self, lat, cache_size=4096, max_interned=1 << 16):
+        self.lat = lat
+        self.max_interned = max_interned
+        self.joins = LRUCache(cache_size)
+        self.resets = 0
+        self._table = {}
+        self._ids = {}
+
+    def is_interned(self, x) -> bool:
+        return self._ids.get(id(x)) is x
+
+    def intern(self, x):
+        """Returns the interned member equivalent to x (x itself if it has
+        no key)."""
+        if self.is_interned(x):
+            return x
+        k = self.lat.key(x)
+        if k is None:
+            return x
+        y = self._table.get(k)
+        if y is None:
+            if len(self._table) >= self.max_interned:
+                self._reset()
+            y = self._table[k] = x
+            self._ids[id(x)] = x
+        return y
+
+    def _reset(self):
+        self._table.clear()
+        self._ids.clear()
+        self.joins.clear()
+        self.resets += 1
+
+    def join(self, l):
+        l = [self.intern(x) for x in l]
+        if len(l) <= 1:
+            return self.lat.join(l)
+        return reduce(self._join2, l)
+
+    def _join2(self, x, y):
+        if not (self.is_interned(x) and self.is_interned(y)):
+            return self.intern(self.lat.join([x, y]))
+        key = (id(x), id(y))
+        z = self.joins.get(key)
+        if z is None:
+            z = self.intern(self.lat.join([x, y]))
+            # Interning z may have started over, and the ids of members
+            # which aren't interned may be reused
+            if self.is_interned(x) and self.is_interned(y):
+                self.joins.put(key, z)
+        return z
+
+    def equiv(self, x, y) -> bool:
+        if x is y:
+            return True
+        x, y = self.intern(x), self.intern(y)
+        if self.is_interned(x) and self.is_interned(y):
+            return x is y
+        return self.lat.equiv(x, y)
+
+    def stats(self) -> Dict:
+        return {"interned": len(self._table), "intern_resets": self.resets,
+                "join_cache_hits": self.joins.hits,
+                "join_cache_misses": self.joins.misses,
+                "join_cache_hit_rate": round(self.joins.hit_rate, 3)}
+
 
 class LatticeBasedAnalysis(analysis.BaseAnalysis):
+    # If set, an Interner of the lattice through which the values are
+    # joined, compared and stabilized
+    interner: Optional[Interner] = None
+
     @abstractmethod
     def lattice(self):
         """Returns the lattice on which the analysis is based."""
@@ -183,8 +428,41 @@ class LatticeBasedAnalysis(analysis.BaseAnalysis):
         return self.lattice().bot()
 
     def join(self, l):
+        if self.interner is not None:
+            return self.interner.join(l)
         return self.lattice().join(l)
 
     def equiv(self, x, y):
+        if self.interner is not None:
+            return self.interner.equiv(x, y)
         return self.lattice().equiv(x,y)
 
+    def stabilize(self, x):
+        if self.interner is not None:
+            return self.interner.intern(x)
+        return x
+
+    def state_size(self, x):
+        return len(x) if isinstance(self.lattice(), DisjComp) else 1
+
+    def state_nbytes(self, x):
+        if isinstance(self.lattice(), DisjComp):
+            return sys.getsizeof(x) + sum(map(sys.getsizeof, x))
+        return sys.getsizeof(x)
+
+    def stats(self) -> Dict:
+        lat = self.lattice()
+        stats = {}
+        if isinstance(lat, DisjComp) and lat.max_disjuncts is not None:
+            stats.update(max_disjuncts=lat.max_disjuncts, merges=lat.merges)
+        if self.interner is not None:
+            stats.update(self.interner.stats())
+        return stats
+
+    def coarsen(self, x):
+        """Joins all the disjuncts of a disjunctive element into one."""
+        lat = self.lattice()
+        if isinstance(lat, DisjComp) and len(x) > 1:
+            return { lat.lat.join(x) }
+        return x
+
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+A specializing compiler of lattice compositions.
+
+compile_lattice takes a composition of CartProd and DisjComp (RelProd)
+over base lattices, and returns an equivalent composition whose generic
+methods - which loop over the components with zip/all/reduce, and check for
+the top and bottom elements with isinstance and == - are replaced with code
+generated for it: loops unrolled for the arity of each product, and the
+sentinel checks of base lattices whose top and bottom are the MemberType
+sentinels inlined into identity checks.
+
+The compiled lattices are instances of subclasses of the original classes,
+with the same attributes, so they keep the Lattice interface (and pass the
+isinstance checks of the original classes).
+
+Usage: lattice_compiler.py [-h] [--vars N] [--cases N] [--repeat N]
+Benchmarks the operations of the compiled summation lattice against the
+generic ones.
+"""
+
+import copy
+from typing import Dict, List
+
+from lattice import CartProd, DisjComp, Lattice, MemberType
+
+_SENTINEL_METHODS = ["is_top", "is_bot", "equiv", "equiv_trivial", "equiv_nontrivial"]
+
+
+def _is_sentinel(lat: Lattice) -> bool:
+    """Returns True iff lat is a base lattice with the default equality over
+    the MemberType sentinels, in which x is equivalent to y iff x == y."""
+    return (not isinstance(lat, (CartProd, DisjComp)) and
+            all(getattr(type(lat), m) is getattr(Lattice, m) for m in _SENTINEL_METHODS) and
+            lat.top() is MemberType.TOP and lat.bot() is MemberType.BOT)
+
+def _specialize(lat: Lattice, source: str, env: Dict, attrs: Dict) -> Lattice:
+    """Returns a copy of lat with the attributes attrs, whose class is a
+    subclass of its class with the functions defined by source (executed
+    in env) as its methods."""
+    namespace = {}
+    exec(compile(source, f"<compiled {type(lat).__name__}>", "exec"), env, namespace)
+    cls = type(f"Compiled{type(lat).__name__}", (type(lat),), namespace)
+    compiled = copy.copy(lat)
+    compiled.__class__ = cls
+    compiled.__dict__.update(attrs)
+    compiled.source = source
+    return compiled
+
+def _cartprod(lat: CartProd) -> Lattice:
+    lats = [compile_lattice(l) for l in lat.lats]
+    n = len(lats)
+    if n == 0:
+        return lat
+    env = {"TOP": MemberType.TOP, "BOT": MemberType.BOT}
+    xs = "".join(f"x{i}, " for i in range(n))
+    ys = "".join(f"y{i}, " for i in range(n))
+
+    def call(name: str, i: int, *args) -> str:
+        env[f"{name}{i}"] = getattr(lats[i], name)
+        return f"{name}{i}({', '.join(args)})"
+
+    is_top, is_bot, equiv, leq, distance, join, key = [], [], [], [], [], [], []
+    for i, l in enumerate(lats):
+        x, y = f"x{i}", f"y{i}"
+        sentinel = _is_sentinel(l)
+        is_top.append(f"{x} is TOP" if sentinel else call("is_top", i, x))
+        is_bot.append(f"{x} is BOT" if sentinel else call("is_bot", i, x))
+        equiv.append(f"{x} == {y}" if sentinel else call("equiv", i, x, y))
+        key.append(x if l.hashable_members else call("key", i, x))
+        if sentinel and type(l).distance is Lattice.distance:
+            distance.append(f"({x} != {y})")
+        else:
+            distance.append(call("distance", i, x, y))
+        if sentinel and l.flat:
+            leq.append(f"({x} is BOT or {y} is TOP or {x} == {y})")
+            if type(l).join is Lattice.join:
+                # The join of distinct members of a flat lattice is the top
+                join.append(f"({y} if {x} is BOT else {x} if {y} is BOT or {x} == {y} else TOP)")
+                continue
+        else:
+            leq.append(call("leq", i, x, y))
+        join.append(f"{call('join', i, f'[{x}, {y}]')}")
+
+    if all(l.hashable_members for l in lats):
+        # The tuple of the components' keys is the member itself
+        key_source = "def key(self, X):\n    return X\n"
+    else:
+        key_source = (f"def key(self, X):\n    {xs}= X\n"
+                      f"    keys = ({', '.join(key)},)\n"
+                      f"    return None if None in keys else keys\n")
+    if all(_is_sentinel(l) for l in lats):
+        env["TOP_T"] = tuple(l.top() for l in lats)
+        env["BOT_T"] = tuple(l.bot() for l in lats)
+        top_source = "def top(self):\n    return TOP_T\n\ndef bot(self):\n    return BOT_T\n"
+    else:
+        top_source = ""
+    source = f"""\
+def is_top(self, X):
+    {xs}= X
+    return {' and '.join(is_top)}
+
+def is_bot(self, X):
+    {xs}= X
+    return {' and '.join(is_bot)}
+
+def equiv(self, X, Y):
+    {xs}= X
+    {ys}= Y
+    return {' and '.join(equiv)}
+
+def leq(self, X, Y):
+    {xs}= X
+    {ys}= Y
+    return {' and '.join(leq)}
+
+def distance(self, X, Y):
+    {xs}= X
+    {ys}= Y
+    return {' + '.join(distance)}
+
+def join_nontrivial(self, X, Y):
+    {xs}= X
+    {ys}= Y
+    return ({', '.join(join)},)
+
+{key_source}
+{top_source}"""
+    return _specialize(lat, source, env, {"lats": lats})
+
+def _disjcomp(lat: DisjComp) -> Lattice:
+    inner = compile_lattice(lat.lat)
+    if not inner.hashable_members:
+        return _specialize(lat, "", {}, {"lat": inner})
+    # The members are their own keys, and the top and bottom elements are
+    # the sets of the (hashable) top and bottom members
+    source = """\
+def key(self, X):
+    return frozenset(X)
+
+def _index(self, X):
+    return {x: x for x in X}
+
+def is_top(self, X):
+    return isinstance(X, set) and len(X) == 1 and TOP_M in X
+
+def is_bot(self, X):
+    return isinstance(X, set) and len(X) == 1 and BOT_M in X
+"""
+    return _specialize(lat, source, {"TOP_M": inner.top(), "BOT_M": inner.bot()},
+                       {"lat": inner})
+
+def compile_lattice(lat: Lattice) -> Lattice:
+    """Returns a lattice equivalent to the composition lat, with methods
+    specialized for it. Base lattices are returned as is."""
+    if isinstance(lat, DisjComp):
+        return _disjcomp(lat)
+    if isinstance(lat, CartProd):
+        return _cartprod(lat)
+    return lat
+
+
+def _bench_ops(lat: DisjComp, elements: List[set], repeat: int) -> Dict[str, float]:
+    """Returns the median time [us] of every operation over the elements."""
+    from statistics import median
+    from time import perf_counter
+    pairs = list(zip(elements, elements[1:] + elements[:1]))
+    members = [(x, y) for X, Y in pairs for x, y in zip(X, Y)]
+    ops = {
+        "join": lambda: [lat.join([X, Y]) for X, Y in pairs],
+        "equiv": lambda: [lat.equiv(X, Y) for X, Y in pairs],
+        "is_top/is_bot": lambda: [lat.is_top(X) or lat.is_bot(X) for X in elements],
+        "member join": lambda: [lat.lat.join([x, y]) for x, y in members],
+        "member equiv": lambda: [lat.lat.equiv(x, y) for x, y in members],
+        "member leq": lambda: [lat.lat.leq(x, y) for x, y in members],
+    }
+    times = {}
+    for name, op in ops.items():
+        samples = []
+        for _ in range(repeat):
+            t0 = perf_counter()
+            op()
+            samples.append(perf_counter() - t0)
+        times[name] = median(samples) * 1e6
+    return times
+
+def _main():
+    import argparse
+    import random
+    from lattice import RelProd
+    from summation_analysis import AbsVal, SummationLattice
+
+    parser = argparse.ArgumentParser(description="Benchmark of the compiled summation lattice.")
+    parser.add_argument("--vars", type=int, default=8, help="number of variables")
+    parser.add_argument("--cases", type=int, default=64, help="cases per element")
+    parser.add_argument("--repeat", type=int, default=21, help="repetitions per operation")
+    args = parser.parse_args()
+
+    generic = RelProd([SummationLattice()] * args.vars)
+    compiled = compile_lattice(generic)
+    rng = random.Random(0)
+    values = [MemberType.TOP] + [AbsVal(const=c) for c in range(3)] + \
+             [AbsVal(unknown=u, const=c) for u in range(2) for c in range(2)]
+    elements = [{tuple(rng.choice(values) for _ in range(args.vars))
+                 for _ in range(args.cases)} for _ in range(32)]
+
+    base = _bench_ops(generic, elements, args.repeat)
+    fast = _bench_ops(compiled, elements, args.repeat)
+    print(f"{'operation':>16} {'generic [us]':>14} {'compiled [us]':>14} {'speedup':>8}")
+    for name in base:
+        print(f"{name:>16} {base[name]:>14.1f} {fast[name]:>14.1f} {base[name] / fast[name]:>7.2f}x")
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Detection of counting loops, for analyses to accelerate.
+
+A counting loop is a cycle of the CFG which starts with a guard edge
+`assume k != c` out of its head, followed by a straight line of labels
+(each with a single incoming and outgoing edge) back to the head, whose
+commands are only increments and decrements of variables by themselves,
+copies of variables the cycle doesn't assign, and skips.
+
+The values of the variables at the head after t iterations are then known
+in closed form: every stepped variable v is v + t * steps[v], and for
+t >= 1 every copied variable holds its (unchanged) source. The loop keeps
+iterating as long as the counter k isn't c, so an analysis can compute
+all of the values at the head in one step (see
+BaseAnalysis.accelerate_loop) instead of unrolling the loop, and the
+values which leave it through its exit edges `assume k = c` from the
+values entering it (see BaseAnalysis.exit_loop).
+
+Usage: loop_acceleration.py <program file>
+"""
+
+from typing import Dict, List, Optional
+
+import networkx as nx
+
+import ast_nodes as ASTS
+
+
+class CountingLoop:
+    """
+    A counting loop at the label head, guarded by `counter != bound`.
+    steps maps the ids of the variables the loop steps to their net change
+    per iteration (which is never 0 for the counter), and copies maps the
+    ids of the variables the loop copies into to the ids of their sources.
+    back is the last label of the loop (whose edge leads back to the head),
+    and exits are the labels the exit edges `assume counter = bound` out of
+    the head lead to.
+    """
+
+    def __init__(self, head, counter: int, bound: int,
+                 steps: Dict[int, int], copies: Dict[int, int],
+                 back=None, exits: List = ()):
+        self.head = head
+        self.counter = counter
+        self.bound = bound
+        self.steps = steps
+        self.copies = copies
+        self.back = back
+        self.exits = list(exits)
+
+    def trip_count(self, counter_value: int) -> Optional[int]:
+        """Returns the number of iterations the loop makes when entered with
+        the counter's value, or None if it never exits."""
+        delta = self.bound - counter_value
+        step = self.steps[self.counter]
+        if delta % step or delta // step < 0:
+            return None
+        return delta // step
+
+    def __repr__(self):
+        return (f"CountingLoop(head={self.head}, counter={self.counter}, "
+                f"bound={self.bound}, steps={self.steps}, copies={self.copies}, "
+                f"back={self.back}, exits={self.exits})")
+
+
+def _body(cfg: nx.DiGraph, head, start):
+    """Returns a tuple of the form: (the commands of the straight line from
+    start back to head, its last label), or None if there is no such line
+    which is entered only at start."""
+    body = []
+    node = back = start
+    while node != head:
+        if cfg.out_degree(node) != 1 or cfg.in_degree(node) != 1 or len(body) > len(cfg):
+            return None
+        back = node
+        node, ast = next(iter(cfg[node].items()))
+        body.append(ast['ast'])
+    return body, back
+
+def _is_exit(ast, loop: CountingLoop) -> bool:
+    return (isinstance(ast, ASTS.Assume) and isinstance(ast.expr, ASTS.VarConsEq)
+            and ast.expr.lhs.id == loop.counter and ast.expr.rhs == loop.bound)
+
+def _counting_loop(head, guard: ASTS.VarConsNeq,
+                   body: List[ASTS.Command]) -> Optional[CountingLoop]:
+    steps = {}
+    copies = {}
+    for ast in body:
+        match ast:
+            case ASTS.StepAssignment(dest=dest, src=src) if dest.id == src.id:
+                step = 1 if isinstance(ast, ASTS.IncAssignment) else -1
+                steps[dest.id] = steps.get(dest.id, 0) + step
+            case ASTS.VarAssignment(dest=dest, src=src) if dest.id not in copies:
+                copies[dest.id] = src.id
+            case ASTS.Skip() | ASTS.Assume(expr=ASTS.ExprTrue()):
+                pass
+            case _:
+                return None
+    # The sources of the copies must be unchanged by the loop, and the
+    # stepped variables mustn't be overwritten by copies
+    if any(src in steps or src in copies for src in copies.values()):
+        return None
+    if steps.keys() & copies.keys():
+        return None
+    steps = {v: d for v, d in steps.items() if d}
+    if guard.lhs.id not in steps:
+        return None
+    return CountingLoop(head, guard.lhs.id, guard.rhs, steps, copies)
+
+def find_counting_loops(cfg: nx.DiGraph) -> Dict[object, List[CountingLoop]]:
+    """Returns a dictionary mapping the labels of cfg which are heads of
+    counting loops to their loops."""
+    loops = {}
+    for head, start, ast in cfg.edges(data="ast"):
+        if not isinstance(ast, ASTS.Assume) or not isinstance(ast.expr, ASTS.VarConsNeq):
+            continue
+        line = _body(cfg, head, start)
+        if line is None:
+            continue
+        body, back = line
+        loop = _counting_loop(head, ast.expr, body)
+        if loop is not None:
+            loop.back = back
+            loop.exits = [succ for succ, exit_ast in cfg[head].items()
+                          if _is_exit(exit_ast['ast'], loop)]
+            loops.setdefault(head, []).append(loop)
+    return loops
+
+
+def _main():
+    from sys import argv
+    from parser import Parser
+    with open(argv[1], 'r') as f:
+        text = f.read()
+    cfg, _ = Parser(text).parse_complete_program()
+    for head, loops in find_counting_loops(cfg).items():
+        for loop in loops:
+            print(f"L{head}: {loop}")
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Memory budget accounting of the lattice elements of a fixpoint computation.
+
+The fixpoint iteration algorithms (see analyzer.py) consult the budget
+before storing the new lattice element of a label. Once an element would
+exceed the budget, it is replaced by a coarser over-approximation (see
+BaseAnalysis.coarsen), and its label is coarsened for the rest of the
+computation, which keeps the iteration monotone.
+"""
+
+from typing import Dict, Hashable, Optional
+
+
+class MemoryBudget:
+    """A memory budget, in bytes, of the lattice elements of a fixpoint.
+
+    total_bytes - Budget of all the lattice elements together.
+    state_bytes - Budget of a single lattice element.
+    Either one may be None for no limit.
+    """
+
+    def __init__(self, total_bytes: Optional[int] = None,
+                 state_bytes: Optional[int] = None):
+        self.total_bytes = total_bytes
+        self.state_bytes = state_bytes
+        self.reset()
+
+    def reset(self):
+        self.nbytes: Dict[Hashable, int] = {}
+        self.total = 0
+        self.peak = 0
+        self.coarsened = set()
+
+    def _exceeds(self, label, nbytes: int) -> bool:
+        if self.state_bytes is not None and nbytes > self.state_bytes:
+            return True
+        if self.total_bytes is not None:
+            return self.total - self.nbytes.get(label, 0) + nbytes > self.total_bytes
+        return False
+
+    def fit(self, analysis, label, x):
+        """Returns x, or its coarsening if label is coarsened or x would
+        exceed the budget as the new element of label."""
+        if label not in self.coarsened:
+            if not self._exceeds(label, analysis.state_nbytes(x)):
+                return x
+            self.coarsened.add(label)
+        return analysis.coarsen(x)
+
+    def account(self, analysis, label, x):
+        """Records x as the stored element of label. The label is coarsened
+        once x is coarse, including when coarse values of other labels
+        flow into it."""
+        if analysis.is_coarse(x):
+            self.coarsened.add(label)
+        nbytes = analysis.state_nbytes(x)
+        self.total += nbytes - self.nbytes.get(label, 0)
+        self.nbytes[label] = nbytes
+        self.peak = max(self.peak, self.total)
+
+    def report(self) -> Dict:
+        return {"total_bytes": self.total_bytes, "state_bytes": self.state_bytes,
+                "peak_bytes": self.peak,
+                "coarsened_labels": sorted(self.coarsened)}
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+An affine relations over GF(2) representation of the parity analysis.
+
+Every command of the language is an affine transformation of the parities
+(bit i is 1 iff variable i is ODD), so the set of possible valuations at a
+label is over-approximated by the affine subspace it spans. A subspace is
+kept in generator form: a point p and a basis B of its direction space in
+reduced row echelon form, such that the subspace is {p + sum of rows of B}.
+
+Compared with PAFull the space is polynomial in the number of variables,
+at the price of precision where a join (an affine hull) or an assertion
+assume (a disjunction) adds valuations that are not possible.
+"""
+
+from analysis import BaseAnalysis
+import ast_nodes as ASTS
+import numpy as np
+
+
+def _rref(M):
+    """Returns the reduced row echelon form of the bit matrix M over GF(2),
+    without its zero rows."""
+    M = M.copy()
+    rows, cols = M.shape
+    r = 0
+    for c in range(cols):
+        if r == rows:
+            break
+        pivots = np.flatnonzero(M[r:, c])
+        if pivots.size == 0:
+            continue
+        p = r + pivots[0]
+        if p != r:
+            M[[r, p]] = M[[p, r]]
+        # Eliminate the column from all the other rows at once
+        mask = M[:, c].copy()
+        mask[r] = False
+        M[mask] ^= M[r]
+        r += 1
+    return M[:r]
+
+def _reduce_point(p, B):
+    """Returns the canonical representative of p + span(B), given B in
+    reduced row echelon form."""
+    if not B.shape[0]:
+        return p
+    pivots = B.argmax(axis=1)
+    return p ^ np.bitwise_xor.reduce(B[p[pivots]], axis=0, initial=False)
+
+
+class PAAffine(BaseAnalysis):
+    """
+    The lattice elements are either None (bottom) or (p, B) tuples of
+    read-only bit arrays, canonicalized such that equivalent elements are
+    equal arrays.
+    """
+
+    def __init__(self, num_vars):
+        self.n = num_vars
+
+    def _make(self, p, B):
+        B = _rref(B)
+        p = _reduce_point(p, B)
+        p.setflags(write=False)
+        B.setflags(write=False)
+        return (p, B)
+
+    def bottom(self):
+        return None
+
+    def top(self):
+        return self._make(np.zeros(self.n, dtype=bool), np.eye(self.n, dtype=bool))
+
+    def join(self, l):
+        l = [x for x in l if x is not None]
+        if not l:
+            return None
+        p0, _ = l[0]
+        # The affine hull: the directions of all the elements, along with
+        # the differences between their points
+        B = np.vstack([B for _, B in l] + [(p ^ p0)[np.newaxis] for p, _ in l[1:]])
+        return self._make(p0.copy(), B)
+
+    def equiv(self, x, y):
+        if x is None or y is None:
+            return x is y
+        return (x[1].shape == y[1].shape and np.array_equal(x[0], y[0])
+                and np.array_equal(x[1], y[1]))
+
+    def is_bottom(self, x):
+        return x is None
+
+    def _meet(self, x, cols, c: bool):
+        """Returns the intersection of x with the hyperplane in which the
+        sum of the variables cols is c."""
+        if x is None:
+            return None
+        p, B = x
+        a = np.bitwise_xor.reduce(B[:, cols], axis=1) if B.shape[0] else np.zeros(0, dtype=bool)
+        pa = np.bitwise_xor.reduce(p[cols])
+        rows = np.flatnonzero(a)
+        if not rows.size:
+            return x if pa == c else None
+        r = rows[0]
+        p = p ^ B[r] if pa != c else p
+        B = B.copy()
+        B[rows[1:]] ^= B[r]
+        return self._make(p, np.delete(B, r, axis=0))
+
+    def _meet_andc(self, x, andc: ASTS.AndChain):
+        for pred in andc.pred_list:
+            match pred:
+                case ASTS.TestOdd(var=var):
+                    x = self._meet(x, [var.id], True)
+                case ASTS.TestEven(var=var):
+                    x = self._meet(x, [var.id], False)
+        return x
+
+    def _assign(self, x, dest: int, src=None, const=False):
+        """Returns x after the assignment of the variable dest to the parity
+        of the variable src plus const (or to const if src is None)."""
+        p, B = x
+        p = p.copy()
+        B = B.copy()
+        if src is None:
+            p[dest] = const
+            B[:, dest] = False
+        else:
+            p[dest] = p[src] ^ const
+            B[:, dest] = B[:, src]
+        return self._make(p, B)
+
+    def transform_nontrivial(self, ast, x):
+        if x is None:
+            return None
+        match ast:
+            case ASTS.ConstAssignment(dest=dest, src=src):
+                return self._assign(x, dest.id, const=src % 2 == 1)
+            case ASTS.UnknownAssignment(dest=dest):
+                p, B = x
+                e = np.zeros((1, self.n), dtype=bool)
+                e[0, dest.id] = True
+                return self._make(p.copy(), np.vstack((B, e)))
+            case ASTS.VarAssignment(dest=dest, src=src):
+                return self._assign(x, dest.id, src.id)
+            case ASTS.StepAssignment(dest=dest, src=src):
+                return self._assign(x, dest.id, src.id, const=True)
+            case ASTS.Assume(expr=ASTS.VarEq(lhs=lhs, rhs=rhs)):
+                if lhs.id == rhs.id:
+                    return x
+                return self._meet(x, [lhs.id, rhs.id], False)
+            case ASTS.Assume(expr=ASTS.VarConsEq(lhs=lhs, rhs=rhs)):
+                return self._meet(x, [lhs.id], rhs % 2 == 1)
+            case ASTS.Assume(expr=ASTS.BaseComp()):
+                return x
+            case ASTS.Assert(orc=orc):
+                return self.join(self._meet_andc(x, andc) for andc in orc.andc_list)
+            case ASTS.Assignment():
+                # Shape assignments (NULL, new and fields) don't change the
+                # parities, as in PAFull
+                return x
+            case _:
+                assert False, "Unhandled AST encountered in PAAffine transform"
+
+    def state_size(self, x):
+        return 0 if x is None else x[1].shape[0] + 1
+
+    def state_nbytes(self, x):
+        return 0 if x is None else x[0].nbytes + x[1].nbytes
+
+    def _covered(self, x, andcs) -> bool:
+        """Returns True iff every valuation of x satisfies one of the
+        AndChains, by splitting x on the variables it doesn't fix."""
+        if x is None:
+            return True
+        p, B = x
+        free = B.any(axis=0)
+        split = None
+        for andc in andcs:
+            ids = [pred.var.id for pred in andc.pred_list]
+            if not free[ids].any():
+                # x fixes all the variables of the chain, which then holds
+                # either on all of x or on none of it
+                if self._meet_andc(x, andc) is not None:
+                    return True
+            elif split is None and self._meet_andc(x, andc) is not None:
+                split = ids[np.flatnonzero(free[ids])[0]]
+        if split is None:
+            return False
+        return (self._covered(self._meet(x, [split], False), andcs) and
+                self._covered(self._meet(x, [split], True), andcs))
+
+    def verify_assertion(self, ass: ASTS.Assert, x):
+        if not all(isinstance(p,(ASTS.TestOdd, ASTS.TestEven))
+                   for andc in ass.orc.andc_list for p in andc.pred_list):
+            return False
+        return self._covered(x, ass.orc.andc_list)
+
+def _main():
+    from analyzer import run_analysis
+    run_analysis(PAAffine)
+
+if __name__ == "__main__":
+    _main()
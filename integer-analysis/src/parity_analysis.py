@@ -64,6 +64,12 @@ class PADumb(BaseAnalysis):
             ret = list(x)
             ret[ast.dest.id] = PState.EVEN if ast.src%2==0 else PState.ODD
             return ret
+        elif isinstance(ast, ASTS.UnknownAssignment):
+            x[ast.dest.id] = PState.TOP
+        elif isinstance(ast, ASTS.VarAssignment):
+            x[ast.dest.id] = x[ast.src.id]
+        elif isinstance(ast, ASTS.StepAssignment):
+            x[ast.dest.id] = _PSTATE_STEP[x[ast.src.id]]
         elif isinstance(ast, ASTS.Assume):
             bexpr = ast.expr
             if isinstance(bexpr, ASTS.VarEq):
@@ -76,11 +82,56 @@ class PADumb(BaseAnalysis):
                     return self.bottom()
                 x[i1] = x[i2] = m
                 return x
+            elif isinstance(bexpr, ASTS.VarConsEq):
+                return self._assume_parity(bexpr.lhs, _pstate_of(bexpr.rhs), x)
+        elif isinstance(ast, ASTS.Assert):
+            return self.join(self._assume_andc(andc, x)
+                             for andc in ast.orc.andc_list)
+        return x
+
+    def _assume_parity(self, var, p, x):
+        m = PState.meet(x[var.id], p)
+        if m == PState.BOTTOM:
+            return self.bottom()
+        x = list(x)
+        x[var.id] = m
+        return x
+
+    def _assume_andc(self, andc, x):
+        for pred in andc.pred_list:
+            if isinstance(pred, ASTS.TestEven):
+                x = self._assume_parity(pred.var, PState.EVEN, x)
+            elif isinstance(pred, ASTS.TestOdd):
+                x = self._assume_parity(pred.var, PState.ODD, x)
         return x
 
     def stabilize(self, x):
         return tuple(x)
 
+    def verify_assertion(self, ass: ASTS.Assert, x):
+        if not all(isinstance(p,(ASTS.TestOdd, ASTS.TestEven))
+                   for andc in ass.orc.andc_list for p in andc.pred_list):
+            return False
+        if self.equiv(x, self.bottom()):
+            return True
+        # The assertion is checked on every combination of parities the
+        # variables it mentions may have.
+        ids = sorted({p.var.id for andc in ass.orc.andc_list for p in andc.pred_list})
+        options = [(PState.EVEN, PState.ODD) if x[i] == PState.TOP else (x[i],)
+                   for i in ids]
+        def satisfies(parities):
+            return any(all(parities[p.var.id] == (PState.ODD if isinstance(p, ASTS.TestOdd)
+                                                  else PState.EVEN)
+                           for p in andc.pred_list)
+                       for andc in ass.orc.andc_list)
+        return all(satisfies(dict(zip(ids, c))) for c in itertools.product(*options))
+
+_PSTATE_STEP = {PState.EVEN: PState.ODD, PState.ODD: PState.EVEN,
+                PState.TOP: PState.TOP, PState.BOTTOM: PState.BOTTOM}
+
+def _pstate_of(num: int):
+    return PState.EVEN if num%2==0 else PState.ODD
+
 
 
 def _parity_val(num: int):
@@ -90,15 +141,37 @@ Parity = bool
 ODD = _parity_val(1)
 EVEN = _parity_val(2)
 
+class _BatchOp:
+    """Codes of the per-column operations in PAFull.transform_batch."""
+    NOP = 0
+    CONST = 1
+    UNKNOWN = 2
+    COPY = 3
+    FLIP = 4
+    EQ = 5
+    EQ_CONST = 6
+    ASSERT = 7
+    ASSIGNMENTS = (CONST, UNKNOWN, COPY, FLIP)
+
 class PAFull(BaseAnalysis):
+    """
+    The relational parity analysis, whose lattice elements are n x k
+    matrices holding k possible valuations of the n variables as columns.
+
+    Coarsened elements (see coarsen) are PADumb elements instead, which
+    are handled by the internal PADumb analysis. Joining a coarsened
+    element with a matrix coarsens the matrix.
+    """
 
     def __init__(self, num_vars):
         self.n = num_vars
+        self._coarse = PADumb(num_vars)
         self.BOTTOM = np.array([[] for _ in range(self.n)], dtype=Parity)
         prod = itertools.product((EVEN, ODD),repeat=self.n)
         self.TOP = np.transpose(list(prod))
         self.BOTTOM.setflags(write=False)
         self.TOP.setflags(write=False)
+        self._compiled_assertions = {}
 
     def _remove_duplicates(self, x):
         return np.unique(x, axis=1)
@@ -121,9 +194,17 @@ class PAFull(BaseAnalysis):
     def top(self):
         return self.TOP
 
-    @_clean_duplicates
+    def is_coarse(self, x):
+        return isinstance(x, tuple)
+
     def join(self, l):
         l = list(l)
+        if any(map(self.is_coarse, l)):
+            return self._coarse.stabilize(self._coarse.join(map(self.coarsen, l)))
+        return self._join_fine(l)
+
+    @_clean_duplicates
+    def _join_fine(self, l):
         if not l:
             return self.bottom()
         return np.hstack(l)
@@ -133,8 +214,27 @@ class PAFull(BaseAnalysis):
 
     def equiv(self, x, y):
         #x,y = map(self._set_rep, (x,y))
+        if self.is_coarse(x) or self.is_coarse(y):
+            return (self.is_coarse(x) and self.is_coarse(y)
+                    and self._coarse.equiv(x, y))
         return self._set_rep(x)==self._set_rep(y)
 
+    def is_bottom(self, x):
+        if self.is_coarse(x):
+            return PState.BOTTOM in x
+        return x.shape[1] == 0
+
+    def coarsen(self, x):
+        """Forgets the relations between the variables, see PADumb."""
+        if self.is_coarse(x):
+            return x
+        if x.shape[1] == 0:
+            return self._coarse.stabilize(self._coarse.bottom())
+        has_even = x.any(axis=1)
+        has_odd = ~x.all(axis=1)
+        return tuple(PState.TOP if e and o else PState.EVEN if e else PState.ODD
+                     for e, o in zip(has_even, has_odd))
+
     def _assume_var_parity(self, var : ASTS.Var, parity: Parity, x):
         x = self._copy_if_nonwrite(x)
         i = var.id
@@ -163,8 +263,13 @@ class PAFull(BaseAnalysis):
     def _assume_assert(self, assertion: ASTS.Assert, x):
         return self._assume_orc(assertion.orc, x)
 
-    @_clean_duplicates
     def transform_nontrivial(self, ast, x):
+        if self.is_coarse(x):
+            return self._coarse.stabilize(self._coarse.transform_nontrivial(ast, x))
+        return self._transform_nontrivial_fine(ast, x)
+
+    @_clean_duplicates
+    def _transform_nontrivial_fine(self, ast, x):
         #x = x.copy()
         x = self._copy_if_nonwrite(x)
         match ast:
@@ -200,16 +305,212 @@ class PAFull(BaseAnalysis):
                 assert False, "Unhandled AST encountered in PAFull transform"
         return x
 
+    def transform_batch(self, pairs):
+        pairs = list(pairs)
+        ret = [None] * len(pairs)
+        batch = []
+        for k, (ast, x) in enumerate(pairs):
+            y = self.transform_trivial(ast, x)
+            if y is None and self.is_coarse(x):
+                ret[k] = self.transform_nontrivial(ast, x)
+            elif y is None:
+                batch.append(k)
+            else:
+                ret[k] = y
+        if batch:
+            transed = self._transform_nontrivial_batch([pairs[k] for k in batch])
+            for k, y in zip(batch, transed):
+                ret[k] = y
+        return ret
+
+    def _transform_nontrivial_batch(self, pairs):
+        """
+        Vectorized transform_nontrivial over a batch of (ast, x) pairs.
+
+        All the lattice elements are stacked into a single matrix whose
+        columns are tagged with the index of the pair they came from, so
+        that every assignment and assumption is applied as one row
+        operation on the whole batch.
+        """
+        asts = [ast for ast, _ in pairs]
+        widths = [x.shape[1] for _, x in pairs]
+        m = len(pairs)
+        M = np.hstack([x for _, x in pairs])
+        seg = np.repeat(np.arange(m), widths)
+
+        dest = np.full(m, -1)
+        src = np.zeros(m, dtype=int)
+        kind = np.full(m, _BatchOp.NOP)
+        val = np.zeros(m, dtype=Parity)
+        for k, ast in enumerate(asts):
+            match ast:
+                case ASTS.ConstAssignment(dest=d, src=c):
+                    kind[k], dest[k], val[k] = _BatchOp.CONST, d.id, _parity_val(c)
+                case ASTS.UnknownAssignment(dest=d):
+                    kind[k], dest[k] = _BatchOp.UNKNOWN, d.id
+                case ASTS.VarAssignment(dest=d, src=s):
+                    kind[k], dest[k], src[k] = _BatchOp.COPY, d.id, s.id
+                case ASTS.StepAssignment(dest=d, src=s):
+                    kind[k], dest[k], src[k] = _BatchOp.FLIP, d.id, s.id
+                case ASTS.Assume(expr=ASTS.VarEq(lhs=l, rhs=r)):
+                    kind[k], dest[k], src[k] = _BatchOp.EQ, l.id, r.id
+                case ASTS.Assume(expr=ASTS.VarConsEq(lhs=l, rhs=c)):
+                    kind[k], dest[k], val[k] = _BatchOp.EQ_CONST, l.id, _parity_val(c)
+                case ASTS.Assume(expr=ASTS.BaseComp()):
+                    pass
+                case ASTS.Assert():
+                    kind[k] = _BatchOp.ASSERT
+                case ASTS.Assignment():
+                    # Shape assignments don't change the parities, as in
+                    # transform_nontrivial
+                    pass
+                case _:
+                    assert False, "Unhandled AST encountered in PAFull transform"
+
+        # x := ? doubles the columns of its element, the original columns
+        # are assigned EVEN and the duplicates are assigned ODD.
+        dup = np.flatnonzero(kind[seg] == _BatchOp.UNKNOWN)
+        new_val = val[seg]
+        if dup.size:
+            M = np.hstack((M, M[:, dup]))
+            seg = np.concatenate((seg, seg[dup]))
+            new_val = np.concatenate((new_val, np.full(dup.size, ODD)))
+            new_val[dup] = EVEN
+        cols = np.arange(seg.size)
+        col_kind = kind[seg]
+        col_dest = dest[seg]
+        col_src = src[seg]
+
+        # Assignments: compute all the new values before writing any
+        src_vals = M[col_src, cols] if M.shape[0] else new_val
+        new_val = np.where(col_kind == _BatchOp.COPY, src_vals, new_val)
+        new_val = np.where(col_kind == _BatchOp.FLIP, ~src_vals, new_val)
+        assigned = np.isin(col_kind, _BatchOp.ASSIGNMENTS)
+        M[col_dest[assigned], cols[assigned]] = new_val[assigned]
+
+        # Assumptions filter out columns
+        keep = np.ones(seg.size, dtype=bool)
+        is_eq = col_kind == _BatchOp.EQ
+        keep[is_eq] = (M[col_dest[is_eq], cols[is_eq]] ==
+                       M[col_src[is_eq], cols[is_eq]])
+        is_eq = col_kind == _BatchOp.EQ_CONST
+        keep[is_eq] = M[col_dest[is_eq], cols[is_eq]] == new_val[is_eq]
+        for k in np.flatnonzero(kind == _BatchOp.ASSERT):
+            in_k = seg == k
+            keep[in_k] = self._orc_mask(asts[k].orc, M[:, in_k])
+        M = M[:, keep]
+        seg = seg[keep]
+
+        # Remove duplicates of every element separately by prepending the
+        # element index as the most significant row
+        tagged = np.vstack((seg, M)) if seg.size else np.empty((M.shape[0]+1, 0), dtype=int)
+        tagged = np.unique(tagged, axis=1)
+        bounds = np.searchsorted(tagged[0], np.arange(1, m))
+        ret = np.split(tagged[1:].astype(Parity), bounds, axis=1)
+        for y in ret:
+            y.setflags(write=False)
+        return ret
+
+    def _orc_mask(self, orc: ASTS.OrChain, x):
+        """
+        Returns a boolean mask of the columns of x which satisfy the
+        parity predicates of the OrChain orc.
+        """
+        mask = np.zeros(x.shape[1], dtype=bool)
+        for andc in orc.andc_list:
+            andc_mask = np.ones(x.shape[1], dtype=bool)
+            for p in andc.pred_list:
+                match p:
+                    case ASTS.TestOdd(var=var):
+                        andc_mask &= x[var.id] == ODD
+                    case ASTS.TestEven(var=var):
+                        andc_mask &= x[var.id] == EVEN
+            mask |= andc_mask
+        return mask
+
     def stabilize(self, x):
+        if self.is_coarse(x):
+            return x
         x.setflags(write=False)
         return x
 
+    def state_size(self, x):
+        return 1 if self.is_coarse(x) else x.shape[1]
+
+    def state_nbytes(self, x):
+        return super().state_nbytes(x) if self.is_coarse(x) else x.nbytes
+
     def verify_assertion(self, ass: ASTS.Assert, x):
+        if self.is_coarse(x):
+            return self._coarse.verify_assertion(ass, x)
         if not all(isinstance(p,(ASTS.TestOdd, ASTS.TestEven))
                    for andc in ass.orc.andc_list for p in andc.pred_list):
             return False
         return self.equiv(x, self._assume_assert(ass, x))
 
+    def _compile_assertion(self, ass: ASTS.Assert):
+        """
+        Returns a tuple of the form: (tested, parities, satisfiable) of a
+        parity assertion. tested and parities are boolean matrices with a
+        row per AndChain, holding the mask of the variables it tests and
+        the parities it tests them for, and satisfiable masks the
+        AndChains which don't test a variable for both parities.
+        """
+        key = ass.key()
+        compiled = self._compiled_assertions.get(key)
+        if compiled is None:
+            andcs = ass.orc.andc_list
+            tested = np.zeros((len(andcs), self.n), dtype=bool)
+            parities = np.zeros((len(andcs), self.n), dtype=Parity)
+            satisfiable = np.ones(len(andcs), dtype=bool)
+            for a, andc in enumerate(andcs):
+                for p in andc.pred_list:
+                    i, parity = p.var.id, isinstance(p, ASTS.TestEven)
+                    if tested[a, i] and parities[a, i] != parity:
+                        satisfiable[a] = False
+                    tested[a, i] = True
+                    parities[a, i] = parity
+            compiled = self._compiled_assertions[key] = (tested, parities, satisfiable)
+        return compiled
+
+    def verify_assertion_batch(self, pairs):
+        pairs = list(pairs)
+        ret = [False] * len(pairs)
+        batch = []
+        for k, (ass, x) in enumerate(pairs):
+            if self.is_coarse(x):
+                ret[k] = self._coarse.verify_assertion(ass, x)
+            elif all(isinstance(p,(ASTS.TestOdd, ASTS.TestEven))
+                     for andc in ass.orc.andc_list for p in andc.pred_list):
+                batch.append(k)
+        if not batch:
+            return ret
+
+        # Stack the AndChains of all the assertions, padded to the same
+        # number per assertion, and all the elements, whose columns are
+        # tagged with the index (into batch) of the pair they came from
+        compiled = [self._compile_assertion(pairs[k][0]) for k in batch]
+        width = max(t.shape[0] for t, _, _ in compiled)
+        tested = np.zeros((len(batch), width, self.n), dtype=bool)
+        parities = np.zeros((len(batch), width, self.n), dtype=Parity)
+        valid = np.zeros((len(batch), width), dtype=bool)
+        for b, (t, p, sat) in enumerate(compiled):
+            tested[b, :t.shape[0]] = t
+            parities[b, :p.shape[0]] = p
+            valid[b, :sat.shape[0]] = sat
+        xs = [pairs[k][1] for k in batch]
+        M = np.hstack(xs).T
+        seg = np.repeat(np.arange(len(batch)), [x.shape[1] for x in xs])
+
+        # A column satisfies an AndChain iff it matches all the tested
+        # parities, and an assertion iff it satisfies any of its AndChains
+        mismatch = (tested[seg] & (M[:, np.newaxis, :] != parities[seg])).any(axis=2)
+        satisfied = (~mismatch & valid[seg]).any(axis=1)
+        failed = np.bincount(seg[~satisfied], minlength=len(batch))
+        for b, k in enumerate(batch):
+            ret[k] = bool(failed[b] == 0)
+        return ret
+
 def _print_res(res):
     print('\n'.join(f'{i}. {v}' for i,v in enumerate(res)))
 
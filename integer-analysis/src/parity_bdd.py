@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+A symbolic representation of the relational parity analysis.
+
+Computes the same lattice elements as PAFull, but represents the set of
+possible valuations as a reduced ordered BDD (see bdd.py), in which the
+variable i is true iff the program variable i is ODD. The cost of the
+analysis thus depends on the structure of the relation between the
+parities, rather than on the 2^n valuations, e.g. TOP is a single node.
+"""
+
+from analysis import BaseAnalysis
+import ast_nodes as ASTS
+from bdd import BDD, FALSE, TRUE
+
+# Estimated bytes of a BDD node: its triple, and its unique table entry
+_NODE_NBYTES = 200
+
+
+class PABdd(BaseAnalysis):
+
+    def __init__(self, num_vars):
+        self.n = num_vars
+        self.bdd = BDD(num_vars)
+        self._orc_cache = {}
+
+    def bottom(self):
+        return FALSE
+
+    def top(self):
+        return TRUE
+
+    def join(self, l):
+        return self.bdd.disjoin(l)
+
+    def equiv(self, x, y):
+        # BDDs of the same manager are canonical
+        return x == y
+
+    def is_bottom(self, x):
+        return x == FALSE
+
+    def _orc(self, orc: ASTS.OrChain) -> int:
+        """Returns the BDD of the valuations which satisfy the parity
+        predicates of the OrChain orc."""
+        key = orc.key()
+        r = self._orc_cache.get(key)
+        if r is None:
+            r = self.bdd.disjoin(
+                self.bdd.conjoin(self.bdd.literal(p.var.id, isinstance(p, ASTS.TestOdd))
+                                 for p in andc.pred_list
+                                 if isinstance(p, (ASTS.TestOdd, ASTS.TestEven)))
+                for andc in orc.andc_list)
+            self._orc_cache[key] = r
+        return r
+
+    def _assign(self, x, dest: int, value: int):
+        """Returns x after assigning the variable dest the BDD value, which
+        may not depend on dest."""
+        return self.bdd.apply_and(self.bdd.exists(x, dest), value)
+
+    def transform_nontrivial(self, ast, x):
+        bdd = self.bdd
+        match ast:
+            case ASTS.ConstAssignment(dest=dest, src=src):
+                return self._assign(x, dest.id, bdd.literal(dest.id, src % 2 == 1))
+            case ASTS.UnknownAssignment(dest=dest):
+                return bdd.exists(x, dest.id)
+            case ASTS.VarAssignment(dest=dest, src=src):
+                if dest.id == src.id:
+                    return x
+                return self._assign(x, dest.id, bdd.equal_vars(dest.id, src.id))
+            case ASTS.StepAssignment(dest=dest, src=src):
+                if dest.id == src.id:
+                    return bdd.negate_var(x, dest.id)
+                return self._assign(x, dest.id, bdd.apply_not(bdd.equal_vars(dest.id, src.id)))
+            case ASTS.Assume(expr=ASTS.VarEq(lhs=lhs, rhs=rhs)):
+                return bdd.apply_and(x, bdd.equal_vars(lhs.id, rhs.id))
+            case ASTS.Assume(expr=ASTS.VarConsEq(lhs=lhs, rhs=rhs)):
+                return bdd.apply_and(x, bdd.literal(lhs.id, rhs % 2 == 1))
+            case ASTS.Assume(expr=ASTS.BaseComp()):
+                return x
+            case ASTS.Assert(orc=orc):
+                return bdd.apply_and(x, self._orc(orc))
+            case ASTS.Assignment():
+                # Shape assignments (NULL, new and fields) don't change the
+                # parities, as in PAFull
+                return x
+            case _:
+                assert False, "Unhandled AST encountered in PABdd transform"
+
+    def state_size(self, x):
+        return self.bdd.node_count(x)
+
+    def state_nbytes(self, x):
+        return self.bdd.node_count(x) * _NODE_NBYTES
+
+    def verify_assertion(self, ass: ASTS.Assert, x):
+        if not all(isinstance(p,(ASTS.TestOdd, ASTS.TestEven))
+                   for andc in ass.orc.andc_list for p in andc.pred_list):
+            return False
+        return self.bdd.implies(x, self._orc(ass.orc))
+
+def _main():
+    from analyzer import run_analysis
+    run_analysis(PABdd)
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+A bitset representation of the relational parity analysis.
+
+Computes the same lattice elements as PAFull, but each valuation of the n
+variables is encoded as an n-bit index (bit i is set iff variable i is
+ODD), and each lattice element is a Python int used as a bitset of length
+2^n, holding the bit of every possible valuation. Joins are bitwise ORs,
+equivalence is integer comparison, and the transformers are shifts and
+masks of whole bitsets.
+"""
+
+from analysis import BaseAnalysis
+from cache import LRUCache
+import ast_nodes as ASTS
+from parity_analysis import PADumb, PState
+import sys
+
+
+class PABitset(BaseAnalysis):
+    """
+    The relational parity analysis over bitsets of valuations.
+
+    Coarsened elements (see coarsen) are PADumb elements, as in PAFull.
+    """
+    PATTERN_CACHE_SIZE = 4096
+
+    def __init__(self, num_vars):
+        self.n = num_vars
+        self._width = 1 << num_vars
+        self._all = (1 << self._width) - 1
+        self._coarse = PADumb(num_vars)
+        self._odd_masks = [None] * num_vars
+        self._eq_masks = {}
+        self._pattern_masks = LRUCache(self.PATTERN_CACHE_SIZE)
+
+    def _odd(self, i: int) -> int:
+        """Returns the mask of the valuations in which variable i is ODD."""
+        mask = self._odd_masks[i]
+        if mask is None:
+            s = 1 << i
+            # A block of s even valuations followed by s odd valuations,
+            # repeated along the whole bitset
+            block = ((1 << s) - 1) << s
+            mask = block * (self._all // ((1 << 2*s) - 1))
+            self._odd_masks[i] = mask
+        return mask
+
+    def _even(self, i: int) -> int:
+        return self._all ^ self._odd(i)
+
+    def _eq(self, i: int, j: int) -> int:
+        """Returns the mask of the valuations in which variables i and j
+        have the same parity."""
+        key = (min(i, j), max(i, j))
+        mask = self._eq_masks.get(key)
+        if mask is None:
+            mask = self._all ^ (self._odd(i) ^ self._odd(j))
+            self._eq_masks[key] = mask
+        return mask
+
+    def _parity_mask(self, i: int, odd: bool) -> int:
+        return self._odd(i) if odd else self._even(i)
+
+    def pattern_mask(self, care: int, parity: int) -> int:
+        """Returns the mask of the valuations v matching the parity pattern
+        (care, parity), i.e. v & care == parity: the variables whose bits
+        are set in care have the parities of their bits in parity."""
+        def compute():
+            mask = self._all
+            for i in range(self.n):
+                if care >> i & 1:
+                    mask &= self._parity_mask(i, parity >> i & 1)
+            return mask
+        return self._pattern_masks.lookup((care, parity), compute)
+
+    def is_coarse(self, x):
+        return isinstance(x, tuple)
+
+    def bottom(self):
+        return 0
+
+    def top(self):
+        return self._all
+
+    def join(self, l):
+        l = list(l)
+        if any(map(self.is_coarse, l)):
+            return self._coarse.stabilize(self._coarse.join(map(self.coarsen, l)))
+        ret = 0
+        for x in l:
+            ret |= x
+        return ret
+
+    def equiv(self, x, y):
+        if self.is_coarse(x) or self.is_coarse(y):
+            return (self.is_coarse(x) and self.is_coarse(y)
+                    and self._coarse.equiv(x, y))
+        return x == y
+
+    def is_bottom(self, x):
+        if self.is_coarse(x):
+            return PState.BOTTOM in x
+        return x == 0
+
+    def coarsen(self, x):
+        """Forgets the relations between the variables, see PADumb."""
+        if self.is_coarse(x):
+            return x
+        if x == 0:
+            return self._coarse.stabilize(self._coarse.bottom())
+        def pstate(i):
+            has_odd = (x & self._odd(i)) != 0
+            has_even = (x & self._even(i)) != 0
+            return (PState.TOP if has_odd and has_even
+                    else PState.ODD if has_odd else PState.EVEN)
+        return tuple(pstate(i) for i in range(self.n))
+
+    def _set_parity(self, x, i: int, odd: bool):
+        """Returns x after assigning variable i the given parity."""
+        s = 1 << i
+        if odd:
+            return (x & self._odd(i)) | ((x & self._even(i)) << s)
+        return (x & self._even(i)) | ((x & self._odd(i)) >> s)
+
+    def _assign_var(self, x, dest: int, src: int, flip: bool):
+        """Returns x after assigning variable dest the parity of variable
+        src (or the opposite parity if flip)."""
+        if dest == src:
+            if not flip:
+                return x
+            s = 1 << dest
+            return ((x & self._even(dest)) << s) | ((x & self._odd(dest)) >> s)
+        # Split the valuations by the parity of src, and assign dest
+        # accordingly in each part
+        src_even = self._set_parity(x & self._even(src), dest, flip)
+        src_odd = self._set_parity(x & self._odd(src), dest, not flip)
+        return src_even | src_odd
+
+    def _orc_mask(self, orc: ASTS.OrChain) -> int:
+        """Returns the mask of the valuations which satisfy the parity
+        predicates of the OrChain orc."""
+        mask = 0
+        for andc in orc.andc_list:
+            andc_mask = self._all
+            for p in andc.pred_list:
+                match p:
+                    case ASTS.TestOdd(var=var):
+                        andc_mask &= self._odd(var.id)
+                    case ASTS.TestEven(var=var):
+                        andc_mask &= self._even(var.id)
+            mask |= andc_mask
+        return mask
+
+    def transform_nontrivial(self, ast, x):
+        if self.is_coarse(x):
+            return self._coarse.stabilize(self._coarse.transform_nontrivial(ast, x))
+        match ast:
+            case ASTS.ConstAssignment(dest=dest, src=src):
+                return self._set_parity(x, dest.id, src % 2 == 1)
+            case ASTS.UnknownAssignment(dest=dest):
+                x = self._set_parity(x, dest.id, False)
+                return x | (x << (1 << dest.id))
+            case ASTS.VarAssignment(dest=dest, src=src):
+                return self._assign_var(x, dest.id, src.id, flip=False)
+            case ASTS.StepAssignment(dest=dest, src=src):
+                return self._assign_var(x, dest.id, src.id, flip=True)
+            case ASTS.Assume(expr=ASTS.VarEq(lhs=lhs, rhs=rhs)):
+                return x & self._eq(lhs.id, rhs.id)
+            case ASTS.Assume(expr=ASTS.VarConsEq(lhs=lhs, rhs=rhs)):
+                return x & self._parity_mask(lhs.id, rhs % 2 == 1)
+            case ASTS.Assume(expr=ASTS.BaseComp()):
+                return x
+            case ASTS.Assert(orc=orc):
+                return x & self._orc_mask(orc)
+            case ASTS.Assignment():
+                # Shape assignments (NULL, new and fields) don't change the
+                # parities, as in PAFull
+                return x
+            case _:
+                assert False, "Unhandled AST encountered in PABitset transform"
+
+    def state_size(self, x):
+        return 1 if self.is_coarse(x) else x.bit_count()
+
+    def state_nbytes(self, x):
+        return sys.getsizeof(x)
+
+    def verify_assertion(self, ass: ASTS.Assert, x):
+        if self.is_coarse(x):
+            return self._coarse.verify_assertion(ass, x)
+        if not all(isinstance(p,(ASTS.TestOdd, ASTS.TestEven))
+                   for andc in ass.orc.andc_list for p in andc.pred_list):
+            return False
+        return (x & ~self._orc_mask(ass.orc)) == 0
+
+def _main():
+    from analyzer import run_analysis
+    run_analysis(PABitset)
+
+if __name__ == "__main__":
+    _main()
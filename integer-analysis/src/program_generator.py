@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Generates synthetic .prog programs of controllable size and shape.
+
+Usage: program_generator.py [param=value ...]
+where the parameters are the keyword arguments of generate_program, e.g.:
+    python3 src/program_generator.py num_vars=6 num_labels=40 loop_depth=2
+"""
+
+import random
+from typing import List, Optional
+
+
+class ProgramGenerator:
+    """Generates a random structured program.
+
+    The program is generated as a sequence of blocks, each block is either
+    a simple command, a branch (an `assume` fan-out whose arms join back
+    at a single label) or a counting loop (whose counter is assigned a
+    constant before the loop and decremented at the end of its body, so
+    the loop terminates). A chosen number of the simple commands are then
+    turned into `?` assignments and assertions.
+
+    Parameters:
+      num_vars      - Number of program variables.
+      num_labels    - Approximate number of commands (labels) in the program.
+      loop_depth    - Maximal nesting depth of loops (0 for no loops).
+      unknowns      - Number of `x := ?` commands.
+      fanout        - Maximal number of arms of a branch (less than 2 for
+                      no branches).
+      assertions    - Number of assertion commands.
+      parity_ratio  - The fraction of the assertions that are parity
+                      (EVEN/ODD) assertions, the rest are SUM assertions.
+      max_const     - Constants are drawn from the range [0, max_const].
+      seed          - Seed of the random generator.
+    """
+
+    LOOP_PROB = 0.25
+    BRANCH_PROB = 0.25
+
+    def __init__(self, num_vars=4, num_labels=20, loop_depth=1, unknowns=2,
+                 fanout=2, assertions=3, parity_ratio=0.5, max_const=3,
+                 seed: Optional[int] = None):
+        assert num_vars > 0, "At least one variable is required"
+        self.num_vars = num_vars
+        self.num_labels = num_labels
+        self.loop_depth = loop_depth
+        self.unknowns = unknowns
+        self.fanout = fanout
+        self.assertions = assertions
+        self.parity_ratio = parity_ratio
+        self.max_const = max_const
+        self.rand = random.Random(seed)
+
+        self._next_label = 0
+        self._lines: List[list] = []
+        # Indices of the lines holding simple commands that may be replaced,
+        # along with the variables that may not be assigned there
+        self._slots: List[tuple] = []
+
+    def generate(self) -> str:
+        """Returns the text of the generated program."""
+        entry = self._new_label()
+        self._gen_block(self.num_labels, entry, depth=0, protected=frozenset())
+        self._place_special_commands()
+        varnames = ' '.join(self._var(i) for i in range(self.num_vars))
+        width = max((len(cmd) for _, cmd, _ in self._lines), default=0)
+        lines = [f"L{start:<4} {cmd:<{width}}  L{end}" for start, cmd, end in self._lines]
+        return varnames + "\n\n" + '\n'.join(lines) + '\n'
+
+    # ----- Structure -----
+
+    def _new_label(self) -> int:
+        self._next_label += 1
+        return self._next_label - 1
+
+    def _emit(self, start, cmd, end):
+        self._lines.append([start, cmd, end])
+
+    def _var(self, i: int) -> str:
+        # Variable names may only consist of letters
+        name = ""
+        while True:
+            name = chr(ord('a') + i % 26) + name
+            i = i // 26 - 1
+            if i < 0:
+                return "v" + name
+
+    def _const(self) -> int:
+        return self.rand.randint(0, self.max_const)
+
+    def _gen_block(self, budget, entry, depth, protected) -> int:
+        """Generates commands starting at the entry label, consuming
+        roughly `budget` labels. Returns the exit label of the block."""
+        cur = entry
+        while budget > 0:
+            r = self.rand.random()
+            free_vars = [i for i in range(self.num_vars) if i not in protected]
+            if (depth < self.loop_depth and budget >= 4 and free_vars
+                    and r < self.LOOP_PROB):
+                body_budget = self.rand.randint(2, max(2, budget // 2))
+                cur = self._gen_loop(body_budget, cur, depth, protected, free_vars)
+                budget -= body_budget + 3
+            elif (self.fanout >= 2 and budget >= 3
+                    and r < self.LOOP_PROB + self.BRANCH_PROB):
+                arms = self.rand.randint(2, self.fanout)
+                arm_budget = max(1, (budget - 1) // (arms + 1))
+                cur = self._gen_branch(arms, arm_budget, cur, depth, protected)
+                budget -= arm_budget * arms + 1
+            else:
+                nxt = self._new_label()
+                self._emit_simple(cur, nxt, protected)
+                cur = nxt
+                budget -= 1
+        return cur
+
+    def _gen_loop(self, body_budget, entry, depth, protected, free_vars) -> int:
+        k_id = self.rand.choice(free_vars)
+        k = self._var(k_id)
+        head = self._new_label()
+        body = self._new_label()
+        self._emit(entry, f"{k} := {self.rand.randint(1, self.max_const + 1)}", head)
+        self._emit(head, f"assume {k} != 0", body)
+        protected = protected | {k_id}
+        body_end = self._gen_block(body_budget, body, depth + 1, protected)
+        self._emit(body_end, f"{k} := {k} - 1", head)
+        exit_l = self._new_label()
+        self._emit(head, f"assume {k} = 0", exit_l)
+        return exit_l
+
+    def _gen_branch(self, arms, arm_budget, entry, depth, protected) -> int:
+        join = self._new_label()
+        v = self._var(self.rand.randrange(self.num_vars))
+        c = self._const()
+        complementary = arms == 2 and self.rand.random() < 0.5
+        for a in range(arms):
+            if complementary:
+                cond = f"{v} = {c}" if a == 0 else f"{v} != {c}"
+            else:
+                cond = "TRUE"
+            arm = self._new_label()
+            self._emit(entry, f"assume {cond}", arm)
+            arm_end = self._gen_block(arm_budget, arm, depth, protected)
+            self._emit(arm_end, "skip", join)
+        return join
+
+    # ----- Simple commands -----
+
+    def _emit_simple(self, start, end, protected):
+        self._slots.append((len(self._lines), protected))
+        self._emit(start, self._assignment(protected), end)
+
+    def _assignment(self, protected) -> str:
+        targets = [i for i in range(self.num_vars) if i not in protected]
+        if not targets:
+            return "skip"
+        dest = self._var(self.rand.choice(targets))
+        src = self._var(self.rand.randrange(self.num_vars))
+        return self.rand.choice((
+            f"{dest} := {self._const()}",
+            f"{dest} := {src}",
+            f"{dest} := {src} + 1",
+            f"{dest} := {src} - 1",
+        ))
+
+    def _place_special_commands(self):
+        slots = list(self._slots)
+        self.rand.shuffle(slots)
+        for _ in range(min(self.assertions, len(slots))):
+            line, _ = slots.pop()
+            is_parity = self.rand.random() < self.parity_ratio
+            self._lines[line][1] = (self._parity_assertion() if is_parity
+                                    else self._sum_assertion())
+        placed = 0
+        for line, protected in slots:
+            if placed == self.unknowns:
+                break
+            targets = [i for i in range(self.num_vars) if i not in protected]
+            if targets:
+                self._lines[line][1] = f"{self._var(self.rand.choice(targets))} := ?"
+                placed += 1
+
+    def _parity_assertion(self) -> str:
+        def andc():
+            n = self.rand.randint(1, min(2, self.num_vars))
+            ids = self.rand.sample(range(self.num_vars), n)
+            return ' '.join(f"{self.rand.choice(('EVEN', 'ODD'))} {self._var(i)}" for i in ids)
+        return "assert " + ' '.join(f"({andc()})" for _ in range(self.rand.randint(1, 2)))
+
+    def _sum_assertion(self) -> str:
+        def sum_expr():
+            n = self.rand.randint(1, min(3, self.num_vars))
+            return "SUM " + ' '.join(self._var(self.rand.randrange(self.num_vars))
+                                     for _ in range(n))
+        return f"assert ({sum_expr()} = {sum_expr()})"
+
+
+def generate_program(**params) -> str:
+    """Returns the text of a random program, see ProgramGenerator for the
+    list of parameters."""
+    return ProgramGenerator(**params).generate()
+
+
+def _main():
+    from sys import argv
+    params = {}
+    for arg in argv[1:]:
+        name, value = arg.split('=')
+        params[name] = float(value) if name == 'parity_ratio' else int(value)
+    print(generate_program(**params), end="")
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+A reduced product of any number of analyses.
+
+The values of ReducedProduct are tuples holding a value of every component
+analysis, and the CFG is traversed once for all of them. After every
+transform (and every value a label stores) the components are reduced by
+each other through pairwise reducers: a reducer takes the values of two
+components and returns them refined by each other. The reducers run to a
+local fixpoint over a worklist of components, such that a reducer runs
+again only once one of its components changes, and if any component
+becomes bottom the whole product does.
+
+Reducers are looked up by the registered analyses (see registry.py) the
+components are instances of, see register_reducer. The built in ones
+reduce parity values with summation values (see combination_analysis),
+and both of them with Karr's linear equalities, which know the variables
+that hold constants.
+
+Usage: reduced_product.py <program file> [<component>,<component>,...]
+The components are analysis names of the registry (pabitset,summation by
+default).
+"""
+
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from analysis import BaseAnalysis
+from cache import LRUCache
+import ast_nodes as ASTS
+from registry import get_analysis
+
+# A reducer takes (a, b, x, y), where x and y are values of the component
+# analyses a and b, and returns the pair (x, y) reduced by each other.
+# Reducers should be idempotent: a reducer isn't applied to its own results.
+Reducer = Callable[[BaseAnalysis, BaseAnalysis, object, object], Tuple[object, object]]
+
+_PARITY = ["padumb", "pafull", "pabitset", "pabdd", "paaffine"]
+_SUMMATION = ["summation"]
+_KARR = ["karr"]
+
+# (analysis names of the first component, of the second component, reducer)
+_REDUCERS: List[Tuple[List[str], List[str], Reducer]] = []
+
+
+def register_reducer(names_a: List[str], names_b: List[str], reducer: Reducer):
+    """Registers reducer for the pairs of components which are instances of
+    the analyses registered (see registry.py) under names_a and names_b."""
+    _REDUCERS.append((names_a, names_b, reducer))
+
+def _reduce_parity_summation(parity, summation, x, y):
+    # Imported here so that importing this module does not load numpy
+    from combination_analysis import reduce_parity_summation
+    return reduce_parity_summation(parity, x, y)
+
+# Karr value -> its _karr_constants, as every Karr value is reduced with
+# both the parity and the summation components
+_karr_constants_cache = LRUCache(4096)
+
+def _karr_constants(karr, x) -> Dict[int, int]:
+    """Returns a dictionary mapping the ids of the variables which hold an
+    integer constant in the Karr value x to their constants."""
+    def compute():
+        p, B = x
+        free = {i for row in B for i, v in enumerate(row) if v}
+        return {i: int(p[i]) for i in range(karr.n)
+                if i not in free and p[i].denominator == 1}
+    return _karr_constants_cache.lookup(x, compute)
+
+def _reduce_parity_by_karr(karr, parity, x, y):
+    if x is None:
+        return x, parity.bottom()
+    for i, const in _karr_constants(karr, x).items():
+        y = parity.transform(ASTS.Assume(ASTS.VarConsEq(ASTS.Var("", i), const)), y)
+    return x, y
+
+def _reduce_summation_by_karr(karr, summation, x, y):
+    # Imported here so that importing this module does not load the
+    # summation analysis
+    from summation_analysis import AbsVal
+    if x is None:
+        return x, summation.bottom()
+    consts = _karr_constants(karr, x)
+    if not consts:
+        return x, y
+
+    def possible(case):
+        for i, const in consts.items():
+            match case[i]:
+                case AbsVal(unknown=None, const=c) if c != const:
+                    return False
+        return True
+    kept = set(filter(possible, y))
+    return x, (y if len(kept) == len(y) else kept)
+
+register_reducer(_PARITY, _SUMMATION, _reduce_parity_summation)
+register_reducer(_KARR, _PARITY, _reduce_parity_by_karr)
+register_reducer(_KARR, _SUMMATION, _reduce_summation_by_karr)
+
+
+class ReducedProduct(BaseAnalysis):
+    """
+    The reduced product of the analyses named in COMPONENTS (or given to
+    the constructor), with the registered reducers of their pairs.
+    """
+    COMPONENTS = ["pabitset", "summation"]
+    MAX_REDUCTION_STEPS = 1000
+
+    def __init__(self, num_vars, components: Optional[List[str]] = None):
+        names = components or self.COMPONENTS
+        self.names = names
+        self.analyses = [get_analysis(name)(num_vars) for name in names]
+        # (index of the first component, of the second, reducer)
+        self.reducers = []
+        for names_a, names_b, reducer in _REDUCERS:
+            classes_a = tuple(get_analysis(name) for name in names_a)
+            classes_b = tuple(get_analysis(name) for name in names_b)
+            for i, a in enumerate(self.analyses):
+                for j, b in enumerate(self.analyses):
+                    if i != j and isinstance(a, classes_a) and isinstance(b, classes_b):
+                        self.reducers.append((i, j, reducer))
+        # component index -> indices of the reducers it takes part in
+        self._touching = [[r for r, (i, j, _) in enumerate(self.reducers) if c in (i, j)]
+                          for c in range(len(self.analyses))]
+        self._reset()
+
+    def _reset(self):
+        self.reductions = 0
+        self.reducer_applications = 0
+        self.skipped_applications = 0
+
+    def fresh(self):
+        ret = super().fresh()
+        ret.analyses = [a.fresh() for a in self.analyses]
+        ret._reset()
+        return ret
+
+    def bottom(self):
+        return tuple(a.bottom() for a in self.analyses)
+
+    def top(self):
+        return tuple(a.top() for a in self.analyses)
+
+    def join(self, l: Iterable):
+        l = list(l)
+        if not l:
+            return self.bottom()
+        return tuple(a.join(xs) for a, xs in zip(self.analyses, zip(*l)))
+
+    def equiv(self, x, y):
+        return all(a.equiv(u, v) for a, u, v in zip(self.analyses, x, y))
+
+    def is_bottom(self, x):
+        return any(a.is_bottom(v) for a, v in zip(self.analyses, x))
+
+    def reduce(self, x):
+        """Returns x with its components reduced by each other, up to a
+        local fixpoint of the reducers."""
+        self.reductions += 1
+        x = list(x)
+        if self.is_bottom(x):
+            return self.bottom()
+        analyses = self.analyses
+        versions = [0] * len(x)
+        # reducer index -> the versions of its components it last ran on
+        applied = {}
+        work = list(reversed(range(len(x))))
+        queued = set(work)
+        for _ in range(self.MAX_REDUCTION_STEPS):
+            if not work:
+                return tuple(x)
+            c = work.pop()
+            queued.discard(c)
+            for r in self._touching[c]:
+                i, j, reducer = self.reducers[r]
+                if applied.get(r) == (versions[i], versions[j]):
+                    self.skipped_applications += 1
+                    continue
+                self.reducer_applications += 1
+                for k, v in zip((i, j), reducer(analyses[i], analyses[j], x[i], x[j])):
+                    if v is x[k]:
+                        continue
+                    v = analyses[k].stabilize(v)
+                    if analyses[k].equiv(v, x[k]):
+                        continue
+                    if analyses[k].is_bottom(v):
+                        return self.bottom()
+                    x[k] = v
+                    versions[k] += 1
+                    if k not in queued:
+                        queued.add(k)
+                        work.append(k)
+                applied[r] = (versions[i], versions[j])
+        assert False, f"Exceeded the max reduction steps {self.MAX_REDUCTION_STEPS}"
+
+    def transform(self, ast, x):
+        # The components are stabilized first, as the reducers inspect them
+        return self.stabilize(super().transform(ast, x))
+
+    def transform_nontrivial(self, ast: ASTS.SyntaxNode, x):
+        return tuple(a.transform_nontrivial(ast, v) for a, v in zip(self.analyses, x))
+
+    def stabilize(self, x):
+        return self.reduce(tuple(a.stabilize(v) for a, v in zip(self.analyses, x)))
+
+    def verify_assertion(self, ass: ASTS.Assert, x):
+        return any(a.verify_assertion(ass, v) for a, v in zip(self.analyses, x))
+
+    def verify_assertion_batch(self, pairs):
+        pairs = list(pairs)
+        ret = [False] * len(pairs)
+        # Every component verifies only the assertions the previous ones
+        # couldn't prove
+        for c, a in enumerate(self.analyses):
+            rest = [k for k, proven in enumerate(ret) if not proven]
+            if not rest:
+                break
+            for k, proven in zip(rest, a.verify_assertion_batch(
+                    (pairs[k][0], pairs[k][1][c]) for k in rest)):
+                ret[k] = proven
+        return ret
+
+    def state_size(self, x):
+        return sum(a.state_size(v) for a, v in zip(self.analyses, x))
+
+    def state_nbytes(self, x):
+        return sum(a.state_nbytes(v) for a, v in zip(self.analyses, x))
+
+    def accumulate(self, old, new):
+        return tuple(a.accumulate(u, v) for a, u, v in zip(self.analyses, old, new))
+
+    def accelerate_loop(self, loop, x):
+        return tuple(a.accelerate_loop(loop, v) for a, v in zip(self.analyses, x))
+
+    def exit_loop(self, loop, entry, x):
+        return tuple(a.exit_loop(loop, e, v) for a, e, v in zip(self.analyses, entry, x))
+
+    def coarsen(self, x):
+        return tuple(a.coarsen(v) for a, v in zip(self.analyses, x))
+
+    def is_coarse(self, x):
+        return any(a.is_coarse(v) for a, v in zip(self.analyses, x))
+
+    def stats(self):
+        stats = {}
+        for a in self.analyses:
+            stats.update(a.stats())
+        return {**stats, "components": ",".join(self.names),
+                "reductions": self.reductions,
+                "reducer_applications": self.reducer_applications,
+                "skipped_applications": self.skipped_applications}
+
+class ReducedProductKarr(ReducedProduct):
+    COMPONENTS = ["pabitset", "summation", "karr"]
+
+def _main():
+    import sys
+    from analyzer import run_analysis
+    method = ReducedProduct
+    COMPONENTS_PARAMETER_INDEX = 2
+    if len(sys.argv) >= COMPONENTS_PARAMETER_INDEX + 1:
+        from functools import partial
+        method = partial(ReducedProduct,
+                         components=sys.argv[COMPONENTS_PARAMETER_INDEX].lower().split(','))
+    run_analysis(method)
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Cost and precision benchmark of the reduction schedules.
+
+Every reductive combined analysis runs with every reduction schedule (see
+combination_analysis.SCHEDULES) over examples/combined.prog and generated
+programs. The total running time and the number of proven assertions of
+each analysis and schedule are reported, along with the failures (timeouts
+or divergence).
+
+Usage: reduction_benchmark.py [-h] [--seeds N] [--analyses A,B,...]
+                              [--timeout SECONDS] [--output FILE]
+"""
+
+import argparse
+import json
+import os
+from typing import Dict, List
+
+from benchmark import BASE_PARAMS, DEFAULT_TIMEOUT, run_benchmark
+from combination_analysis import (SCHEDULES, CombinedAnalysisReductive,
+                                  CombinedAnalysisLeftReductive,
+                                  CombinedAnalysisRightReductive)
+from program_generator import generate_program
+
+EXAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                       "examples", "combined.prog")
+
+ANALYSES = {
+    "CombinedAnalysisReductive": CombinedAnalysisReductive,
+    "CombinedAnalysisLeftReductive": CombinedAnalysisLeftReductive,
+    "CombinedAnalysisRightReductive": CombinedAnalysisRightReductive,
+}
+
+# generator parameter -> values, each combined with BASE_PARAMS
+PROGRAMS = [dict(), dict(loop_depth=2), dict(num_vars=6), dict(unknowns=4)]
+
+
+def _with_schedule(method, schedule: str):
+    return type(method.__name__, (method,), {"SCHEDULE": schedule})
+
+def _programs(seeds: int) -> List[Dict]:
+    with open(EXAMPLE, 'r') as f:
+        programs = [{"program": "combined.prog", "text": f.read()}]
+    for overrides in PROGRAMS:
+        for seed in range(seeds):
+            params = dict(BASE_PARAMS, **overrides)
+            params["seed"] = seed
+            name = ' '.join(f"{k}={v}" for k, v in params.items() if BASE_PARAMS.get(k) != v)
+            programs.append({"program": name, "text": generate_program(**params)})
+    return programs
+
+def run(analyses: Dict, seeds=3, timeout=DEFAULT_TIMEOUT, verbose=True) -> List[Dict]:
+    records = []
+    for program in _programs(seeds):
+        for analysis_name, method in analyses.items():
+            for schedule in SCHEDULES:
+                record = run_benchmark(program["text"], _with_schedule(method, schedule),
+                                       timeout, measure_memory=False)
+                record.update(program=program["program"], analysis=analysis_name,
+                              schedule=schedule)
+                records.append(record)
+                if verbose:
+                    print(f"  {program['program']} {analysis_name} {schedule}: "
+                          f"{record['status']}", flush=True)
+    return records
+
+def summarize(records: List[Dict]) -> Dict:
+    """Returns {analysis: {schedule: {time, proven, assertions, failures}}},
+    where time and proven are totals over the programs every schedule of
+    the analysis finished."""
+    finished = {}
+    for r in records:
+        key = (r["analysis"], r["program"])
+        finished[key] = finished.get(key, True) and r["status"] == "ok"
+    summary = {}
+    for r in records:
+        s = summary.setdefault(r["analysis"], {}).setdefault(
+            r["schedule"], {"time": 0.0, "proven": 0, "assertions": 0, "failures": 0})
+        if r["status"] != "ok":
+            s["failures"] += 1
+        if finished[(r["analysis"], r["program"])]:
+            s["time"] += r["time"]
+            s["proven"] += r["proven"]
+            s["assertions"] += r["assertions"]
+    return summary
+
+def print_summary(summary: Dict):
+    print("\n===== total time [ms] / proven assertions / failures =====")
+    print(f"{'':>30} " + ''.join(f"{s:>20}" for s in SCHEDULES))
+    for analysis, by_schedule in summary.items():
+        cells = [f"{s['time']*1000:.0f}/{s['proven']}of{s['assertions']}/{s['failures']}"
+                 for s in (by_schedule[schedule] for schedule in SCHEDULES)]
+        print(f"{analysis:>30} " + ''.join(f"{c:>20}" for c in cells))
+
+
+def _main():
+    argparser = argparse.ArgumentParser(description="Benchmark of the reduction schedules.")
+    argparser.add_argument("--seeds", type=int, default=3,
+                           help="generated programs per parameter set")
+    argparser.add_argument("--analyses", default=','.join(ANALYSES),
+                           help=f"comma separated analyses out of: {', '.join(ANALYSES)}")
+    argparser.add_argument("--timeout", type=int, default=DEFAULT_TIMEOUT,
+                           help="per run timeout in seconds")
+    argparser.add_argument("--output", default=None, help="JSON file to write the records into")
+    args = argparser.parse_args()
+
+    names = args.analyses.split(',')
+    for name in names:
+        assert name in ANALYSES, f'Unrecognized analysis "{name}"'
+    records = run({name: ANALYSES[name] for name in names}, args.seeds, args.timeout)
+    summary = summarize(records)
+    print_summary(summary)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"records": records, "summary": summary}, f, indent=2)
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Registry of the available analyses by name.
+
+The analysis classes are imported only when they are looked up, so that
+listing or resolving names does not load the dependencies of every
+analysis.
+
+The special name "auto" (see auto_select.py) is resolved per program,
+once it is parsed, rather than into a single analysis class.
+"""
+
+import importlib
+
+# name -> (module, class name, aliases)
+_REGISTRY = {
+    "padumb": ("parity_analysis", "PADumb", ["dumb", "dumbparity"]),
+    "pafull": ("parity_analysis", "PAFull", ["parity", "fullparity"]),
+    "pabitset": ("parity_bitset", "PABitset", ["bitset", "bitsetparity"]),
+    "pabdd": ("parity_bdd", "PABdd", ["bdd", "bddparity"]),
+    "paaffine": ("parity_affine", "PAAffine", ["affine", "affineparity"]),
+    "summation": ("summation_analysis", "SummationAnalysis", ["sum"]),
+    "sumbounded": ("summation_analysis", "SummationAnalysisBounded", ["boundedsum", "klimited"]),
+    "sumantichain": ("summation_analysis", "SummationAnalysisAntichain", ["antichain", "antichainsum"]),
+    "sumcolumnar": ("summation_columnar", "SummationColumnar", ["columnar", "columnarsum"]),
+    "karr": ("karr_analysis", "KarrAnalysis", ["linear", "linearequality"]),
+    "fullreduction": ("combination_analysis", "CombinedAnalysisReductive",
+                      ["full", "reductive", "fullreductive", "both", "twosidereduction"]),
+    "parityreduction": ("combination_analysis", "CombinedAnalysisRightReductive",
+                        ["right", "rightreductive", "leftreduction"]),
+    "sumreduction": ("combination_analysis", "CombinedAnalysisLeftReductive",
+                     ["left", "leftreductive", "rightreduction"]),
+    "noreduction": ("combination_analysis", "CombinedAnalysis",
+                    ["basic", "trivial", "cartezian"]),
+    "product": ("reduced_product", "ReducedProduct", ["reducedproduct", "nway"]),
+    "productkarr": ("reduced_product", "ReducedProductKarr", ["karrproduct", "paritysumkarr"]),
+}
+
+AUTO_ANALYSIS = "auto"
+
+_ALIASES = {alias: name for name, (_, _, aliases) in _REGISTRY.items()
+            for alias in [name] + aliases}
+_ALIASES[AUTO_ANALYSIS] = AUTO_ANALYSIS
+
+DEFAULT_ANALYSIS = "fullreduction"
+
+
+def analysis_names():
+    """Returns the canonical names of all the registered analyses."""
+    return list(_REGISTRY)
+
+def canonical_name(name: str) -> str:
+    """Resolves an analysis name or alias (case insensitive) into its
+    canonical name."""
+    name = name.lower()
+    assert name in _ALIASES, f'Unrecognized analysis name "{name}"'
+    return _ALIASES[name]
+
+def get_analysis(name: str):
+    """Returns the analysis class registered under the given name or alias."""
+    name = canonical_name(name)
+    assert name != AUTO_ANALYSIS, "The auto analysis is selected per program, see auto_select.py"
+    module, cls, _ = _REGISTRY[name]
+    return getattr(importlib.import_module(module), cls)
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Startup time benchmark of the entry points.
+
+Every entry point is run in a fresh interpreter several times, and its
+median wall clock time is reported along with its overhead over a bare
+interpreter startup. Two regressions are detected:
+  - a light entry point loading a heavy dependency (see FORBIDDEN_MODULES),
+  - an overhead exceeding the one recorded in the baseline file by more
+    than the tolerance (the baseline is recorded if it doesn't exist yet).
+
+Usage: startup_benchmark.py [-h] [--repeat N] [--baseline FILE]
+                            [--tolerance RATIO] [--save]
+Exits with a non-zero status upon a regression.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from statistics import median
+from time import perf_counter
+from typing import Dict, List
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+EXAMPLES_DIR = os.path.join(os.path.dirname(SRC_DIR), "examples")
+
+HEAVY_MODULES = ["numpy", "networkx"]
+
+# entry point name -> interpreter arguments
+ENTRY_POINTS = {
+    "bare": ["-c", "pass"],
+    "import registry": ["-c", "import registry"],
+    "import analysis_client": ["-c", "import analysis_client"],
+    "import batch_analyze": ["-c", "import batch_analyze"],
+    "import summation_analysis": ["-c", "import summation_analysis"],
+    "import combination_analysis": ["-c", "import combination_analysis"],
+    "import reduced_product": ["-c", "import reduced_product"],
+    "import parity_analysis": ["-c", "import parity_analysis"],
+    "import analyzer": ["-c", "import analyzer"],
+    "run summation": [os.path.join(SRC_DIR, "summation_analysis.py"),
+                      os.path.join(EXAMPLES_DIR, "sum.prog")],
+    "run parity": [os.path.join(SRC_DIR, "parity_analysis.py"),
+                   os.path.join(EXAMPLES_DIR, "parity_intro.prog")],
+}
+
+# module -> heavy modules it may not load when imported
+FORBIDDEN_MODULES = {
+    "registry": ["numpy", "networkx"],
+    "analysis_client": ["numpy", "networkx"],
+    "batch_analyze": ["numpy", "networkx"],
+    "summation_analysis": ["numpy", "networkx"],
+    "combination_analysis": ["numpy", "networkx"],
+    "reduced_product": ["numpy", "networkx"],
+}
+
+DEFAULT_REPEAT = 7
+DEFAULT_TOLERANCE = 0.5
+# Overheads below this many seconds are never considered regressions,
+# since they are dominated by noise
+MIN_REGRESSION = 0.02
+
+
+def _run(args: List[str]):
+    env = dict(os.environ, PYTHONPATH=SRC_DIR)
+    subprocess.run([sys.executable] + args, env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def time_entry_point(args: List[str], repeat=DEFAULT_REPEAT) -> float:
+    """Returns the median wall clock time of running the interpreter with args."""
+    times = []
+    for _ in range(repeat):
+        t0 = perf_counter()
+        _run(args)
+        times.append(perf_counter() - t0)
+    return median(times)
+
+def loaded_heavy_modules(module: str) -> List[str]:
+    """Returns the heavy modules loaded by importing module."""
+    code = (f"import sys, {module}; "
+            f"print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))")
+    out = subprocess.run([sys.executable, "-c", code], check=True, text=True,
+                         capture_output=True, env=dict(os.environ, PYTHONPATH=SRC_DIR))
+    return out.stdout.split()
+
+def measure(repeat=DEFAULT_REPEAT) -> Dict[str, Dict]:
+    """Returns {entry point: {"time", "overhead"}} in seconds, where the
+    overhead is the time over a bare interpreter startup."""
+    times = {name: time_entry_point(args, repeat) for name, args in ENTRY_POINTS.items()}
+    return {name: {"time": t, "overhead": max(0.0, t - times["bare"])}
+            for name, t in times.items()}
+
+def find_regressions(results: Dict, baseline: Dict, tolerance=DEFAULT_TOLERANCE) -> List[str]:
+    """Returns descriptions of the entry points whose overhead regressed."""
+    regressions = []
+    for name, r in results.items():
+        if name not in baseline or name == "bare":
+            continue
+        limit = max(baseline[name]["overhead"] * (1 + tolerance),
+                    baseline[name]["overhead"] + MIN_REGRESSION)
+        if r["overhead"] > limit:
+            regressions.append(f"{name}: overhead {r['overhead']*1000:.0f}ms exceeds "
+                               f"{limit*1000:.0f}ms (baseline {baseline[name]['overhead']*1000:.0f}ms)")
+    return regressions
+
+def find_forbidden_imports() -> List[str]:
+    """Returns descriptions of the modules loading forbidden heavy modules."""
+    violations = []
+    for module, forbidden in FORBIDDEN_MODULES.items():
+        loaded = [m for m in loaded_heavy_modules(module) if m in forbidden]
+        if loaded:
+            violations.append(f"import {module}: loads {', '.join(loaded)}")
+    return violations
+
+
+def _main():
+    argparser = argparse.ArgumentParser(description="Startup time benchmark of the entry points.")
+    argparser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT,
+                           help="number of runs per entry point")
+    argparser.add_argument("--baseline", help="JSON file of the baseline timings")
+    argparser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                           help="allowed relative increase of the overhead")
+    argparser.add_argument("--save", action="store_true",
+                           help="overwrite the baseline with the current timings")
+    args = argparser.parse_args()
+
+    results = measure(args.repeat)
+    print(f"{'entry point':>30} {'time [ms]':>10} {'overhead [ms]':>14}")
+    for name, r in results.items():
+        print(f"{name:>30} {r['time']*1000:>10.1f} {r['overhead']*1000:>14.1f}")
+
+    failures = find_forbidden_imports()
+    if args.baseline:
+        if args.save or not os.path.exists(args.baseline):
+            with open(args.baseline, 'w') as f:
+                json.dump(results, f, indent=2)
+            print(f"\nBaseline written to {args.baseline}")
+        else:
+            with open(args.baseline, 'r') as f:
+                baseline = json.load(f)
+            failures += find_regressions(results, baseline, args.tolerance)
+
+    if failures:
+        print("\nStartup regressions:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    _main()
@@ -1,9 +1,11 @@
 #!/usr/bin/env python3
 
-from analyzer import debug_analysis, run_analysis
 from analysis import BaseAnalysis
 import ast_nodes as ASTS
 from lattice import *
+from lattice_compiler import compile_lattice
+from collections import Counter
+from typing import Optional
 from copy import deepcopy
 
 
@@ -16,6 +18,8 @@ class AbsVal:
         self.unknown = unknown
 
     def __eq__(self, other):
+        if not isinstance(other, AbsVal):
+            return NotImplemented
         return self.unknown == other.unknown and \
                self.const == other.const
 
@@ -45,18 +49,80 @@ class AbsVal:
         """Returns True iff the sum of the elements in l1 is equal to the sum of the elements in l2."""
         if sum(x.const for x in l1) != sum(x.const for x in l2):
             return False
-        l1_unknowns = [x.unknown for x in l1 if x.unknown is not None]
-        l2_unknowns = [x.unknown for x in l2 if x.unknown is not None]
-        return {x.unknown: l1_unknowns.count(x.unknown) for x in l1} == {x.unknown: l2_unknowns.count(x.unknown) for x in l2}
+        return (Counter(x.unknown for x in l1 if x.unknown is not None) ==
+                Counter(x.unknown for x in l2 if x.unknown is not None))
 
 
 
+def compile_sum_assertion(ass: ASTS.Assert, num_vars: int):
+    """
+    Returns a list of the SUM predicates of each AndChain of the assertion
+    as (coefficients, support) tuples - the linear form (SUM lhs) - (SUM rhs)
+    as a coefficient per variable, and the mask of the variables it
+    mentions. AndChains with any other predicate (which the summation
+    analysis can't prove) are None.
+    """
+    import numpy as np
+    compiled = []
+    for andc in ass.orc.andc_list:
+        preds = []
+        for pred in andc.pred_list:
+            if not isinstance(pred, ASTS.SumEq):
+                preds = None
+                break
+            coefs = np.zeros(num_vars, dtype=np.int64)
+            support = np.zeros(num_vars, dtype=bool)
+            for sign, var_list in ((1, pred.lhs.var_list), (-1, pred.rhs.var_list)):
+                for var in var_list:
+                    coefs[var.id] += sign
+                    support[var.id] = True
+            preds.append((coefs, support))
+        compiled.append(preds)
+    return compiled
+
+def sum_assertion_holds(compiled, is_val, consts, unknowns) -> bool:
+    """
+    Returns True iff every case (row) satisfies one of the AndChains of a
+    compiled assertion (see compile_sum_assertion), given the cases as
+    matrices with a column per variable: whether it holds a value, its
+    constant and the id of its unknown (negative if none).
+
+    A case satisfies a SUM predicate iff all the variables it mentions are
+    values whose linear form vanishes, both in the constants and in the
+    coefficients of every unknown.
+    """
+    import numpy as np
+    andcs = [preds for preds in compiled if preds is not None]
+    if not is_val.shape[0] or not andcs:
+        return False
+    num_vars = is_val.shape[1]
+    # One hot encoding of the unknowns of every case and variable
+    ids = np.unique(unknowns[unknowns >= 0])
+    one_hot = unknowns[:, :, np.newaxis] == ids
+
+    satisfied = np.zeros(is_val.shape[0], dtype=bool)
+    for preds in andcs:
+        coefs = np.array([c for c, _ in preds]).reshape(-1, num_vars)
+        support = np.array([s for _, s in preds]).reshape(-1, num_vars)
+        holds = ((is_val[:, np.newaxis, :] | ~support).all(axis=2) &
+                 (consts @ coefs.T == 0) &
+                 (np.einsum('cvu,pv->cpu', one_hot, coefs) == 0).all(axis=2))
+        satisfied |= holds.all(axis=1)
+    return bool(satisfied.all())
+
+
 class SummationLattice(Lattice):
     """The base lattice used for summation analysis."""
+    flat = True
+    # AbsVals and MemberTypes are hashable, and equal iff equivalent
+    hashable_members = True
 
     def join_nontrivial(self, x, y):
         return self.top() if x != y else x
 
+    def leq(self, x, y):
+        return self.is_bot(x) or self.is_top(y) or self.equiv(x, y)
+
     def inc(self, x):
         return x if self.is_top(x) or self.is_bot(x) else x + 1
 
@@ -65,13 +131,101 @@ class SummationLattice(Lattice):
 
 
 class SummationAnalysis(LatticeBasedAnalysis):
-    """The summation analysis created from a lattice fitted with a transform method."""
-    def __init__(self, num_vars):
-        self.lat = RelProd([SummationLattice()] * num_vars)
+    """The summation analysis created from a lattice fitted with a transform method.
+
+    Elements hold at most max_disjuncts cases (unbounded if None, see
+    DisjComp.limit), by default MAX_DISJUNCTS, and only the maximal cases
+    if antichain (by default ANTICHAIN) is True. Counting loops are
+    accelerated into a single case (per entering case) at their head, in
+    which the stepped variables are TOP, while their exit values are
+    computed in closed form for the cases entering them with a constant
+    counter. The lattice's methods are specialized by lattice_compiler if
+    COMPILE_LATTICE is True.
+    """
+    MAX_DISJUNCTS: Optional[int] = None
+    ANTICHAIN = False
+    INTERN_CACHE_SIZE = 4096
+    COMPILE_LATTICE = True
+
+    def __init__(self, num_vars, max_disjuncts: Optional[int] = None,
+                 antichain: Optional[bool] = None):
+        if max_disjuncts is None:
+            max_disjuncts = self.MAX_DISJUNCTS
+        if antichain is None:
+            antichain = self.ANTICHAIN
+        self.lat = RelProd([SummationLattice()] * num_vars, max_disjuncts, antichain)
+        if self.COMPILE_LATTICE:
+            self.lat = compile_lattice(self.lat)
+        if self.INTERN_CACHE_SIZE:
+            self.interner = Interner(self.lat, self.INTERN_CACHE_SIZE)
+        self._compiled_assertions = {}
 
     def lattice(self):
         return self.lat
 
+    def accumulate(self, old, new):
+        # Merging cases once there are too many of them isn't monotone,
+        # so with a bound the cases of a label only ever grow
+        if self.lat.max_disjuncts is None:
+            return new
+        return self.lat.join([old, new])
+
+    @staticmethod
+    def _counter(loop, x) -> Optional[int]:
+        """Returns the value of the counter of the loop in the case x, or
+        None if it isn't a constant."""
+        counter = x[loop.counter]
+        if isinstance(counter, AbsVal) and counter.unknown is None:
+            return counter.const
+        return None
+
+    def accelerate_loop(self, loop, X):
+        # All the iterations are within the case in which the stepped
+        # variables are TOP, which is only needed if the loop iterates
+        widened = set()
+        for x in X:
+            if self.lat.lat.is_bot(x):
+                continue
+            counter = self._counter(loop, x)
+            if counter is None or loop.trip_count(counter) != 0:
+                widened.add(self._iterate(loop, x, None))
+        # The cases within the widened cases are dropped, or the iteration
+        # would keep unrolling them
+        Y = {y for y in X if not any(self.lat.lat.leq(y, w) for w in widened)}
+        return self.lat.limit(Y | widened)
+
+    def exit_loop(self, loop, entry, x):
+        Y = set()
+        for e in entry:
+            if self.lat.lat.is_bot(e):
+                continue
+            counter = self._counter(loop, e)
+            if counter is not None:
+                # The counter is known, and so is the case the loop exits
+                # with (if it exits at all)
+                trips = loop.trip_count(counter)
+                if trips is not None:
+                    Y.add(self._iterate(loop, e, trips))
+            else:
+                Y.add(e)
+                Y.add(self._iterate(loop, e, None))
+        return self.lat.limit(Y)
+
+    def _iterate(self, loop, x, t: Optional[int]):
+        """Returns the case x after t iterations of the counting loop (any
+        number of them, at least one, if t is None)."""
+        if t == 0:
+            return x
+        Y = list(x)
+        for v, step in loop.steps.items():
+            if t is None:
+                Y[v] = self.lat.lat.lats[v].top()
+            elif isinstance(Y[v], AbsVal):
+                Y[v] = Y[v] + t * step
+        for dest, src in loop.copies.items():
+            Y[dest] = x[src]
+        return tuple(Y)
+
     def verify_assertion(self, ass: ASTS.Assert, Xset) -> bool:
         def satisfies_predicate(X, pred):
             if not isinstance(pred,(ASTS.SumEq)):
@@ -80,6 +234,8 @@ class SummationAnalysis(LatticeBasedAnalysis):
             rhs_ids = [var.id for var in pred.rhs.var_list]
             lhs = [X[i] for i in lhs_ids]
             rhs = [X[i] for i in rhs_ids]
+            if not all(isinstance(x, AbsVal) for x in lhs + rhs):
+                return False
             return AbsVal.sum_eq(lhs, rhs)
 
         def satisfies_AndChain(X, andc):
@@ -90,13 +246,31 @@ class SummationAnalysis(LatticeBasedAnalysis):
 
         return all(satisfies_OrChain(X, ass.orc) for X in Xset) if Xset else False
 
+    def verify_assertion_batch(self, pairs):
+        import numpy as np
+        n = len(self.lat.lat.lats)
+        ret = []
+        for ass, Xset in pairs:
+            key = ass.key()
+            if key not in self._compiled_assertions:
+                self._compiled_assertions[key] = compile_sum_assertion(ass, n)
+            cases = list(Xset)
+            is_val = np.array([[isinstance(v, AbsVal) for v in X] for X in cases], dtype=bool)
+            consts = np.array([[v.const if isinstance(v, AbsVal) else 0 for v in X]
+                               for X in cases], dtype=np.int64)
+            unknowns = np.array([[v.unknown if isinstance(v, AbsVal) and v.unknown is not None
+                                  else -1 for v in X] for X in cases], dtype=np.int64)
+            ret.append(sum_assertion_holds(self._compiled_assertions[key],
+                                           is_val, consts, unknowns))
+        return ret
+
     def transform_nontrivial(self, ast, X):
         Y = set()
         for x in X:
             y = self._transform_nontrivial(ast, x)
             if not self.lat.lat.is_bot(y):
                 Y.add(y)
-        return Y
+        return self.lat.limit(Y)
 
     def _transform_nontrivial(self, ast, x):
         if self.lat.lat.is_bot(x): return x
@@ -132,10 +306,23 @@ class SummationAnalysis(LatticeBasedAnalysis):
                     case ASTS.BaseVarComp():
                         negate = isinstance(expr, ASTS.VarNeq)
                         rhs = Y[expr.rhs.id]
-                        Y = Y if self.lat.lat.lats[expr.lhs.id].equiv(lhs, rhs) ^ negate else self.lat.lat.bot()
+                        lat = self.lat.lat.lats[expr.lhs.id]
+                        # A TOP operand may hold any value, so the case is
+                        # kept - which keeps the transform monotone
+                        if not (lat.is_top(lhs) or lat.is_top(rhs) or lat.equiv(lhs, rhs) ^ negate):
+                            Y = self.lat.lat.bot()
         return tuple(Y)
 
+class SummationAnalysisBounded(SummationAnalysis):
+    """The summation analysis with a bounded number of cases per label."""
+    MAX_DISJUNCTS = 32
+
+class SummationAnalysisAntichain(SummationAnalysis):
+    """The summation analysis which drops the cases within other cases."""
+    ANTICHAIN = True
+
 def _main():
+    from analyzer import run_analysis
     run_analysis(SummationAnalysis)
 
 if __name__ == "__main__":
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+A columnar representation of the summation analysis.
+
+Computes the same lattice elements as SummationAnalysis, but instead of a
+set of tuples of AbsVal objects, an element is a pair of integer matrices
+with a row per disjunct (case) and a column per variable: the constants,
+and the ids of the unknowns - where UNKNOWN_NONE marks a plain constant
+and TOP_CODE the top element (whose constant is always 0). The bottom
+element has no rows.
+
+Every command is applied as a column operation on all the cases at once,
+and duplicate cases are removed by hashing the rows.
+"""
+
+from analysis import BaseAnalysis
+import ast_nodes as ASTS
+from summation_analysis import compile_sum_assertion, sum_assertion_holds
+import numpy as np
+
+UNKNOWN_NONE = -1
+TOP_CODE = -2
+
+_HASH_SEED = 0x5eed
+
+
+class SummationColumnar(BaseAnalysis):
+    """
+    The lattice elements are (consts, unknowns) tuples of read-only int64
+    matrices, whose rows are unique and ordered by their hash - such that
+    equivalent elements are (almost always) equal matrices.
+    """
+
+    def __init__(self, num_vars):
+        self.n = num_vars
+        # Odd multipliers of the columns of both matrices, the hash of a
+        # row is its dot product with them (wrapping around 2^64)
+        rng = np.random.default_rng(_HASH_SEED)
+        self._multipliers = rng.integers(0, 1 << 63, size=2 * num_vars,
+                                         dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self._compiled_assertions = {}
+        empty = np.zeros((0, num_vars), dtype=np.int64)
+        self.BOTTOM = self._make(empty, empty)
+        self.TOP = self._make(np.zeros((1, num_vars), dtype=np.int64),
+                              np.full((1, num_vars), TOP_CODE, dtype=np.int64))
+
+    def _make(self, consts, unknowns):
+        """Returns the canonical element of the cases of the matrices."""
+        rows = np.hstack((consts, unknowns))
+        hashes = (rows.view(np.uint64) * self._multipliers).sum(axis=1, dtype=np.uint64)
+        _, first, inverse = np.unique(hashes, return_index=True, return_inverse=True)
+        if not np.array_equal(rows[first][inverse.reshape(-1)], rows):
+            # Distinct rows with the same hash, fall back to comparing rows
+            first = np.unique(rows, axis=0, return_index=True)[1]
+        consts, unknowns = consts[first], unknowns[first]
+        consts.setflags(write=False)
+        unknowns.setflags(write=False)
+        return (consts, unknowns)
+
+    def bottom(self):
+        return self.BOTTOM
+
+    def top(self):
+        return self.TOP
+
+    def join(self, l):
+        l = list(l)
+        if not l:
+            return self.bottom()
+        if len(l) == 1:
+            return l[0]
+        # As in DisjComp, joining with the top element is the top element
+        if any(self._is_top(x) for x in l):
+            return self.top()
+        return self._make(np.vstack([c for c, _ in l]), np.vstack([u for _, u in l]))
+
+    def equiv(self, x, y):
+        if x[0].shape != y[0].shape:
+            return False
+        if np.array_equal(x[0], y[0]) and np.array_equal(x[1], y[1]):
+            return True
+        # The order of rows with colliding hashes isn't canonical
+        rows = lambda z: {r.tobytes() for r in np.hstack(z)}
+        return rows(x) == rows(y)
+
+    def _is_top(self, x):
+        return x[0].shape[0] == 1 and (x[1] == TOP_CODE).all()
+
+    def is_bottom(self, x):
+        return x[0].shape[0] == 0
+
+    def _filter(self, x, keep):
+        consts, unknowns = x
+        return (consts[keep], unknowns[keep])
+
+    def transform_nontrivial(self, ast, x):
+        if self.is_bottom(x):
+            return x
+        consts, unknowns = x
+        match ast:
+            case ASTS.Assignment(dest=dest):
+                consts, unknowns = consts.copy(), unknowns.copy()
+                d = dest.id
+                match ast:
+                    case ASTS.ConstAssignment(src=src):
+                        consts[:, d] = src
+                        unknowns[:, d] = UNKNOWN_NONE
+                    case ASTS.UnknownAssignment(src=src):
+                        consts[:, d] = 0
+                        unknowns[:, d] = src
+                    case ASTS.VarAssignment(src=src):
+                        consts[:, d] = consts[:, src.id]
+                        unknowns[:, d] = unknowns[:, src.id]
+                    case ASTS.IncAssignment(src=src) | ASTS.DecAssignment(src=src):
+                        step = 1 if isinstance(ast, ASTS.IncAssignment) else -1
+                        is_val = unknowns[:, src.id] != TOP_CODE
+                        consts[:, d] = consts[:, src.id] + step * is_val
+                        unknowns[:, d] = unknowns[:, src.id]
+                    case _:
+                        # Shape assignments (NULL, new and fields) are
+                        # ignored, as in SummationAnalysis
+                        return x
+                return self._make(consts, unknowns)
+            case ASTS.Assume(expr=ASTS.VarConsEq(lhs=lhs, rhs=rhs)):
+                i = lhs.id
+                keep = (unknowns[:, i] != UNKNOWN_NONE) | (consts[:, i] == rhs)
+                consts, unknowns = consts[keep], unknowns[keep]
+                consts[:, i] = rhs
+                unknowns[:, i] = UNKNOWN_NONE
+                return self._make(consts, unknowns)
+            case ASTS.Assume(expr=ASTS.VarConsNeq(lhs=lhs, rhs=rhs)):
+                i = lhs.id
+                keep = (unknowns[:, i] != UNKNOWN_NONE) | (consts[:, i] != rhs)
+                return self._filter(x, keep)
+            case ASTS.Assume(expr=ASTS.BaseVarComp(lhs=lhs, rhs=rhs) as expr):
+                # As in SummationAnalysis, the cases are kept iff the
+                # lattice values of the variables are (not) equal, or
+                # either one is TOP
+                i, j = lhs.id, rhs.id
+                eq = (consts[:, i] == consts[:, j]) & (unknowns[:, i] == unknowns[:, j])
+                top = (unknowns[:, i] == TOP_CODE) | (unknowns[:, j] == TOP_CODE)
+                return self._filter(x, top | (eq ^ isinstance(expr, ASTS.VarNeq)))
+            case ASTS.Assume(expr=ASTS.ExprFalse()):
+                return self.bottom()
+            case ASTS.Assume() | ASTS.Assert():
+                return x
+            case _:
+                assert False, "Unhandled AST encountered in SummationColumnar transform"
+
+    def _trips(self, loop, x):
+        """Returns a tuple of the form: (whether the counter of the loop is a
+        constant in each case of x, the number of iterations the loop makes
+        from the case or -1 if it never exits)."""
+        consts, unknowns = x
+        k = loop.counter
+        delta = loop.bound - consts[:, k]
+        step = loop.steps[k]
+        trips = np.where((delta % step == 0) & (delta // step >= 0), delta // step, -1)
+        return unknowns[:, k] == UNKNOWN_NONE, trips
+
+    def _iterate(self, loop, consts, unknowns, t):
+        """Returns the cases after t[i] iterations of the counting loop from
+        the i'th case (any number of them, at least one, if t is None)."""
+        consts, unknowns = consts.copy(), unknowns.copy()
+        for v, step in loop.steps.items():
+            if t is None:
+                consts[:, v] = 0
+                unknowns[:, v] = TOP_CODE
+            else:
+                consts[:, v] += t * step * (unknowns[:, v] != TOP_CODE)
+        moved = slice(None) if t is None else t > 0
+        for dest, src in loop.copies.items():
+            consts[moved, dest] = consts[moved, src]
+            unknowns[moved, dest] = unknowns[moved, src]
+        return consts, unknowns
+
+    def accelerate_loop(self, loop, x):
+        """As in SummationAnalysis, every case from which the loop iterates
+        is joined by the case in which the stepped variables are TOP."""
+        if self.is_bottom(x):
+            return x
+        consts, unknowns = x
+        known, trips = self._trips(loop, x)
+        iterates = ~known | (trips != 0)
+        if not iterates.any():
+            return x
+        wc, wu = self._iterate(loop, consts[iterates], unknowns[iterates], None)
+        # The cases within the widened cases are dropped, or the iteration
+        # would keep unrolling them
+        within = ((wu[:, None, :] == TOP_CODE) |
+                  ((consts[None] == wc[:, None]) & (unknowns[None] == wu[:, None]))).all(axis=2)
+        keep = ~within.any(axis=0)
+        return self._make(np.vstack((consts[keep], wc)), np.vstack((unknowns[keep], wu)))
+
+    def exit_loop(self, loop, entry, x):
+        if self.is_bottom(entry):
+            return entry
+        consts, unknowns = entry
+        known, trips = self._trips(loop, entry)
+        exits = known & (trips >= 0)
+        ec, eu = self._iterate(loop, consts[exits], unknowns[exits], trips[exits])
+        wc, wu = self._iterate(loop, consts[~known], unknowns[~known], None)
+        return self._make(np.vstack((ec, consts[~known], wc)),
+                          np.vstack((eu, unknowns[~known], wu)))
+
+    def state_size(self, x):
+        return x[0].shape[0]
+
+    def state_nbytes(self, x):
+        return x[0].nbytes + x[1].nbytes
+
+    def coarsen(self, x):
+        """Joins all the cases into one, in which every variable whose
+        cases differ is TOP."""
+        if x[0].shape[0] <= 1:
+            return x
+        consts, unknowns = x
+        same = (consts == consts[0]).all(axis=0) & (unknowns == unknowns[0]).all(axis=0)
+        return self._make(np.where(same, consts[0], 0)[np.newaxis],
+                          np.where(same, unknowns[0], TOP_CODE)[np.newaxis])
+
+    def verify_assertion(self, ass: ASTS.Assert, x):
+        key = ass.key()
+        compiled = self._compiled_assertions.get(key)
+        if compiled is None:
+            compiled = self._compiled_assertions[key] = compile_sum_assertion(ass, self.n)
+        consts, unknowns = x
+        return sum_assertion_holds(compiled, unknowns != TOP_CODE, consts, unknowns)
+
+def _main():
+    from analyzer import run_analysis
+    run_analysis(SummationColumnar)
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Tiered verification of parity assertions.
+
+The cheap, non-relational PADumb runs first over the whole program. Only
+the assertions it could not prove are escalated to the relational PAFull,
+which runs over a slice of the program: the labels from which an
+unresolved assertion is reachable, and the variables the unresolved
+assertions may (transitively) depend on, see relevant_vars.
+
+Usage: tiered_analysis.py <program file>
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+import networkx as nx
+
+import ast_nodes as ASTS
+from analyzer import chaotic_iteration, get_all_assertions, verify_assertions
+
+
+def _is_parity_assertion(ass: ASTS.Assert) -> bool:
+    return all(isinstance(p, (ASTS.TestOdd, ASTS.TestEven))
+               for andc in ass.orc.andc_list for p in andc.pred_list)
+
+def _assertion_vars(ass: ASTS.Assert) -> set:
+    return {p.var.id for andc in ass.orc.andc_list for p in andc.pred_list
+            if isinstance(p, ASTS.BaseVarTest)}
+
+def relevant_vars(cfg: nx.DiGraph, assertions: List[Tuple[int, ASTS.Assert]]) -> set:
+    """Returns the ids of the variables the parities of the assertions'
+    variables may depend on: the variables related to them, transitively,
+    by assignments (in both directions), comparisons and parity assertions,
+    starting from the assertions' variables and the variables that assumes
+    and parity assertions test, as these may prune paths."""
+    relevant = set().union(*(_assertion_vars(ass) for _, ass in assertions))
+    links = []
+    for _, _, ast in cfg.edges(data="ast"):
+        match ast:
+            case ASTS.VarAssignment(dest=dest, src=src) | ASTS.StepAssignment(dest=dest, src=src):
+                links.append({dest.id, src.id})
+            case ASTS.Assume(expr=ASTS.VarEq(lhs=lhs, rhs=rhs) | ASTS.VarNeq(lhs=lhs, rhs=rhs)):
+                links.append({lhs.id, rhs.id})
+                relevant |= links[-1]
+            case ASTS.Assume(expr=ASTS.VarConsEq(lhs=lhs) | ASTS.VarConsNeq(lhs=lhs)):
+                relevant.add(lhs.id)
+            case ASTS.Assert() if _is_parity_assertion(ast):
+                links.append(_assertion_vars(ast))
+                relevant |= links[-1]
+    changed = True
+    while changed:
+        changed = False
+        for link in links:
+            if link & relevant and not link <= relevant:
+                relevant |= link
+                changed = True
+    return relevant
+
+def _project_ast(ast, var_map: Dict[int, ASTS.Var]):
+    """Returns the command ast over the variables of var_map only (renumbered
+    into the ids of the mapped Vars). Commands on other variables become
+    skips, which over-approximates them."""
+    def mapped(*vars):
+        return all(v.id in var_map for v in vars)
+    match ast:
+        case ASTS.ConstAssignment(dest=dest, src=src) if mapped(dest):
+            return ASTS.ConstAssignment(var_map[dest.id], src)
+        case ASTS.UnknownAssignment(dest=dest, src=src) if mapped(dest):
+            return ASTS.UnknownAssignment(var_map[dest.id], src)
+        case (ASTS.VarAssignment(dest=dest, src=src) |
+              ASTS.StepAssignment(dest=dest, src=src)) if mapped(dest, src):
+            return type(ast)(var_map[dest.id], var_map[src.id])
+        case ASTS.Assume(expr=(ASTS.VarEq(lhs=lhs, rhs=rhs) |
+                               ASTS.VarNeq(lhs=lhs, rhs=rhs)) as expr) if mapped(lhs, rhs):
+            return ASTS.Assume(type(expr)(var_map[lhs.id], var_map[rhs.id]))
+        case ASTS.Assume(expr=(ASTS.VarConsEq(lhs=lhs, rhs=rhs) |
+                               ASTS.VarConsNeq(lhs=lhs, rhs=rhs)) as expr) if mapped(lhs):
+            return ASTS.Assume(type(expr)(var_map[lhs.id], rhs))
+        case ASTS.Assume(expr=ASTS.ExprTrue() | ASTS.ExprFalse()):
+            return ast
+        case ASTS.Assert(orc=orc) if (_is_parity_assertion(ast) and
+                                      _assertion_vars(ast) <= var_map.keys()):
+            return ASTS.Assert(ASTS.OrChain([
+                ASTS.AndChain([type(p)(var_map[p.var.id]) for p in andc.pred_list])
+                for andc in orc.andc_list]))
+    return ASTS.Skip()
+
+def slice_program(cfg: nx.DiGraph, assertions: List[Tuple[int, ASTS.Assert]]):
+    """Returns a tuple of the form: (sliced cfg, number of its variables,
+    the assertions over the sliced variables).
+
+    The sliced cfg holds the labels from which the assertions' labels are
+    reachable, with its commands projected onto relevant_vars.
+    """
+    labels = set()
+    for label, _ in assertions:
+        labels |= nx.ancestors(cfg, label) | {label}
+    var_ids = sorted(relevant_vars(cfg, assertions))
+    var_map = {i: ASTS.Var(f"v{k}", k) for k, i in enumerate(var_ids)}
+
+    sliced = nx.DiGraph()
+    sliced.add_nodes_from(labels)
+    sliced.add_edges_from((src, dst, {"ast": _project_ast(ast, var_map)})
+                          for src, dst, ast in cfg.subgraph(labels).edges(data="ast"))
+    return sliced, len(var_ids), [(label, _project_ast(ass, var_map))
+                                  for label, ass in assertions]
+
+def tiered_verify(cfg: nx.DiGraph, num_vars: int, escalation=None,
+                  iteration=chaotic_iteration) -> Dict[Tuple[int, ASTS.Assert], Optional[str]]:
+    """Verifies the assertions of a program in tiers.
+
+    Returns a dictionary mapping each (label index, Assert command) tuple
+    (see analyzer.get_all_assertions) to the name of the analysis class
+    which proved it, or None if none did. escalation is the relational
+    analysis class of the second tier (PAFull by default).
+    """
+    from parity_analysis import PADumb, PAFull
+    escalation = escalation or PAFull
+    assertions = get_all_assertions(cfg)
+    dumb = PADumb(num_vars)
+    conclusions = verify_assertions(dumb, assertions, iteration(cfg, dumb))
+    tiers = {a: PADumb.__name__ if proven else None for a, proven in conclusions.items()}
+
+    unresolved = [a for a in assertions if tiers[a] is None and _is_parity_assertion(a[1])]
+    if unresolved:
+        sliced, sliced_vars, projected = slice_program(cfg, unresolved)
+        full = escalation(sliced_vars)
+        fixpoint = iteration(sliced, full)
+        for a, (label, ass) in zip(unresolved, projected):
+            if full.verify_assertion(ass, fixpoint[label]):
+                tiers[a] = escalation.__name__
+    return tiers
+
+def format_tiers(tiers) -> List[Dict]:
+    """Converts the dictionary returned from tiered_verify into a JSON
+    serializable list of verdicts (see analyzer.format_verdicts), with the
+    additional "tier" of each."""
+    return [{"label": label_ind, "assertion": str(assertion),
+             "verified": tier is not None, "tier": tier}
+            for (label_ind, assertion), tier in tiers.items()]
+
+
+def _main():
+    from sys import argv
+    from parser import Parser
+    from analyzer import print_analysis_results
+    with open(argv[1], 'r') as f:
+        text = f.read()
+    tiers = tiered_verify(*Parser(text).parse_complete_program())
+    print_analysis_results({a: tier is not None for a, tier in tiers.items()})
+    print()
+    for verdict in format_tiers(tiers):
+        print(f"L{verdict['label']} {verdict['assertion']}: {verdict['tier'] or 'unresolved'}")
+
+if __name__ == "__main__":
+    _main()
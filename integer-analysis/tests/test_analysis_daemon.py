@@ -0,0 +1,97 @@
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "src"))
+
+import pytest
+
+from analysis_daemon import AnalysisDaemon
+
+# The same assertion text tests different variables in these programs, as
+# they declare the same names in another order
+ODD_A = """a b
+L0 a := 1 L1
+L1 assert (ODD a) L2
+"""
+EVEN_A = """b a
+L0 b := 1 L1
+L1 a := 0 L2
+L2 assert (ODD a) L3
+"""
+EQUAL_SUMS = """a b c
+L0 a := 1 L1
+L1 b := 1 L2
+L2 assert (SUM a = SUM b) L3
+"""
+UNEQUAL_SUMS = """a c b
+L0 a := 1 L1
+L1 c := 1 L2
+L2 b := 2 L3
+L3 assert (SUM a = SUM b) L4
+"""
+
+
+def _verdicts(daemon, text, analysis):
+    response = daemon.analyze({"text": text, "analysis": analysis})
+    return [v["verified"] for v in response["verdicts"]]
+
+
+@pytest.mark.parametrize("analysis", ["pafull", "pabitset", "pabdd", "paaffine",
+                                      "fullreduction", "product"])
+def test_permuted_parity_programs(analysis):
+    daemon = AnalysisDaemon()
+    for _ in range(2):
+        assert _verdicts(daemon, ODD_A, analysis) == [True]
+        assert _verdicts(daemon, EVEN_A, analysis) == [False]
+
+
+@pytest.mark.parametrize("analysis", ["summation", "sumcolumnar", "fullreduction"])
+def test_permuted_summation_programs(analysis):
+    daemon = AnalysisDaemon()
+    for _ in range(2):
+        assert _verdicts(daemon, EQUAL_SUMS, analysis) == [True]
+        assert _verdicts(daemon, UNEQUAL_SUMS, analysis) == [False]
+
+
+def test_domains_are_shared_between_requests():
+    daemon = AnalysisDaemon()
+    _verdicts(daemon, ODD_A, "pafull")
+    _verdicts(daemon, EVEN_A, "pafull")
+    assert daemon.stats()["domain_cache"]["hits"] == 1
+    domain = daemon.domains.get(("pafull", 2))
+    assert daemon._analysis("pafull", 2).TOP is domain.TOP
+
+
+def test_non_object_request():
+    assert AnalysisDaemon().handle([1, 2])["status"] == "error"
+
+
+def test_malformed_line_keeps_connection(tmp_path):
+    path = str(tmp_path / "daemon.sock")
+    daemon = AnalysisDaemon()
+    server = threading.Thread(target=daemon.serve, args=(path,))
+    server.start()
+    try:
+        for _ in range(100):
+            if os.path.exists(path):
+                break
+            time.sleep(0.05)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(path)
+        f = sock.makefile('rwb')
+        f.write(b"{not json\n")
+        f.flush()
+        assert json.loads(f.readline())["status"] == "error"
+        f.write(json.dumps({"text": ODD_A, "analysis": "pafull"}).encode() + b"\n")
+        f.flush()
+        assert [v["verified"] for v in json.loads(f.readline())["verdicts"]] == [True]
+        f.write(json.dumps({"command": "shutdown"}).encode() + b"\n")
+        f.flush()
+        f.readline()
+        sock.close()
+    finally:
+        server.join(timeout=10)
@@ -0,0 +1,27 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "src"))
+
+import pytest
+
+from analyzer import ITERATIONS
+from instrumentation import Instrumentation
+from parser import Parser
+from summation_analysis import SummationAnalysis
+
+STRAIGHT_LINE = """x y
+L1 x := 1 L2
+L2 y := ? L3
+L3 x := y L4
+"""
+
+
+@pytest.mark.parametrize("iteration", sorted(ITERATIONS))
+def test_state_sizes_of_visited_nodes(iteration):
+    cfg, num_vars = Parser(STRAIGHT_LINE).parse_complete_program()
+    instrument = Instrumentation()
+    ITERATIONS[iteration](cfg, SummationAnalysis(num_vars), instrument=instrument)
+    # Every visit records the size of the visited node's new value
+    assert {l: len(s) for l, s in instrument.state_sizes.items()} == dict(instrument.node_visits)
+    assert instrument.state_sizes[4][-1] == 1
@@ -0,0 +1,55 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "src"))
+
+import pytest
+
+from analyzer import analyze_text
+
+# The case x=1, y=1 reaches L4 and violates the assertion, while the case
+# in which x is TOP (its initial value, through L3) is above it
+TOP_OPERAND_ASSUME = """x y
+L0 y := 1 L1
+L1 x := 1 L2
+L1 skip L3
+L3 skip L2
+L2 assume x = y L4
+L2 x := 2 L5
+L5 skip L4
+L4 assert (SUM x = SUM y y) L6
+"""
+
+# The loop makes 2000 iterations, which are accelerated rather than unrolled
+LONG_COUNTING_LOOP = """i j ii jj k z a
+L0 i := ? L1
+L1 j := ? L2
+L2 ii := i L3
+L3 jj := j L4
+L4 a := 3 L5
+L5 k := 2000 L6
+L6 assume k != 0 L7
+L7 i := i + 1 L8
+L8 j := j - 1 L9
+L9 k := k - 1 L10
+L10 z := a L6
+L6 assume k = 0 L11
+L11 assert (SUM i j = SUM ii jj) L12
+L12 assert (SUM z = SUM a) L13
+"""
+
+
+def _verdicts(text, analysis):
+    return [v["verified"] for v in analyze_text(text, analysis)["verdicts"]]
+
+
+@pytest.mark.parametrize("analysis", ["summation", "sumantichain", "sumbounded",
+                                      "sumcolumnar"])
+def test_assume_keeps_top_operand_cases(analysis):
+    assert _verdicts(TOP_OPERAND_ASSUME, analysis) == [False]
+
+
+@pytest.mark.parametrize("analysis", ["summation", "sumantichain", "sumbounded",
+                                      "sumcolumnar", "fullreduction"])
+def test_long_counting_loop_exits_in_closed_form(analysis):
+    assert _verdicts(LONG_COUNTING_LOOP, analysis) == [True, True]
@@ -0,0 +1,48 @@
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(__file__), os.pardir)
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+import pytest
+
+from analyzer import chaotic_iteration, get_all_assertions, verify_assertions
+from parity_analysis import PAFull
+from parser import Parser
+from tiered_analysis import tiered_verify
+
+PROGRAMS = ["examples/combined.prog", "examples/increment.prog",
+            "examples/parity_adv.prog", "examples/parity_intro.prog",
+            "examples/parity_unreachable.prog", "examples/sum.prog",
+            "examples/sum2.prog", "tests/dumb_parity.prog",
+            "tests/dumb_parity_loop.prog", "tests/full_parity.prog",
+            "tests/parity_unreachable_code.prog", "tests/shape.prog",
+            "tests/test.prog"]
+
+# The assume on y fixes the parity of x through the copy
+ASSUME_THROUGH_COPY = """x y
+L0 x := ? L1
+L1 y := x L2
+L2 assume(y = 0) L3
+L3 assert(EVEN x) L4
+"""
+
+
+def _check_covers_pafull(text):
+    cfg, num_vars = Parser(text).parse_complete_program()
+    full = PAFull(num_vars)
+    verdicts = verify_assertions(full, get_all_assertions(cfg), chaotic_iteration(cfg, full))
+    tiers = tiered_verify(cfg, num_vars)
+    for a, proven in verdicts.items():
+        if proven:
+            assert tiers[a] is not None, f"L{a[0]} {a[1]}"
+
+
+@pytest.mark.parametrize("path", PROGRAMS)
+def test_tiered_covers_pafull(path):
+    with open(os.path.join(ROOT, path)) as f:
+        _check_covers_pafull(f.read())
+
+
+def test_assume_through_copy():
+    _check_covers_pafull(ASSUME_THROUGH_COPY)